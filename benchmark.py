@@ -0,0 +1,333 @@
+import argparse
+import configparser
+import io
+import logging
+import re
+import time
+import unicodedata
+from lxml import etree as ET
+from marc21_converter import MARC21Converter
+from pymarc import Field
+from pymarc import MARCReader
+from pymarc import Record
+from pymarc import XmlHandler
+from xml.sax import make_parser
+from xml.sax.handler import feature_namespaces
+from tools import aleph_seq_reader
+from tools import parse_oai_response
+from tools import parse_sru_response
+
+class AlephSeqLineReader:
+    """
+    Reads Aleph sequential files line by line, reference implementation for AlephSeqReader
+    """
+
+    def __init__(self, file_path):
+        self.file = file_path
+        self.current_line = self.file.readline().rstrip()
+        self.fields = []
+        self.field = None
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        self.file.close()
+
+    def __next__(self):
+        if self.current_line == '':
+            raise StopIteration
+        current_id = self.current_line[0:9]
+        self.record = Record()
+        while True:
+            current_id = self.current_line[0:9]
+            field = self.form_field(self.current_line)
+            self.record.add_field(field)
+            self.previous_line = self.current_line
+            self.current_line = self.file.readline().rstrip()
+            if self.current_line[0:9] != current_id:
+                if 'DEL' in self.record:
+                    return ""
+                elif 'STA' in self.record:
+                    for field in self.record.get_fields("STA"):
+                        for sf in field.get_subfields('a'):
+                            if sf == "DELETED":
+                                return ""
+                # add identifier for testing
+                if not self.record['001']:
+                    field = Field(tag='001', data=current_id)
+                    self.record.add_ordered_field(field)
+                return self.record
+
+    def form_field(self, line):
+        fields = re.split('\$\$', line)
+        tag = fields[0][10:13]
+        indicators = [fields[0][13], fields[0][14]]
+        if tag == "LDR":
+            self.record.leader = fields[0][18:]
+        field = Field(tag, indicators, [])
+        if len(fields) > 1:
+            for f in fields[1:]:
+                try:
+                    field.add_subfield(f[0], f[1:])
+                except IndexError:
+                    logging.error("indexError %s"%(line))
+        else:
+            try:
+                field.data = fields[0][18:]
+            except IndexError:
+                    logging.error("indexError %s"%(line))
+        return field
+
+class OAIHandler(XmlHandler):
+    """
+    pymarc XmlHandler for MARCXML and Aleph oai_marc records of OAI-PMH and X API responses,
+    reference implementation for parse_oai_response.OAIRecordBuilder
+    """
+
+    def startElementNS(self, name, qname, attrs):
+        element = name[1]
+        self._text = []
+
+        if element in ["oai_marc", "record"]:
+            self._record = Record(force_utf8=True)
+        elif element == "fixfield":
+            tag = attrs.getValue((None, u"id"))
+            self._field = Field(tag)
+        elif element == "varfield":
+            tag = attrs.getValue((None, u"id"))
+            ind1 = attrs.get((None, u"i1"), u" ")
+            ind2 = attrs.get((None, u"i2"), u" ")
+            self._field = Field(tag, [ind1, ind2])
+        elif element == "controlfield":
+            tag = attrs.getValue((None, u"tag"))
+            self._field = Field(tag)
+        elif element == "datafield":
+            tag = attrs.getValue((None, u"tag"))
+            ind1 = attrs.get((None, u"ind1"), u" ")
+            ind2 = attrs.get((None, u"ind2"), u" ")
+            self._field = Field(tag, [ind1, ind2])
+        elif element == "subfield":
+            # regular MARCXML:
+            if name[0] == 'http://www.loc.gov/MARC21/slim':
+                self._subfield_code = attrs[(None, "code")]
+            else:
+                self._subfield_code = attrs[(None, "label")]
+
+    def endElementNS(self, name, qname):
+        element = name[1]
+        if self.normalize_form is not None:
+            text = unicodedata.normalize(self.normalize_form, u"".join(self._text))
+        else:
+            text = u"".join(self._text)
+        if element in ["oai_marc", "record"]:
+            self.process_record(self._record)
+            self._record = None
+        elif element == "leader":
+            self._record.leader = text.replace(' ', '^')
+        elif element in ["fixfield", "controlfield"]:
+            if self._field.tag == "LDR":
+                self._record.leader = text
+            else:
+                if self._field.tag == "008":
+                    text = text.replace(' ', '^')
+                self._field.data = text
+                self._record.add_field(self._field)
+            self._field = None
+        elif element in ["varfield", "datafield"]:
+            self._record.add_field(self._field)
+            self._field = None
+        elif element == "subfield":
+            self._field.add_subfield(self._subfield_code, text)
+            self._subfield_code = None
+
+        self._text = []
+
+class SRUHandler(XmlHandler):
+    """
+    pymarc XmlHandler for MARCXML records of SRU responses, reference implementation for parse_sru_response.SRURecordBuilder
+    """
+
+    def startElementNS(self, name, qname, attrs):
+        element = name[1]
+        self._text = []
+
+        if element == "record":
+            self._record = Record()
+        elif element == "controlfield":
+            tag = attrs.getValue((None, u"tag"))
+            self._field = Field(tag)
+        elif element == "datafield":
+            tag = attrs.getValue((None, u"tag"))
+            ind1 = attrs.get((None, u"ind1"), u" ")
+            ind2 = attrs.get((None, u"ind2"), u" ")
+            self._field = Field(tag, [ind1, ind2])
+        elif element == "subfield":
+            self._subfield_code = attrs[(None, "code")]
+
+    def endElementNS(self, name, qname):
+        element = name[1]
+        if self.normalize_form is not None:
+            text = unicodedata.normalize(self.normalize_form, u"".join(self._text))
+        else:
+            text = u"".join(self._text)
+
+        if element == "record":
+            self.process_record(self._record)
+            self._record = None
+        elif element == "leader":
+            self._record.leader = text
+        elif element == "controlfield":
+            self._field.data = text
+            self._record.add_field(self._field)
+            self._field = None
+        elif element == "datafield":
+            self._record.add_field(self._field)
+            self._field = None
+        elif element == "subfield":
+            self._field.add_subfield(self._subfield_code, text)
+            self._subfield_code = None
+
+        self._text = []
+
+class SAXRecordParser:
+
+    def __init__(self):
+        """
+        Parses MARC21 records from OAI-PMH and X API responses with SAX parser,
+        reference implementation for parse_oai_response.RecordParser
+        """
+        self.handler = OAIHandler()
+        self.parser = make_parser()
+        self.parser.setContentHandler(self.handler)
+        self.parser.setFeature(feature_namespaces, 1)
+
+    def parse(self, response, parameters=None):
+        """
+        Get MARC21 records from response
+        :param response: OAI-PMH or X API response
+        :param parameters: OAI-PMH query parameters, not given for X API responses
+        """
+        root = ET.fromstring(bytes(response, encoding='utf-8'))
+        self.handler.records = []
+        for records in root.findall(parse_oai_response.get_records_path(parameters), parse_oai_response.NAMESPACES):
+            string_xml = ET.tostring(records, encoding='utf-8', method='xml').decode("utf-8")
+            self.parser.parse(io.StringIO(string_xml))
+
+        return self.handler.records
+
+def get_sru_records_with_sax(response):
+    """
+    Get MARC21 records from SRU response with SAX parser, reference implementation for parse_sru_response.get_records
+    :param response: SRU response
+    """
+    marc_records = []
+    root = ET.fromstring(response)
+    for record_data in root.findall('zs:records/zs:record/zs:recordData', parse_sru_response.NAMESPACES):
+        string_xml = ET.tostring(record_data, encoding='utf-8', method='xml').decode("utf-8")
+        handler = SRUHandler()
+        parser = make_parser()
+        parser.setContentHandler(handler)
+        parser.setFeature(feature_namespaces, 1)
+        parser.parse(io.StringIO(string_xml))
+        marc_records.extend(handler.records)
+    return marc_records
+
+def benchmark_aleph_readers(file_path, repeats):
+    """
+    Compares reading speed of line based and block based Aleph sequential readers
+    :param file_path: Aleph sequential file
+    :param repeats: number of times file is read with each reader
+    """
+    readers = {'AlephSeqLineReader': AlephSeqLineReader,
+               'AlephSeqReader': aleph_seq_reader.AlephSeqReader}
+    for name in readers:
+        records_per_second = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            reader = readers[name](open(file_path, 'r', encoding="utf-8"))
+            number_of_records = 0
+            for record in reader:
+                number_of_records += 1
+            reader.close()
+            records_per_second.append(number_of_records / (time.perf_counter() - start))
+        print("%s: %s records, %.0f records/s"%(name, number_of_records, max(records_per_second)))
+
+def benchmark_record_parsers(file_path, repeats, target):
+    """
+    Compares parsing speed of MARC21 records built directly from parsed XML and records parsed again with SAX parser
+    :param file_path: OAI-PMH, X API or SRU API response
+    :param repeats: number of times response is parsed with each parser
+    :param target: 'oai' for OAI-PMH and X API responses, 'sru' for SRU API responses
+    """
+    with open(file_path, 'r', encoding="utf-8") as fh:
+        response = fh.read()
+    if target == 'oai':
+        parameters = None
+        for verb in ['ListRecords', 'GetRecord']:
+            if '<' + verb in response:
+                parameters = {'verb': verb}
+        parsers = {'SAXRecordParser': lambda: SAXRecordParser().parse(response, parameters),
+                   'RecordParser': lambda: parse_oai_response.RecordParser().parse(response, parameters)}
+    else:
+        parsers = {'get_sru_records_with_sax': lambda: get_sru_records_with_sax(response),
+                   'get_records': lambda: parse_sru_response.get_records(response)}
+    for name in parsers:
+        records_per_second = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            number_of_records = len([record for record in parsers[name]() if record])
+            records_per_second.append(number_of_records / (time.perf_counter() - start))
+        print("%s: %s records, %.0f records/s"%(name, number_of_records, max(records_per_second)))
+
+def benchmark_identity_conversion(file_path, repeats, workers):
+    """
+    Compares conversion speed of authority records into identities in the main process and with worker processes
+    :param file_path: authority file in Aleph sequential format with suffix .seq or in ISO 2709 format
+    :param repeats: number of times records are converted in each mode
+    :param workers: number of worker processes
+    """
+    if file_path.endswith('.seq'):
+        reader = aleph_seq_reader.AlephSeqReader(open(file_path, 'r', encoding="utf-8"))
+    else:
+        reader = MARCReader(open(file_path, 'rb'), to_unicode=True)
+    # records are keyed by position, because identifiers may repeat in generated files
+    records = {'%09d'%idx: record for idx, record in enumerate(reader) if record}
+    reader.close()
+    converter = MARC21Converter(configparser.ConfigParser())
+    logging.getLogger().setLevel(logging.ERROR)
+    convertible_fields = ['100', '110']
+    for number_of_workers in [1, workers]:
+        records_per_second = []
+        cpu_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            converter.convert_records(records, convertible_fields, 'ID', number_of_workers)
+            cpu_times.append(time.process_time() - cpu_start)
+            records_per_second.append(len(records) / (time.perf_counter() - start))
+        # with enough CPU cores, CPU time of main process limits the speed of conversion with workers
+        print("%s workers: %s records, %.0f records/s, %.2f s CPU time in main process"
+              %(number_of_workers, len(records), max(records_per_second), min(cpu_times)))
+
+if __name__ == '__main__':
+    """
+    Script for measuring parsing speed of input files
+    """
+    logging.getLogger().setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser(description="Benchmarks for readers and parsers")
+    parser.add_argument("-t", "--target",
+        help="Benchmarked code", choices=['alephseq', 'oai', 'sru', 'identities'], required=True)
+    parser.add_argument("-i", "--input_file",
+        help="Input file for benchmark", required=True)
+    parser.add_argument("-n", "--repeats", type=int, default=3,
+        help="Number of repeats, the best result is reported")
+    parser.add_argument("-w", "--workers", type=int, default=2,
+        help="Number of conversion workers compared with conversion in the main process")
+    args = parser.parse_args()
+    if args.target == 'alephseq':
+        benchmark_aleph_readers(args.input_file, args.repeats)
+    elif args.target == 'identities':
+        benchmark_identity_conversion(args.input_file, args.repeats, args.workers)
+    else:
+        benchmark_record_parsers(args.input_file, args.repeats, args.target)
@@ -7,14 +7,18 @@ import sys
 import openpyxl
 import argparse
 import configparser
-import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from isni_request import create_xml
 from marc21_converter import MARC21Converter
 from gramex_converter import GramexConverter
 from tools import parse_isni_response
+from tools import ppn_resolver
 from tools import xlsx_raport_writer
 from tools import api_query
+from tools import rate_limiter
+from tools import response_cache
 
 class Converter():
     """
@@ -64,6 +68,28 @@ class Converter():
             help="Mode of program: Write requests into a directory or send them to ISNI or test sending to test database", choices=['write', 'prod', 'test'], required=True)
         parser.add_argument("-F", "--config_file_path",
             help="File path for configuration file structured for Python ConfigParser")
+        parser.add_argument("-w", "--workers", type=int, default=1,
+            help="Number of processes used for reading authority and resource files, default 1")
+        parser.add_argument("--conversion_workers", type=int, default=1,
+            help="Number of processes converting authority records into identities, records are converted in the main process by default")
+        parser.add_argument("--resource_cache",
+            help="File path where titles read from resource files are cached for later runs with unchanged resource files")
+        parser.add_argument("--use_index", action='store_true',
+            help="Read only requested records and their linked records from authority file using a byte offset index saved with suffix .idx")
+        parser.add_argument("--cache_directory",
+            help="Directory where API responses are cached for API config sections with cache_ttl set")
+        parser.add_argument("--cache_size", type=int,
+            help="Maximum size of response cache in megabytes, least recently used responses are removed")
+        parser.add_argument("--offline", action='store_true',
+            help="Use only API responses cached into cache directory")
+        parser.add_argument("--harvest_journal",
+            help="File path where records harvested with OAI-PMH API are saved after every page")
+        parser.add_argument("--resume", action='store_true',
+            help="Continue interrupted OAI-PMH harvest saved into harvest journal with same query parameters")
+        parser.add_argument("--ppn_cache",
+            help="File path where ISNI data of possible matches requested with PPN identifiers are cached for later runs")
+        parser.add_argument("-S", "--stream", action='store_true',
+            help="Convert records of MARC21 authority file one by one without loading all records into memory")
         args = parser.parse_args()
         self.converter = None
         self.modified_after = None
@@ -78,6 +104,14 @@ class Converter():
         :param args: command line arguments parsed by ConfigParser
         """
         logging.getLogger().setLevel(logging.INFO)
+        if getattr(args, 'cache_directory', None):
+            max_size = None
+            if args.cache_size:
+                max_size = args.cache_size * 1024 * 1024
+            response_cache.cache = response_cache.ResponseCache(args.cache_directory, max_size, args.offline)
+        elif getattr(args, 'offline', False):
+            logging.error("Set cache directory for offline mode")
+            sys.exit(2)
         if args.mode in ['prod', 'test']:
             if args.mode == 'prod':
                 section = self.config['ISNI SRU API']
@@ -91,6 +125,9 @@ class Converter():
             self.sru_api_query = api_query.APIQuery(config_section=section,
                                         username=username,
                                         password=password)
+            self.ppn_resolver = ppn_resolver.PPNResolver(self.sru_api_query,
+                                        int(section.get('batch_size', fallback=ppn_resolver.BATCH_SIZE)),
+                                        getattr(args, 'ppn_cache', None))
         if args.modified_after:
             self.modified_after = datetime.date(datetime.strptime(args.modified_after, "%Y-%m-%d"))
         if args.created_after:
@@ -139,7 +176,10 @@ class Converter():
             self.converter = MARC21Converter(self.config)
         elif args.format == 'gramex':
             self.converter = GramexConverter(self.config)
-        records = self.converter.get_authority_data(args, requested_ids)
+        if args.stream and args.format in ['marc21', 'alephseq']:
+            records = self.converter.iterate_authority_data(args, requested_ids)
+        else:
+            records = self.converter.get_authority_data(args, requested_ids).items()
         concat = False
         xmlschema = None
         dirmax = 100
@@ -161,9 +201,15 @@ class Converter():
         logging.info("Starting to convert records...")
 
         isnis = {}
+        raport_writer = None
         if args.output_raport_list:
             raport_writer = xlsx_raport_writer.RaportWriter(args.output_raport_list)
-        for record_id in records:
+        submissions = deque()
+        executor = None
+        if args.mode in ['prod', 'test']:
+            max_submissions = int(self.get_atompub_section(args.mode).get('concurrency', fallback=1))
+            executor = ThreadPoolExecutor(max_workers=max_submissions)
+        for record_id, identity in records:
             merge_instruction = None
             merge_identifiers = []
             if merge_instructions:
@@ -173,8 +219,8 @@ class Converter():
                     merge_instruction = merge_instructions[record_id]['instruction']
                     merge_identifiers = merge_instructions[record_id]['identifiers']
             xml = None
-            if not records[record_id]['errors']:
-                xml = create_xml(records[record_id], merge_instruction, merge_identifiers)
+            if not identity['errors']:
+                xml = create_xml(identity, merge_instruction, merge_identifiers)
             if idx % dirmax == 0:
                 dirindex += 1
             if args.output_directory:
@@ -186,32 +232,11 @@ class Converter():
                     continue
 
             if args.mode in ["prod", "test"]:
-                isni_data = {'errors': []}
-                if xml:
-                    logging.info("Sending record %s"%record_id)
-                    response = self.send_xml(xml, args.mode, args.origin)
-                    if response.status_code != 200:
-                        isni_data['errors'].extend([line for line in response.text.splitlines() if line])
-                    else:
-                        isni_data.update(parse_isni_response.dictify_xml(response.text)[0])
-                    # if record is not entered in ISNI database, but has possible matches:
-                    if 'possible matches' in isni_data and not 'ppn' in isni_data and not 'isni' in isni_data:
-                        for pm in isni_data['possible matches']:
-                            if 'ppn' in pm:
-                                ppn = pm['ppn']
-                                result = self.sru_api_query.get_isni_query_data('ppn='+ppn)
-                                if result:
-                                    result = result[0]
-                                    if 'isni' in result:
-                                        pm['isni'] = result['isni']
-                                    source_ids = result['sources']
-                                    pm['sources'] = {code: re.sub("[\(].*?[\)]", "", source_ids[code]) for code in source_ids}
-                            else:
-                                isni_data['errors'].append('Record has possible match in ISNI without id')
-                isni_data['errors'].extend(records[record_id]['errors'])
-                isnis[record_id] = isni_data
-                if args.output_raport_list:
-                    raport_writer.handle_response(isni_data, record_id, records[record_id])
+                # responses are handled in the order records are sent
+                if len(submissions) >= max_submissions:
+                    self.handle_submission(submissions.popleft(), isnis, raport_writer)
+                future = executor.submit(self.submit_xml, xml, args.mode, args.origin, record_id)
+                submissions.append((future, record_id, identity))
             elif args.mode == "write":
                 if xml:
                     if args.concat:
@@ -220,7 +245,15 @@ class Converter():
                         xml_path = os.path.join(subdir, record_id + ".xml")
                     self.write_xml(xml, xml_path, args.concat)
             idx += 1
+        while submissions:
+            self.handle_submission(submissions.popleft(), isnis, raport_writer)
+        if executor:
+            executor.shutdown()
         logging.info("Conversion done for %s items"%idx)
+        if response_cache.cache:
+            response_cache.cache.log_statistics()
+        if args.mode in ['prod', 'test']:
+            self.ppn_resolver.save_cache()
         if args.concat:
             with open(args.output_directory+"/concat.xml", 'ab+') as concat_file:
                 concat_file.write(bytes("</root>", "UTF-8"))
@@ -229,6 +262,62 @@ class Converter():
             if args.output_marc_fields:
                 self.converter.write_isni_fields(args.output_marc_fields, isni_records)
 
+    def submit_xml(self, xml, mode, origin, record_id):
+        """
+        Sends ISNI request and requests ISNI identifiers and source identifiers of possible matches in response
+        Returns a dict of response data
+        :param xml: string converted XML elementtree in ISNI AtomPub format
+        :param mode: 'prod' or 'test' to choose between ISNI production and accept database
+        :param origin: source code for AtomPub records
+        :param record_id: local identifier of record
+        """
+        isni_data = {'errors': []}
+        if xml:
+            logging.info("Sending record %s"%record_id)
+            try:
+                response = self.send_xml(xml, mode, origin)
+            except api_query.APIQueryError as e:
+                logging.error(e)
+                isni_data['errors'].append(str(e))
+                return isni_data
+            if response.status_code != 200:
+                isni_data['errors'].extend([line for line in response.text.splitlines() if line])
+            else:
+                isni_data.update(parse_isni_response.dictify_xml(response.text)[0])
+            # if record is not entered in ISNI database, but has possible matches:
+            if 'possible matches' in isni_data and not 'ppn' in isni_data and not 'isni' in isni_data:
+                results = self.ppn_resolver.resolve([pm['ppn'] for pm in isni_data['possible matches'] if 'ppn' in pm])
+                for pm in isni_data['possible matches']:
+                    if 'ppn' in pm:
+                        ppn = pm['ppn']
+                        if ppn not in results:
+                            isni_data['errors'].append('Possible match %s not requested from ISNI'%ppn)
+                            continue
+                        result = results[ppn]
+                        if result:
+                            if 'isni' in result:
+                                pm['isni'] = result['isni']
+                            source_ids = result.get('sources', {})
+                            pm['sources'] = {code: re.sub("[\(].*?[\)]", "", source_ids[code][0]) for code in source_ids}
+                    else:
+                        isni_data['errors'].append('Record has possible match in ISNI without id')
+
+        return isni_data
+
+    def handle_submission(self, submission, isnis, raport_writer=None):
+        """
+        Waits for response data of sent ISNI request and stores it for creating ISNI fields and raport
+        :param submission: tuple of future of submit_xml function, local identifier and identity data
+        :param isnis: dict of response data with local identifier as key
+        :param raport_writer: RaportWriter for raport of responses
+        """
+        future, record_id, identity = submission
+        isni_data = future.result()
+        isni_data['errors'].extend(identity['errors'])
+        isnis[record_id] = isni_data
+        if raport_writer:
+            raport_writer.handle_response(isni_data, record_id, identity)
+
     def valid_xml(self, record_id, xml, xmlschema):
         try:
             string_xml = io.StringIO(xml)
@@ -273,16 +362,26 @@ class Converter():
         :param origin: source code for AtomPub records
         """
         headers = {'Content-Type': 'application/atom+xml; charset=utf-8'}
-        if mode == 'prod':
-            section = self.config['ISNI ATOMPUB API']
-        elif mode == 'test':
-            section = self.config['ISNI ATOMPUB TEST API']
+        section = self.get_atompub_section(mode)
         url = section.get('baseurl')
         if origin:
             url += 'ORIGIN=' + origin
-        response = requests.post(url, data=xml.encode('utf-8'), headers=headers)
+        pool_size = int(section.get('pool_size', fallback=api_query.POOL_SIZE))
+        limiter = rate_limiter.get_limiter(section)
+        # requests are not retried, because a record may be created in ISNI even if request fails
+        response = api_query.send_request('POST', url, limiter, pool_size, data=xml.encode('utf-8'), headers=headers)
 
         return response
 
+    def get_atompub_section(self, mode):
+        """
+        Get config section of ISNI AtomPub API
+        :param mode: 'prod' or 'test' to choose between ISNI production and accept database
+        """
+        if mode == 'prod':
+            return self.config['ISNI ATOMPUB API']
+        elif mode == 'test':
+            return self.config['ISNI ATOMPUB TEST API']
+
 if __name__ == '__main__':
     Converter()
\ No newline at end of file
@@ -17,7 +17,7 @@ if __name__ == '__main__':
     parser.add_argument("-c", "--config_file_path",
         help="File path for configuration file structured for Python ConfigParser", required=True)
     parser.add_argument("-f", "--query_file",
-        help="File path for saving and loading query results", required=True)
+        help="File path of journal for saving and resuming query results", required=True)
     args = parser.parse_args()
     config = configparser.ConfigParser()
     config.read(args.config_file_path)
@@ -163,6 +163,8 @@ if __name__ == "__main__":
         help="Output local and ISNI identifiers", action='store_true')
     parser.add_argument("-c", "--config_file_path",
             help="File path for configuration file structured for Python ConfigParser")
+    parser.add_argument("--use_index", action='store_true',
+        help="Read only records with received ISNIs and their linked records from authority file using a byte offset index")
     args = parser.parse_args()
 
     main(args)
@@ -6,14 +6,74 @@ from validators import Validator
 from tools import api_query
 from tools import parse_sru_response
 from tools import parse_oai_response
-from pymarc import MARCReader, Field, Subfield
+from pymarc import MARCReader, Field, Record, Subfield
 from tools import aleph_seq_reader
+from tools import parallel_reader
+from tools import journal
+from tools import record_index
+from collections import ChainMap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import copy
 import io
 import json
 import re
 import sys
 
+# number of streamed records per concurrent SRU API query, for which titles are requested at once
+RESOURCE_BATCH_SIZE = 10
+# number of authority records converted at once by a worker process
+IDENTITY_BATCH_SIZE = 500
+# converter of worker process, which converts batches of authority records into identities
+worker_converter = None
+
+def init_identity_worker(config):
+    global worker_converter
+    worker_converter = MARC21Converter(config)
+
+def convert_identity_batch(batch, convertible_fields, identifier):
+    """
+    Converts a batch of authority records in a worker process
+    :param batch: list of tuples of local identifier and MARC21 authority record serialized with serialize_record
+    :param convertible_fields: tags of main entry fields of identity types to be converted
+    :param identifier: identifier of the database of requestor attached to local identifier
+    """
+    return [worker_converter.convert_record(record_id, deserialize_record(data), convertible_fields, identifier)
+            for record_id, data in batch]
+
+def serialize_record(record):
+    """
+    Converts MARC21 record into a tuple of leader and field tuples, which is pickled several times faster than pymarc objects
+    :param record: MARC21 record
+    """
+    fields = []
+    for field in record.fields:
+        if field.is_control_field():
+            fields.append((field.tag, None, None, field.data))
+        else:
+            # Aleph fields without subfields have data in addition to indicators
+            fields.append((field.tag, field.indicators, [tuple(subfield) for subfield in field.subfields], getattr(field, 'data', None)))
+    return record.leader, fields
+
+def deserialize_record(data):
+    """
+    Creates MARC21 record from data serialized with serialize_record
+    :param data: tuple of leader and field tuples
+    """
+    leader, field_data = data
+    record = Record()
+    record.leader = leader
+    fields = []
+    for tag, indicators, subfields, value in field_data:
+        if subfields is None:
+            field = Field(tag=tag, data=value)
+        else:
+            field = Field(tag=tag, indicators=indicators, subfields=[Subfield(code, text) for code, text in subfields])
+            if value is not None:
+                field.data = value
+        fields.append(field)
+    record.add_field(*fields)
+    return record
+
 class MARC21Converter:
     """
         A class to collect data from mrc binary files to ISNI Atom Pub XML format.
@@ -23,6 +83,8 @@ class MARC21Converter:
         self.validator = Validator()
         self.config = config
         self.records = {}
+        # linked authority records requested with X API
+        self.linked_records = {}
         self.resources = None
         self.sru_bib_query = None
         self.request_ids = set()
@@ -53,28 +115,176 @@ class MARC21Converter:
                                     if related_org['ISNI']:
                                         identities[id]['isNot'].append({'type': 'ISNI', 'identifier': related_org['ISNI']})
 
-    def request_linked_records(self, record, linked_records, linked_cluster, linked_ids):
-        """
-        Recursively request all records that are linked to organisation authority record with MARC field 510
-        :param record: MARC21 record of an organisation
-        :param linked_records: list of ids of recursively requested MARC21 records
-        :param linked_ids: list of identifiers of interlinked authority records
-        """
-        tags = ['500', '510']
-        for tag in tags:
-            for field in record.get_fields(tag):
-                linked_id = None
-                if '0' in field and field['0']:
-                    linked_id = re.sub("[\(].*?[\)]", "", field['0'])
-                    if linked_id not in linked_ids:
-                        linked_ids.add(linked_id)
-                        linked_cluster.add(linked_id)
-                        parameters = {'doc_num': linked_id}
-                        response = self.author_query.api_search(parameters=parameters)
-                        marc_record = parse_oai_response.get_records(response)[0]
-                        if '001' in marc_record:
-                            linked_records[marc_record['001'].data] = marc_record
-                            self.request_linked_records(marc_record, linked_records, linked_cluster, linked_ids)
+    def request_linked_records(self, records, linked_ids):
+        """
+        Requests all records that are linked to authority records with MARC fields 500 and 510 breadth first.
+        Linked records of each level are requested at once with request_authority_records and
+        cached for linked records of other authority records requested later.
+        :param records: dict of MARC21 records with local identifiers as keys, whose linked records are requested
+        :param linked_ids: set of identifiers of interlinked authority records already requested, updated with requested ids
+        Returns a dict of linked MARC21 records with local identifiers as keys
+        """
+        linked_records = {}
+        level = list(records.values())
+        while level:
+            level_ids = []
+            for record in level:
+                for field in record.get_fields('500', '510'):
+                    if '0' in field and field['0']:
+                        linked_id = re.sub("[\(].*?[\)]", "", field['0'])
+                        if linked_id not in linked_ids:
+                            linked_ids.add(linked_id)
+                            level_ids.append(linked_id)
+            uncached_ids = [id for id in level_ids if id not in self.linked_records]
+            if uncached_ids:
+                self.linked_records.update(self.request_authority_records(uncached_ids))
+            level = []
+            for linked_id in level_ids:
+                marc_record = self.linked_records.get(linked_id)
+                if marc_record and '001' in marc_record:
+                    linked_records[marc_record['001'].data] = marc_record
+                    level.append(marc_record)
+
+        return linked_records
+
+    def request_authority_records(self, record_ids):
+        """
+        Requests authority records with X API in batches of doc numbers, if batch_size is set in config section AUT X API,
+        otherwise one by one. Requests are sent concurrently, if concurrency is set in the same section.
+        Records missing from batch responses are requested again one by one. Records that cannot be requested are logged.
+        :param record_ids: local identifiers of authority records
+        """
+        section = self.config['AUT X API']
+        batch_size = int(section.get('batch_size', fallback=1))
+        concurrency = int(section.get('concurrency', fallback=1))
+        parser = parse_oai_response.RecordParser()
+        record_ids = sorted(record_ids)
+        batches = [record_ids[idx:idx + batch_size] for idx in range(0, len(record_ids), batch_size)]
+        marc_records = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for batch, response in zip(batches, executor.map(self.fetch_authority_records, batches)):
+                records = self.parse_authority_records(parser, response, batch)
+                if len(batch) == 1:
+                    if records:
+                        marc_records[batch[0]] = records[0]
+                    continue
+                for record in records:
+                    if '001' in record and record['001'].data in batch:
+                        marc_records[record['001'].data] = record
+            failed_ids = [[id] for id in record_ids if id not in marc_records]
+            if batch_size > 1 and failed_ids:
+                logging.info("Requesting %s records one by one"%len(failed_ids))
+                for batch, response in zip(failed_ids, executor.map(self.fetch_authority_records, failed_ids)):
+                    records = self.parse_authority_records(parser, response, batch)
+                    if records:
+                        marc_records[batch[0]] = records[0]
+        for id in record_ids:
+            if id not in marc_records:
+                logging.error("Record %s not found with X API"%id)
+
+        return marc_records
+
+    def parse_authority_records(self, parser, response, record_ids):
+        """
+        Parses records from X API response, records are not returned if response is missing or it cannot be parsed
+        :param parser: RecordParser instance
+        :param response: X API response
+        :param record_ids: local identifiers of requested authority records
+        """
+        if not response:
+            return []
+        try:
+            return [record for record in parser.parse(response) if record]
+        except Exception as e:
+            logging.error("Response to request of records %s not parsed: %s"%(", ".join(record_ids), e))
+            return []
+
+    def fetch_authority_records(self, record_ids):
+        """
+        Requests authority records with X API and returns response or None if request fails
+        :param record_ids: local identifiers of authority records
+        """
+        parameters = {'doc_num': ",".join(record_ids)}
+        try:
+            return self.author_query.api_search(parameters=parameters)
+        except api_query.APIQueryError as e:
+            logging.error(e)
+
+    def read_authority_file(self, args):
+        """
+        Reads MARC21 records with identifier one by one from an authority file
+        :param args: Command line arguments
+        """
+        if args.format == "marc21":
+            reader = MARCReader(open(args.authority_files, 'rb'), to_unicode=True)
+        elif args.format == "alephseq":
+            reader = aleph_seq_reader.AlephSeqReader(open(args.authority_files, 'r', encoding="utf-8"))
+        else:
+            logging.error("Not valid format to convert from: "%args.format)
+            sys.exit(2)
+        record = ""
+        while record is not None:
+            try:
+                record = next(reader, None)
+            except Exception as e:
+                logging.exception(e)
+                continue
+            if record and '001' in record:
+                yield record
+        reader.close()
+
+    def read_indexed_records(self, args):
+        """
+        Reads requested records and records linked to them with MARC fields 500 and 510 from an indexed authority file
+        :param args: Command line arguments
+        """
+        marc_records = {}
+        index = record_index.RecordIndex(args.authority_files, args.format)
+        requested_ids = set(self.request_ids)
+        read_ids = set()
+        while requested_ids:
+            read_ids.update(requested_ids)
+            linked_ids = set()
+            for record in index.get_records(requested_ids):
+                if '001' in record:
+                    marc_records[record['001'].data] = record
+                    for tag in ['500', '510']:
+                        for field in record.get_fields(tag):
+                            if '0' in field and field['0']:
+                                linked_ids.add(re.sub("[\(].*?[\)]", "", field['0']))
+            requested_ids = linked_ids - read_ids
+        index.close()
+        for record_id in self.request_ids:
+            if record_id not in marc_records:
+                logging.error("Record %s not found in file %s"%(record_id, args.authority_files))
+
+        return marc_records
+
+    def in_time_range(self, record, args):
+        """
+        Checks if record is created or modified within time interval given in command line arguments
+        Changes made by cataloguers listed in config file are neglected
+        :param record: MARC21 authority record
+        :param args: Command line arguments
+        """
+        creation_date = None
+        modification_date = None
+        for field in record.get_fields("CAT"):
+            if 'a' in field:
+                cataloguer = field['a']
+                if cataloguer not in self.cataloguers:
+                    for sf in field.get_subfields('c'):
+                        formatted_date = sf[:4] + "-" + sf[4:6] + "-" + sf[6:8]
+                        if not creation_date:
+                            creation_date = formatted_date
+                        modification_date = formatted_date
+        if args.created_after:
+            if creation_date < args.created_after or args.until and creation_date >= args.until:
+                return False
+        if args.modified_after:
+            if modification_date < args.modified_after or args.until and modification_date >= args.until:
+                return False
+        return True
 
     def read_marc_records(self, args):
         """
@@ -82,36 +292,28 @@ class MARC21Converter:
         :param args: Command line arguments
         """
         marc_records = {}
-        if args.authority_files:
-            if args.format == "marc21":
-                reader = MARCReader(open(args.authority_files, 'rb'), to_unicode=True)
-            elif args.format == "alephseq":
-                reader = aleph_seq_reader.AlephSeqReader(open(args.authority_files, 'r', encoding="utf-8"))
-            else:
-                logging.error("Not valid format to convert from: "%args.format)
+        if args.authority_files and getattr(args, 'use_index', False) and self.request_ids:
+            marc_records = self.read_indexed_records(args)
+        elif args.authority_files and getattr(args, 'workers', 1) > 1:
+            if args.format not in ["marc21", "alephseq"]:
+                logging.error("Not valid format to convert from: %s"%args.format)
                 sys.exit(2)
-            record = ""
-            while record is not None:
-                try:
-                    record = next(reader, None)
-                    if record and '001' in record:
-                        record_id = record['001'].data
-                        marc_records[record_id] = record
-                        self.request_ids.add(record_id)
-                except Exception as e:
-                    logging.exception(e)
-            reader.close()
+            for record in parallel_reader.read_records(args.authority_files, args.format, args.workers):
+                if '001' in record:
+                    record_id = record['001'].data
+                    marc_records[record_id] = record
+                    self.request_ids.add(record_id)
+        elif args.authority_files:
+            for record in self.read_authority_file(args):
+                record_id = record['001'].data
+                marc_records[record_id] = record
+                self.request_ids.add(record_id)
         else:
             logging.info("Requesting authority records with API")
             if self.request_ids:
                 section = self.config['AUT X API']
                 self.author_query = api_query.APIQuery(config_section=section)
-                for id in self.request_ids:
-                    parameters = {'doc_num': id}
-                    response = self.author_query.api_search(parameters=parameters)
-                    record = parse_oai_response.get_records(response)[0]
-                    if not id in marc_records:
-                        marc_records[id] = record
+                marc_records = self.request_authority_records(self.request_ids)
             elif args.modified_after or args.created_after or args.until:
                 section = self.config['AUT OAI-PMH API']
                 self.author_query = api_query.APIQuery(config_section=section)
@@ -122,352 +324,422 @@ class MARC21Converter:
                     query_parameters['from'] = args.created_after
                 if args.until:
                     query_parameters['until'] = args.until
-                response = self.author_query.api_search(parameters=query_parameters)
-                self.request_ids = parse_oai_response.get_identifiers(response, query_parameters)
-                requested_records = parse_oai_response.get_records(response, query_parameters)
-                for record in requested_records:
-                    if '001' in record:
-                        marc_records[record['001'].data] = record
-                token = parse_oai_response.get_resumption_token(response, query_parameters)
-                while token:
-                    query_parameters = {'resumptionToken': token, 'verb': 'ListRecords'}
-                    response = self.author_query.api_search(parameters=query_parameters)
-                    self.request_ids.update(parse_oai_response.get_identifiers(response, query_parameters))
-                    requested_records = parse_oai_response.get_records(response, query_parameters)
+                self.request_ids = set()
+                harvest_journal = None
+                token = None
+                pages = []
+                if getattr(args, 'harvest_journal', None):
+                    harvest_journal = journal.Journal(args.harvest_journal,
+                                                      {'baseurl': section.get('baseurl'), 'parameters': query_parameters})
+                    if getattr(args, 'resume', False):
+                        try:
+                            pages = harvest_journal.resume()
+                        except journal.JournalError as e:
+                            logging.error("Harvest not resumed: %s"%e)
+                            sys.exit(2)
+                        token = harvest_journal.cursor['token']
+                    else:
+                        harvest_journal.reset()
+                for identifiers, requested_records in pages:
+                    self.request_ids.update(identifiers)
                     for record in requested_records:
                         if '001' in record:
                             marc_records[record['001'].data] = record
-                    token = parse_oai_response.get_resumption_token(response, query_parameters)
+                if not (harvest_journal and harvest_journal.cursor['complete']):
+                    for response in self.author_query.harvest(query_parameters, token):
+                        self.request_ids.update(response.identifiers)
+                        for record in response.records:
+                            if '001' in record:
+                                marc_records[record['001'].data] = record
+                        if harvest_journal:
+                            harvest_journal.append((response.identifiers, response.records), response.resumption_token)
                 if not self.request_ids:
                     logging.error("No updated records found within time interval given in parameters")
                     sys.exit(2)
         # get cataloging identifiers whose modification to records are neglected
         self.cataloguers = self.config_values_to_python_object('SETTINGS', 'cataloguers')
         for marc_id in marc_records:
-            creation_date = None
-            modification_date = None
-            record = marc_records[marc_id]
-            for field in record.get_fields("CAT"):
-                if 'a' in field:
-                    cataloguer = field['a']
-                    if cataloguer not in self.cataloguers:
-                        for sf in field.get_subfields('c'):
-                            formatted_date = sf[:4] + "-" + sf[4:6] + "-" + sf[6:8]
-                            if not creation_date:
-                                creation_date = formatted_date
-                            modification_date = formatted_date
-            if args.created_after:
-                if creation_date < args.created_after or args.until and creation_date >= args.until:
-                    self.request_ids.discard(marc_id)
-            if args.modified_after:
-                if modification_date < args.modified_after or args.until and modification_date >= args.until:
-                    self.request_ids.discard(marc_id)
+            if not self.in_time_range(marc_records[marc_id], args):
+                self.request_ids.discard(marc_id)
         if not args.authority_files:
             section = self.config['AUT X API']
             self.author_query = api_query.APIQuery(config_section=section)
-            linked_ids = set()
-            added_records = {}
-            for marc_id in marc_records:
-                if marc_id in self.request_ids:
-                    linked_records = {}
-                    linked_cluster = {marc_id}
-                    if marc_id not in linked_ids:
-                        linked_ids.add(marc_id)
-                        self.request_linked_records(marc_records[marc_id], linked_records, linked_cluster, linked_ids)
-                    added_records.update(linked_records)
-            marc_records.update(added_records)
+            requested_records = {marc_id: marc_records[marc_id] for marc_id in marc_records if marc_id in self.request_ids}
+            linked_ids = set(requested_records)
+            marc_records.update(self.request_linked_records(requested_records, linked_ids))
             if not self.request_ids:
                 logging.error("No records found for conversion with command line arguments")
                 sys.exit(2)
 
         return marc_records
 
-    def get_authority_data(self, args, request_ids=set()):
+    def load_resources(self, args, author_ids=None):
         """
-        Converts MARC21 authority bibliographic record data to dict
+        Loads titles of works of authors from a bibliographic file or prepares API for requesting them
         :param args: parameters that are passed to converter as command line arguments
-        :param request_ids: set of local identifiers of records to be converted into ISNI request
+        :param author_ids: local identifiers of authors whose titles are loaded from file, all titles are loaded if not given
         """
-        self.request_ids = request_ids
+        max_titles = None
+        if self.config['SETTINGS'].getboolean('retain_titles', fallback=False):
+            max_titles = int(self.config['SETTINGS'].get('max_titles'))
         if args.resource_files:
-            self.resources = ResourceList(args.resource_files, args.format).titles
+            self.resources = ResourceList(args.resource_files,
+                                          args.format,
+                                          getattr(args, 'workers', 1),
+                                          getattr(args, 'resource_cache', None),
+                                          author_ids,
+                                          max_titles).titles
         else:
-            self.resource_list = ResourceList()
+            self.resource_list = ResourceList(max_titles=max_titles)
             self.resources = self.resource_list.titles
             section = self.config['BIB SRU API']
             self.sru_bib_query = api_query.APIQuery(config_section=section)
-        # Identifiers of identities to be removed from ISNI request
-        deletable_identities = set()
 
-        self.max_number_of_titles = int(self.config['SETTINGS'].get('max_titles'))
+    def get_convertible_fields(self, args):
+        """
+        Get tags of main entry fields of identity types to be converted
+        :param args: parameters that are passed to converter as command line arguments
+        """
         if args.identity_types == "persons":
-            convertible_fields = ['100']
+            return ['100']
         elif args.identity_types == "organisations":
-            convertible_fields = ['110']
+            return ['110']
+        return ['100', '110']
+
+    def is_removable(self, record, convertible_fields):
+        """
+        Checks if authority record is not to be converted into ISNI request
+        :param record: MARC21 authority record
+        :param convertible_fields: tags of main entry fields of identity types to be converted
+        """
+        if not any(f in record for f in convertible_fields):
+            return True
+        removable = False
+        for field in record.get_fields('075'):
+            for sf in field.get_subfields('a'):
+                if sf == "ei-RDA-entiteetti":
+                    removable = True
+        for field in record.get_fields('STA'):
+            for sf in field.get_subfields('a'):
+                if sf in ["TEST", "DELETED"]:
+                    removable = True
+        for field in record.get_fields('368'):
+            for sf in field.get_subfields('a'):
+                if sf in ['festivaali',
+                          'hiippakuntakokous',
+                          'kilpailu (tapahtuma)',
+                          'kirkolliskokous',
+                          'kokous',
+                          'konferenssi',
+                          'konferenssi/seminaari',
+                          'näyttely',
+                          'pappeinkokous',
+                          'piispainkokous',
+                          'seminaari',
+                          'taidetapahtuma',
+                          'tapahtuma',
+                          'urheilutapahtuma']:
+                    removable = True
+        return removable
+
+    def is_in_progress(self, record):
+        """
+        Checks if authority record has an unfinished ISNI request marked in field 924
+        :param record: MARC21 authority record
+        """
+        for field in record.get_fields('924'):
+            if 'x' in field:
+                return True
+        return False
+
+    def get_identity(self, record_id, record, identifier=None):
+        """
+        Converts data of one MARC21 authority record to dict
+        Titles of works from field 670 are added to key 'resource'
+        Returns None if record has no valid personal name
+        :param record_id: local identifier of record
+        :param record: MARC21 authority record
+        :param identifier: identifier of the database of requestor attached to local identifier
+        """
+        identity = {}
+        identity['isni load'] = True
+        for field in record.get_fields('983'):
+            for sf in field.get_subfields('a'): 
+                if sf == "ei-isni-loadi-ed":
+                    identity['isni load'] = False
+        identity['errors'] = []
+        identity['isNot'] = []
+
+        if identifier:
+            identity['identifier'] = "(" + identifier + ")" + record_id
         else:
-            convertible_fields = ['100', '110']
-        isnis = {}
+            identity['identifier'] = record_id
+        identity['isRelated'] = self.get_related_names(record, identity)
+        if '100' in record:
+            identity['identityType'] = 'personOrFiction'
+            personal_name = None
+            try:
+                personal_name = self.get_personal_name(record['100'])
+                if not personal_name:
+                    return
+            except ValueError as e:
+                identity['errors'].append(str(e) + " 100")
+            if personal_name:
+                identity['personalName'] = personal_name
+                identity['personalNameVariant'] = []
+                for field in record.get_fields('400'):
+                    variant = None
+                    try:
+                        variant = self.get_personal_name(field)
+                    except ValueError as e:
+                        identity['errors'].append(str(e) + " 400")
+                    is_related_name = False
+                    for sf in field.get_subfields('4'):
+                        if sf in ['toni', 'pseu']:
+                            is_related_name = True
+                    if is_related_name:
+                        if variant:
+                            related_person = {
+                                "identifier": None,
+                                "identityType": 'personOrFiction',
+                                "organisationName": None,
+                                "personalName": variant,
+                                "startDateOfRelationship": None,
+                                "endDateOfRelationship": None
+                            }
+                            if sf == 'toni':
+                                related_person['relationType'] = 'real name'
+                            elif sf == 'pseu':
+                                related_person['relationType'] = 'pseud'
+                            identity['isRelated'].append(related_person)
+                    else:
+                        if variant:
+                            identity['personalNameVariant'].append(variant)
+                try:
+                    fuller_names = self.get_fuller_names(record)
+                    for fn in fuller_names:
+                        # check for duplicate names:
+                        if not any(pnv['surname'] == fn['surname'] and pnv['forename'] == fn['forename'] for pnv in identity['personalNameVariant']):
+                            identity['personalNameVariant'].append({'nameUse': 'public', 'surname': fn['surname'], 'forename': fn['forename']})
+                except ValueError:
+                    identity['errors'].append(str(e))
+        elif '110' in record:
+            identity['identityType'] = 'organisation'
+            organisation_name = self.get_organisation_name(record['110'], record)
+            if not organisation_name['mainName']:
+                identity['errors'].append("Subfield a missing from field %s"%(record['110']))
+            else:
+                identity['organisationName'] = organisation_name
+                identity['organisationNameVariant'] = []
+                for field in record.get_fields('410'):
+                    variant = self.get_organisation_name(field, record)
+                    if variant['mainName']:
+                        identity['organisationNameVariant'].append(variant)
+                    else:
+                        identity['errors'].append("Subfield a missing from field %s"%(field))
+                identity['organisationType'] = self.get_organisation_type(record)
+        identifiers = {}
+        identity['ISNI'] = None
+        identity['otherIdentifierOfIdentity'] = []
+        for field in record.get_fields('024'):
+            identifier_type = None
+            identifier = None
+            if 'a' in field and '2' in field:
+                identifier = field['a']
+                if field['2'] in ["viaf", "orcid", "wikidata"]:
+                    identifier_type = field['2'].upper()     
+                    if field['2'] == "orcid":
+                        valid = self.validator.valid_ORCID(field['a'])
+                        if valid:
+                            identifier = field['a'].replace('https://orcid.org/', '')
+                        else:
+                            identity['errors'].append("ORCID invalid in record")
+                    elif field['2'] == "wikidata":               
+                        identifier = identifier.replace('https://www.wikidata.org/wiki/', '')
+                    if identifier:
+                        identifiers[identifier_type] = identifier
+                elif field['2'] == "isni":
+                    identity['ISNI'] = identifier
+
+        for identifier_type in identifiers:
+            identity['otherIdentifierOfIdentity'].append({'identifier': identifiers[identifier_type], 'type': identifier_type})
+
+        general_instruction = None
+        for field in record.get_fields('924'):
+            for sf in field.get_subfields('q'):
+                if sf in ['merge', 'isNot']:
+                    if general_instruction == 'isNot' and sf == 'merge':
+                        general_instruction = 'merge'
+                    elif sf == 'isNot':
+                        general_instruction = 'isNot'
+                    elif sf == 'merge':
+                        general_instruction = 'merge'
+        for field in record.get_fields('924'):
+            if not 'x' in field:
+                identifier = None
+                identifier_type = None
+                field_instruction = None
+                for sf in field.get_subfields('a'):
+                    identifier = sf
+                for sf in field.get_subfields('q'):
+                    if sf in ['merge', 'isNot']:
+                        field_instruction = sf
+                if not field_instruction:
+                    if general_instruction == 'isNot':
+                        field_instruction = general_instruction
+                for sf in field.get_subfields('2'):
+                    identifier_type = sf
+                    if identifier_type == 'isni':
+                        identifier_type = 'ISNI'
+                    elif identifier_type == 'isni-ppn':
+                        identifier_type = 'PPN'
+                if identifier and identifier_type:
+                    if field_instruction == 'merge':
+                        if identity['ISNI']:
+                            if identity['ISNI'] != identifier:
+                                identity['errors'].append("Field 024 ISNI and field 924 merge command are in conflict")
+                        if any(identifier['type'] in ['ISNI', 'PPN'] for identifier in identity['otherIdentifierOfIdentity']):
+                            identity['errors'].append("Duplicate merge commands")
+                        identity['otherIdentifierOfIdentity'].append({'identifier': identifier, 'type': identifier_type})
+                    if field_instruction == 'isNot':
+                        identity['isNot'].append({'identifier': identifier, 'type': identifier_type})
+        for field in record.get_fields('046'):
+            # NOTE: it is assumed that only one MARC21 field for dates is used
+            dates = self.get_dates(field, identity['identityType'])
+            if dates:
+                if identity['identityType'] == 'personOrFiction':
+                    identity['birthDate'] = dates['birthDate'] 
+                    identity['deathDate'] = dates['deathDate']
+                    identity['dateType'] = dates['dateType']
+                if identity['identityType'] == 'organisation':
+                    identity['usageDateFrom'] = dates['usageDateFrom'] 
+                    identity['usageDateTo'] = dates['usageDateTo']
+
+        language_codes = []   
+        for field in record.get_fields('377'):
+            for sf in field.get_subfields("a"):
+                if self.validator.valid_language_code(sf):
+                    language_codes.append(sf)
+                else:
+                    identity['errors'].append('wrong language code in field 377')
+        identity['languageOfIdentity'] = language_codes
+
+        country_codes = []
+        identity['countriesAssociated'] = []
+        identity['countryCode'] = None
+        for field in record.get_fields("043"):
+            for sf in field.get_subfields("c"):
+                if self.validator.valid_country_code(sf):
+                    country_codes.append(sf)
+
+        if any(cc == "AX" for cc in country_codes):
+            identity['countryCode'] = "AX"
+            for cc in country_codes:
+                if cc != "AX":
+                    identity['countriesAssociated'].append(cc)
+        elif len(country_codes) == 1:
+            identity['countryCode'] = country_codes[0]
+        elif len(country_codes) > 1:
+            identity['countryCode'] = country_codes[0]
+            identity['countriesAssociated'] = country_codes[1:]
+
+        uris = []
+        for field in record.get_fields("670"):
+            if 'a' in field:
+                if not field['a'].lower().startswith("väittelijän"):
+                    for sf in field.get_subfields("u"):
+                        uris.append(sf) 
+        identity['URI'] = uris
+        identity['resource'] = []
+        # get resource information
+        for field in record.get_fields('670'):
+            resource = {}
+            for sf in field.get_subfields('a'):
+                if "ENNAKKOTIEDOT-ISNI:" in sf and "(ISBN:" in sf:
+                    sf = sf.split("(ISBN:")
+                    title = sf[0].replace("ENNAKKOTIEDOT-ISNI:", "").strip()
+                    isbn = sf[1].replace("(ISBN:", "")
+                    if isbn.endswith(")"):
+                        resource['identifiers'] = {'ISBN': [isbn[:-1].strip()]}
+                        resource['title'] = title
+                        resource['date'] = None
+                        resource['language'] = None
+                        resource['role'] = 'author'
+                    else:
+                        identity['errors'].append("ENNAKKOTIEDOT in field 670 malformatted")
+            if resource:    
+                resource['creationClass'] = None
+                resource['creationRole'] = 'aut'
+                resource['publisher'] = None
+                identity['resource'].append(resource)
+
+        return identity
+
+    def convert_record(self, record_id, record, convertible_fields, identifier=None):
+        """
+        Converts one authority record independently of other records
+        Returns a tuple of removability, unfinished ISNI request and identity, which is None for removable records
+        :param record_id: local identifier of record
+        :param record: MARC21 authority record
+        :param convertible_fields: tags of main entry fields of identity types to be converted
+        :param identifier: identifier of the database of requestor attached to local identifier
+        """
+        if not record_id or self.is_removable(record, convertible_fields):
+            return True, False, None
+        return False, self.is_in_progress(record), self.get_identity(record_id, record, identifier)
+
+    def convert_records(self, records, convertible_fields, identifier=None, workers=1):
+        """
+        Converts authority records with convert_record in the calling process by default
+        If more than one worker is given, records are converted in batches with a process pool, which pays off only with
+        several CPU cores and enough records to cover pickling records to worker processes and identities back
+        Returns a list of results in the original order of records
+        :param records: dict of MARC21 records with local identifiers as keys
+        :param convertible_fields: tags of main entry fields of identity types to be converted
+        :param identifier: identifier of the database of requestor attached to local identifier
+        :param workers: number of worker processes
+        """
+        if not workers or workers < 2 or len(records) <= IDENTITY_BATCH_SIZE:
+            return [self.convert_record(record_id, records[record_id], convertible_fields, identifier) for record_id in records]
+        items = [(record_id, serialize_record(records[record_id])) for record_id in records]
+        batches = [items[idx:idx + IDENTITY_BATCH_SIZE] for idx in range(0, len(items), IDENTITY_BATCH_SIZE)]
+        logging.info("Converting %s authority records in %s batches with %s processes"%(len(items), len(batches), workers))
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_identity_worker, initargs=(self.config,)) as executor:
+            for batch_results in executor.map(convert_identity_batch, batches,
+                                              [convertible_fields] * len(batches), [identifier] * len(batches)):
+                results.extend(batch_results)
+        return results
+
+    def get_authority_data(self, args, request_ids=set()):
+        """
+        Converts MARC21 authority bibliographic record data to dict
+        :param args: parameters that are passed to converter as command line arguments
+        :param request_ids: set of local identifiers of records to be converted into ISNI request
+        """
+        self.request_ids = request_ids
+        # Identifiers of identities to be removed from ISNI request
+        deletable_identities = set()
+
+        self.max_number_of_titles = int(self.config['SETTINGS'].get('max_titles'))
+        convertible_fields = self.get_convertible_fields(args)
         identities = {}
 
         records = self.read_marc_records(args)
-        for record_id in records:
-            record = records[record_id]
-            if not record_id or not any(f in record for f in convertible_fields):
+        results = self.convert_records(records, convertible_fields, args.identifier, getattr(args, 'conversion_workers', 1))
+        for record_id, (removable, in_progress, identity) in zip(records, results):
+            if not record_id or removable:
                 if record_id:
                     self.request_ids.discard(record_id)
                 continue
-            removable = False
-            for field in record.get_fields('075'):
-                for sf in field.get_subfields('a'):
-                    if sf == "ei-RDA-entiteetti":
-                        removable = True
-            for field in record.get_fields('STA'):
-                for sf in field.get_subfields('a'):
-                    if sf in ["TEST", "DELETED"]:
-                        removable = True
-            for field in record.get_fields('368'):
-                for sf in field.get_subfields('a'):
-                    if sf in ['festivaali',
-                              'hiippakuntakokous',
-                              'kilpailu (tapahtuma)',
-                              'kirkolliskokous',
-                              'kokous',
-                              'konferenssi',
-                              'konferenssi/seminaari',
-                              'näyttely',
-                              'pappeinkokous',
-                              'piispainkokous',
-                              'seminaari',
-                              'taidetapahtuma',
-                              'tapahtuma',
-                              'urheilutapahtuma']:
-                        removable = True
-            for field in record.get_fields('924'):
-                if 'x' in field:
-                    self.request_ids.discard(record_id)
-            if removable:
-                if record_id in self.request_ids:
-                    self.request_ids.discard(record_id)
+            if in_progress:
+                self.request_ids.discard(record_id)
+            self.records[record_id] = records[record_id]
+            if not identity:
                 continue
-
-            identities[record_id] = {}
-            identity = identities[record_id]
-            identity['isni load'] = True
-            self.records[record_id] = record
-            for field in record.get_fields('983'):
-                for sf in field.get_subfields('a'): 
-                    if sf == "ei-isni-loadi-ed":
-                        identity['isni load'] = False
-                        deletable_identities.add(record_id)
-            identity['errors'] = []
-            identity['isNot'] = []
-
-            if args.identifier:
-                identity['identifier'] = "(" + args.identifier + ")" + record_id
-            else:
-                identity['identifier'] = record_id
-            identity['isRelated'] = self.get_related_names(record, identity)
-            if '100' in record:
-                identity['identityType'] = 'personOrFiction'
-                personal_name = None
-                try:
-                    personal_name = self.get_personal_name(record['100'])
-                    if not personal_name:
-                        del(identities[record_id])
-                except ValueError as e:
-                    identity['errors'].append(str(e) + " 100")
-                if personal_name:
-                    identity['personalName'] = personal_name
-                    identity['personalNameVariant'] = []
-                    for field in record.get_fields('400'):
-                        variant = None
-                        try:
-                            variant = self.get_personal_name(field)
-                        except ValueError as e:
-                            identity['errors'].append(str(e) + " 400")
-                        is_related_name = False
-                        for sf in field.get_subfields('4'):
-                            if sf in ['toni', 'pseu']:
-                                is_related_name = True
-                        if is_related_name:
-                            if variant:
-                                related_person = {
-                                    "identifier": None,
-                                    "identityType": 'personOrFiction',
-                                    "organisationName": None,
-                                    "personalName": variant,
-                                    "startDateOfRelationship": None,
-                                    "endDateOfRelationship": None
-                                }
-                                if sf == 'toni':
-                                    related_person['relationType'] = 'real name'
-                                elif sf == 'pseu':
-                                    related_person['relationType'] = 'pseud'
-                                identity['isRelated'].append(related_person)
-                        else:
-                            if variant:
-                                identity['personalNameVariant'].append(variant)
-                    try:
-                        fuller_names = self.get_fuller_names(record)
-                        for fn in fuller_names:
-                            # check for duplicate names:
-                            if not any(pnv['surname'] == fn['surname'] and pnv['forename'] == fn['forename'] for pnv in identity['personalNameVariant']):
-                                identity['personalNameVariant'].append({'nameUse': 'public', 'surname': fn['surname'], 'forename': fn['forename']})
-                    except ValueError:
-                        identity['errors'].append(str(e))
-            elif '110' in record:
-                identity['identityType'] = 'organisation'
-                organisation_name = self.get_organisation_name(record['110'], record)
-                if not organisation_name['mainName']:
-                    identity['errors'].append("Subfield a missing from field %s"%(record['110']))
-                else:
-                    identity['organisationName'] = organisation_name
-                    identity['organisationNameVariant'] = []
-                    for field in record.get_fields('410'):
-                        variant = self.get_organisation_name(field, record)
-                        if variant['mainName']:
-                            identity['organisationNameVariant'].append(variant)
-                        else:
-                            identity['errors'].append("Subfield a missing from field %s"%(field))
-                    identity['organisationType'] = self.get_organisation_type(record)
-            if record_id in identities:
-                identifiers = {}
-                identity['ISNI'] = None
-                identity['otherIdentifierOfIdentity'] = []
-                for field in record.get_fields('024'):
-                    identifier_type = None
-                    identifier = None
-                    if 'a' in field and '2' in field:
-                        identifier = field['a']
-                        if field['2'] in ["viaf", "orcid", "wikidata"]:
-                            identifier_type = field['2'].upper()     
-                            if field['2'] == "orcid":
-                                valid = self.validator.valid_ORCID(field['a'])
-                                if valid:
-                                    identifier = field['a'].replace('https://orcid.org/', '')
-                                else:
-                                    identity['errors'].append("ORCID invalid in record")
-                            elif field['2'] == "wikidata":               
-                                identifier = identifier.replace('https://www.wikidata.org/wiki/', '')
-                            if identifier:
-                                identifiers[identifier_type] = identifier
-                        elif field['2'] == "isni":
-                            identity['ISNI'] = identifier
-                            isnis[record_id] = identifier
-
-                for identifier_type in identifiers:
-                    identity['otherIdentifierOfIdentity'].append({'identifier': identifiers[identifier_type], 'type': identifier_type})
-
-                general_instruction = None
-                for field in record.get_fields('924'):
-                    for sf in field.get_subfields('q'):
-                        if sf in ['merge', 'isNot']:
-                            if general_instruction == 'isNot' and sf == 'merge':
-                                general_instruction = 'merge'
-                            elif sf == 'isNot':
-                                general_instruction = 'isNot'
-                            elif sf == 'merge':
-                                general_instruction = 'merge'
-                for field in record.get_fields('924'):
-                    if not 'x' in field:
-                        identifier = None
-                        identifier_type = None
-                        field_instruction = None
-                        for sf in field.get_subfields('a'):
-                            identifier = sf
-                        for sf in field.get_subfields('q'):
-                            if sf in ['merge', 'isNot']:
-                                field_instruction = sf
-                        if not field_instruction:
-                            if general_instruction == 'isNot':
-                                field_instruction = general_instruction
-                        for sf in field.get_subfields('2'):
-                            identifier_type = sf
-                            if identifier_type == 'isni':
-                                identifier_type = 'ISNI'
-                            elif identifier_type == 'isni-ppn':
-                                identifier_type = 'PPN'
-                        if identifier and identifier_type:
-                            if field_instruction == 'merge':
-                                if identity['ISNI']:
-                                    if identity['ISNI'] != identifier:
-                                        identity['errors'].append("Field 024 ISNI and field 924 merge command are in conflict")
-                                if any(identifier['type'] in ['ISNI', 'PPN'] for identifier in identity['otherIdentifierOfIdentity']):
-                                    identity['errors'].append("Duplicate merge commands")
-                                identity['otherIdentifierOfIdentity'].append({'identifier': identifier, 'type': identifier_type})
-                            if field_instruction == 'isNot':
-                                identity['isNot'].append({'identifier': identifier, 'type': identifier_type})
-                for field in record.get_fields('046'):
-                    # NOTE: it is assumed that only one MARC21 field for dates is used
-                    dates = self.get_dates(field, identity['identityType'])
-                    if dates:
-                        if identity['identityType'] == 'personOrFiction':
-                            identity['birthDate'] = dates['birthDate'] 
-                            identity['deathDate'] = dates['deathDate']
-                            identity['dateType'] = dates['dateType']
-                        if identity['identityType'] == 'organisation':
-                            identity['usageDateFrom'] = dates['usageDateFrom'] 
-                            identity['usageDateTo'] = dates['usageDateTo']
-
-                language_codes = []   
-                for field in record.get_fields('377'):
-                    for sf in field.get_subfields("a"):
-                        if self.validator.valid_language_code(sf):
-                            language_codes.append(sf)
-                        else:
-                            identity['errors'].append('wrong language code in field 377')
-                identity['languageOfIdentity'] = language_codes
-
-                country_codes = []
-                identity['countriesAssociated'] = []
-                identity['countryCode'] = None
-                for field in record.get_fields("043"):
-                    for sf in field.get_subfields("c"):
-                        if self.validator.valid_country_code(sf):
-                            country_codes.append(sf)
-
-                if any(cc == "AX" for cc in country_codes):
-                    identity['countryCode'] = "AX"
-                    for cc in country_codes:
-                        if cc != "AX":
-                            identity['countriesAssociated'].append(cc)
-                elif len(country_codes) == 1:
-                    identity['countryCode'] = country_codes[0]
-                elif len(country_codes) > 1:
-                    identity['countryCode'] = country_codes[0]
-                    identity['countriesAssociated'] = country_codes[1:]
-
-                uris = []
-                for field in record.get_fields("670"):
-                    if 'a' in field:
-                        if not field['a'].lower().startswith("väittelijän"):
-                            for sf in field.get_subfields("u"):
-                                uris.append(sf) 
-                identity['URI'] = uris
-                identity['resource'] = []
-                # get resource information
-                for field in record.get_fields('670'):
-                    resource = {}
-                    for sf in field.get_subfields('a'):
-                        if "ENNAKKOTIEDOT-ISNI:" in sf and "(ISBN:" in sf:
-                            sf = sf.split("(ISBN:")
-                            title = sf[0].replace("ENNAKKOTIEDOT-ISNI:", "").strip()
-                            isbn = sf[1].replace("(ISBN:", "")
-                            if isbn.endswith(")"):
-                                resource['identifiers'] = {'ISBN': [isbn[:-1].strip()]}
-                                resource['title'] = title
-                                resource['date'] = None
-                                resource['language'] = None
-                                resource['role'] = 'author'
-                            else:
-                                identity['errors'].append("ENNAKKOTIEDOT in field 670 malformatted")
-                    if resource:    
-                        resource['creationClass'] = None
-                        resource['creationRole'] = 'aut'
-                        resource['publisher'] = None
-                        if not record_id in self.resources:
-                            self.resources[record_id] = []
-                        self.resources[record_id].append(resource)
+            if not identity['isni load']:
+                deletable_identities.add(record_id)
+            identities[record_id] = identity
 
         merge_ids = {}
 
@@ -478,19 +750,32 @@ class MARC21Converter:
                 if linked_ids:
                     merge_ids[id] = linked_ids
 
+        # titles are needed only for requested identities and organisations merged into them
+        author_ids = set(self.request_ids)
+        for merge_id in merge_ids:
+            author_ids.update(merge_ids[merge_id])
+        self.load_resources(args, author_ids)
         for record_id in identities:
-            if not args.resource_files:
-                resource_ids = set()
+            if identities[record_id]['resource']:
+                if not record_id in self.resources:
+                    self.resources[record_id] = []
+                self.resources[record_id].extend(identities[record_id]['resource'])
+
+        if not args.resource_files:
+            resource_ids = set()
+            for record_id in identities:
                 if record_id in self.request_ids and identities[record_id]['isni load']:
                     resource_ids.add(record_id)
                     if record_id in merge_ids:
                         resource_ids.update(merge_ids[record_id])
-                for resource_id in resource_ids:
-                    self.api_search_resources(resource_id)
-                    if resource_id in self.resources:
-                        identities[resource_id]['resource'] = self.resources[resource_id]
-            elif record_id in self.resources:
-                identities[record_id]['resource'] = self.resources[record_id]
+            self.api_search_resources_concurrently(resource_ids)
+            for resource_id in resource_ids:
+                if resource_id in self.resources:
+                    identities[resource_id]['resource'] = self.resources[resource_id]
+        else:
+            for record_id in identities:
+                if record_id in self.resources:
+                    identities[record_id]['resource'] = self.resources[record_id]
         for merge_id in merge_ids:
             if merge_id in self.request_ids:
                 identities[merge_id] = self.merge_identities(merge_id, merge_ids[merge_id], identities)
@@ -499,38 +784,7 @@ class MARC21Converter:
             if len(identities[id]['resource']) > self.max_number_of_titles:
                 identities[id]['resource'] = self.get_relevant_resources(identities[id]['resource'], identities[id]['languageOfIdentity'])
         for record_id in identities:
-            if not 'isNot' in identities[record_id]:
-                identities[record_id]['isNot'] = []
-            # delete related names with invalid relation types
-            for related_name in identities[record_id]['isRelated']:
-                if 'identifier' in related_name:
-                    related_id = related_name['identifier']
-                    if related_id:
-                        if related_id in identities:
-                            if identities[related_id]['ISNI']:
-                                if self.validator.valid_ISNI_checksum(identities[related_id]['ISNI']):
-                                    related_name['ISNI'] = identities[related_id]['ISNI']
-                                else:
-                                    identities[record_id]['errors'].append('Related record id %s has invalid ISNI %s'
-                                                                           %(related_id, identities[related_id]['ISNI']))
-                        else:
-                            identities[record_id]['errors'].append('Related record id %s not in database'%related_id)
-
-            deletable_relations = []
-            for idx, related_name in enumerate(identities[record_id]['isRelated']): 
-                relationType = related_name['relationType']
-                if not relationType:
-                    if not(identities[record_id]['identityType'] == 'organisation' and \
-                        related_name['identityType'] == 'organisation'):
-                        if not related_name['relationType']:
-                            related_name['relationType'] = "undefined or unknown"
-                    elif idx not in deletable_relations:
-                        deletable_relations.append(idx)
-                else:
-                    related_name['relationType'] = relationType
-            deletable_relations.reverse()
-            for idx in deletable_relations:
-                del(identities[record_id]['isRelated'][idx])
+            self.set_related_identities(record_id, identities)
 
         del_counter = 0
         for record_id in identities:
@@ -550,6 +804,182 @@ class MARC21Converter:
 
         return identities
 
+    def iterate_authority_data(self, args, request_ids=set()):
+        """
+        Converts MARC21 authority records to dicts and yields them one by one as tuples of local identifier and identity
+        Authority file is read twice: first pass collects a compact summary of every identity for merging organisations
+        and for ISNIs of related names, second pass converts records without keeping them in memory
+        Records requested with APIs or read with index are not streamed, because they are already restricted to requested records
+        :param args: parameters that are passed to converter as command line arguments
+        :param request_ids: set of local identifiers of records to be converted into ISNI request
+        """
+        if not args.authority_files or getattr(args, 'use_index', False) and request_ids:
+            identities = self.get_authority_data(args, request_ids)
+            for record_id in identities:
+                yield record_id, identities[record_id]
+            return
+        self.request_ids = request_ids
+        self.load_resources(args)
+        self.max_number_of_titles = int(self.config['SETTINGS'].get('max_titles'))
+        convertible_fields = self.get_convertible_fields(args)
+        self.cataloguers = self.config_values_to_python_object('SETTINGS', 'cataloguers')
+        # compact data of identities needed when converting other records
+        summaries = {}
+        for position, record in enumerate(self.read_authority_file(args)):
+            record_id = record['001'].data
+            self.request_ids.add(record_id)
+            if not self.in_time_range(record, args):
+                self.request_ids.discard(record_id)
+            # the last one of records with duplicate identifiers is converted
+            summaries.pop(record_id, None)
+            if self.is_removable(record, convertible_fields):
+                self.request_ids.discard(record_id)
+                continue
+            if self.is_in_progress(record):
+                self.request_ids.discard(record_id)
+            identity = self.get_identity(record_id, record, args.identifier)
+            if not identity:
+                continue
+            if identity['resource']:
+                if not record_id in self.resources:
+                    self.resources[record_id] = []
+                self.resources[record_id].extend(identity['resource'])
+            summaries[record_id] = {
+                'ISNI': identity['ISNI'],
+                'isni load': identity['isni load'],
+                'identityType': identity['identityType'],
+                'organisationName': identity.get('organisationName'),
+                'isRelated': [related for related in identity['isRelated'] if related['identityType'] == 'organisation'
+                              and related['relationType'] in ['supersedes', 'isSupersededBy']],
+                'resource': self.resources.get(record_id, []),
+                'position': position,
+                'errors': [],
+                'isNot': []
+            }
+
+        logging.info("Converting authority records...")
+        counter = 0
+        del_counter = 0
+        records = self.read_convertible_records(args, summaries)
+        if not args.resource_files:
+            records = self.prefetch_resources(records, summaries)
+        for record_id, record in records:
+            identity = self.get_identity(record_id, record, args.identifier)
+            identities = ChainMap({record_id: identity}, summaries)
+            if record_id in self.resources:
+                identity['resource'] = self.resources[record_id]
+            linked_ids = []
+            self.get_linked_organisation_records(record_id, linked_ids, identities)
+            if linked_ids:
+                identity = self.merge_identities(record_id, linked_ids, identities)
+            if len(identity['resource']) > self.max_number_of_titles:
+                identity['resource'] = self.get_relevant_resources(identity['resource'], identity['languageOfIdentity'])
+            self.set_related_identities(record_id, identities)
+            if not identity['resource']:
+                del_counter += 1
+                continue
+            if args.mode != 'write':
+                # records are needed for writing ISNI identifiers received from ISNI
+                self.records[record_id] = record
+            counter += 1
+            yield record_id, identity
+
+        logging.info("Number of discarded records: %s"%del_counter)
+        logging.info("Number of identities converted: %s"%counter)
+
+    def read_convertible_records(self, args, summaries):
+        """
+        Reads authority file again and yields tuples of local identifier and record for records to be converted
+        :param args: parameters that are passed to converter as command line arguments
+        :param summaries: dict of compact identity data collected from authority file
+        """
+        for position, record in enumerate(self.read_authority_file(args)):
+            record_id = record['001'].data
+            if record_id not in self.request_ids or record_id not in summaries:
+                continue
+            if summaries[record_id]['position'] != position or not summaries[record_id]['isni load']:
+                continue
+            yield record_id, record
+
+    def prefetch_resources(self, records, summaries):
+        """
+        Requests titles of identities and organisations merged into them with SRU API for batches of records
+        before records are yielded for conversion
+        :param records: iterable of tuples of local identifier and MARC21 authority record
+        :param summaries: dict of compact identity data collected from authority file
+        """
+        batch_size = RESOURCE_BATCH_SIZE * int(self.config['BIB SRU API'].get('concurrency', fallback=1))
+        searched_ids = set()
+        batch = []
+        for record_id, record in records:
+            batch.append((record_id, record))
+            if len(batch) >= batch_size:
+                self.search_batch_resources([id for id, record in batch], summaries, searched_ids)
+                for item in batch:
+                    yield item
+                batch = []
+        self.search_batch_resources([id for id, record in batch], summaries, searched_ids)
+        for item in batch:
+            yield item
+
+    def search_batch_resources(self, record_ids, summaries, searched_ids):
+        """
+        Requests titles of identities and organisations merged into them concurrently with SRU API
+        :param record_ids: local identifiers of identities
+        :param summaries: dict of compact identity data collected from authority file
+        :param searched_ids: local identifiers of identities whose titles are already requested
+        """
+        resource_ids = set()
+        for record_id in record_ids:
+            linked_ids = []
+            self.get_linked_organisation_records(record_id, linked_ids, summaries)
+            resource_ids.add(record_id)
+            resource_ids.update(linked_ids)
+        resource_ids -= searched_ids
+        self.api_search_resources_concurrently(resource_ids)
+        searched_ids.update(resource_ids)
+        for resource_id in resource_ids:
+            if resource_id in self.resources:
+                summaries[resource_id]['resource'] = self.resources[resource_id]
+
+    def set_related_identities(self, record_id, identities):
+        """
+        Adds ISNIs of related names and deletes related names with invalid relation types
+        :param record_id: local identifier of an identity
+        :param identities: a dict of identity data
+        """
+        if not 'isNot' in identities[record_id]:
+            identities[record_id]['isNot'] = []
+        for related_name in identities[record_id]['isRelated']:
+            if 'identifier' in related_name:
+                related_id = related_name['identifier']
+                if related_id:
+                    if related_id in identities:
+                        if identities[related_id]['ISNI']:
+                            if self.validator.valid_ISNI_checksum(identities[related_id]['ISNI']):
+                                related_name['ISNI'] = identities[related_id]['ISNI']
+                            else:
+                                identities[record_id]['errors'].append('Related record id %s has invalid ISNI %s'
+                                                                       %(related_id, identities[related_id]['ISNI']))
+                    else:
+                        identities[record_id]['errors'].append('Related record id %s not in database'%related_id)
+
+        deletable_relations = []
+        for idx, related_name in enumerate(identities[record_id]['isRelated']): 
+            relationType = related_name['relationType']
+            if not relationType:
+                if not(identities[record_id]['identityType'] == 'organisation' and \
+                    related_name['identityType'] == 'organisation'):
+                    if not related_name['relationType']:
+                        related_name['relationType'] = "undefined or unknown"
+                elif idx not in deletable_relations:
+                    deletable_relations.append(idx)
+            else:
+                related_name['relationType'] = relationType
+        deletable_relations.reverse()
+        for idx in deletable_relations:
+            del(identities[record_id]['isRelated'][idx])
+
     def get_related_identifiers(self, record_id, identities, related_ids):
         """
         Get identifiers of organisations predecessors and successors for ISNI isNot element
@@ -892,6 +1322,50 @@ class MARC21Converter:
             return {"usageDateFrom": start_date, "usageDateTo": end_date}
 
     def api_search_resources(self, identity_id):
+        """
+        Requests bibliographic records of an identity with SRU API and adds their titles to resource list
+        :param identity_id: local identifier of identity
+        """
+        try:
+            records = self.fetch_resource_records(identity_id)
+        except api_query.APIQueryError as e:
+            logging.error("Titles of identity %s not requested: %s"%(identity_id, e))
+            return
+        for record in records:
+            if record:
+                self.resource_list.add_record_data(record, identity_id)
+
+    def api_search_resources_concurrently(self, identity_ids):
+        """
+        Requests bibliographic records of identities with concurrent SRU API queries
+        Number of concurrent queries is set with concurrency in config section BIB SRU API.
+        Records are fetched in worker threads and titles are added to resource list only in calling thread.
+        :param identity_ids: local identifiers of identities
+        """
+        concurrency = int(self.config['BIB SRU API'].get('concurrency', fallback=1))
+        if concurrency < 2 or len(identity_ids) < 2:
+            for identity_id in identity_ids:
+                self.api_search_resources(identity_id)
+            return
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(self.fetch_resource_records, identity_id): identity_id for identity_id in identity_ids}
+            for future in as_completed(futures):
+                identity_id = futures[future]
+                try:
+                    records = future.result()
+                except api_query.APIQueryError as e:
+                    logging.error("Titles of identity %s not requested: %s"%(identity_id, e))
+                    continue
+                for record in records:
+                    if record:
+                        self.resource_list.add_record_data(record, identity_id)
+
+    def fetch_resource_records(self, identity_id):
+        """
+        Requests bibliographic records of an identity with SRU API
+        Responses are parsed while they are received, if stream is set in config section BIB SRU API
+        :param identity_id: local identifier of identity
+        """
         records = []
         # query parameters for Fikka search
         query = "melinda.asterinameid=" + identity_id + " AND (melinda.authenticationcode=finb OR melinda.authenticationcode=finbd)"
@@ -900,32 +1374,42 @@ class MARC21Converter:
         offset = int(config_parameters['maximumRecords'])
         additional_parameters = {'startRecord': str(record_position)}
         logging.info("Requesting bibliographical records for authority record %s"%identity_id)
-        response = self.sru_bib_query.api_search(query=query, parameters=additional_parameters)
-        response_records = parse_sru_response.get_records(response)    
-        if response_records:    
-            records.extend(response_records)
-        number = parse_sru_response.get_number_of_records(response)
+        response_records, number = self.search_resource_records(query, additional_parameters)
+        records.extend(response_records)
         # if less than 10 query results, query from Melinda
         if number < 10:
             query = "melinda.asterinameid=" + identity_id + " NOT melinda.authenticationcode=finb NOT melinda.authenticationcode=finbd"
-            response = self.sru_bib_query.api_search(query=query, parameters=additional_parameters)
-            response_records = parse_sru_response.get_records(response) 
-            if response_records:         
-                records.extend(response_records)
-            number = parse_sru_response.get_number_of_records(response)
+            response_records, number = self.search_resource_records(query, additional_parameters)
+            records.extend(response_records)
         max_number = int(self.config['BIB SRU API'].get('total_records'))
-        if number > max_number:
-            number = max_number
-        record_position += offset
-        while (record_position - 1 < number):
-            additional_parameters['startRecord'] = str(record_position)
-            response = self.sru_bib_query.api_search(query=query, parameters=additional_parameters)
-            if response_records:  
+        parse = None
+        if self.sru_bib_query.stream:
+            parse = lambda body: list(parse_sru_response.SRUResponseStream(body))
+        # pages after the first one are requested concurrently
+        for response in self.sru_bib_query.get_pages(query, number, offset, start_record=record_position + offset,
+                                                     max_records=max_number, parse=parse):
+            if parse:
+                records.extend(response)
+            else:
                 records.extend(parse_sru_response.get_records(response))
-            record_position += offset
-        for record in records:
-            if record:
-                self.resource_list.add_record_data(record, identity_id)
+
+        return records
+
+    def search_resource_records(self, query, parameters):
+        """
+        Requests a page of bibliographic records with SRU API
+        Returns a tuple of records and number of records in query results
+        :param query: SRU query
+        :param parameters: a dict of additional search parameters
+        """
+        if self.sru_bib_query.stream:
+            with self.sru_bib_query.api_search_stream(query=query, parameters=parameters) as body:
+                response = parse_sru_response.SRUResponseStream(body)
+                records = list(response)
+                return records, response.number_of_records
+        response = self.sru_bib_query.api_search(query=query, parameters=parameters)
+
+        return parse_sru_response.get_records(response), parse_sru_response.get_number_of_records(response)
 
     def get_relevant_resources(self, resources, languages=None):
         """
@@ -936,12 +1420,13 @@ class MARC21Converter:
         mergeable_resources = []
         for idx1 in range(len(resources)):
             # add more relevance to titles with multiple editions and include only the title as metadata
-            resources[idx1]['relevance'] = 1
+            # editions are counted already when titles are retained while loading them
+            resources[idx1]['relevance'] = resources[idx1].get('editions', 1)
             if idx1 not in mergeable_resources:
                 for idx2 in range(idx1 + 1, len(resources)):
                     if resources[idx1]['title'] == resources[idx2]['title']:
                         mergeable_resources.append(idx2)
-                        resources[idx1]['relevance'] += 1
+                        resources[idx1]['relevance'] += resources[idx2].get('editions', 1)
                         #resources[idx1]['creationClass'] = None
                         #resources[idx1]['publisher'] = None
                         #resources[idx1]['date'] = None
@@ -2,10 +2,15 @@ import re
 import sys
 import logging
 import copy
+import functools
+import hashlib
+import os
+import pickle
 from term_encoder import TermEncoder
 from validators import Validator
-from pymarc import MARCReader
 from tools import aleph_seq_reader
+from tools import mmap_marc_reader
+from tools import parallel_reader
 
 #creation roles used for sorting and selecting titles for an author, importance of role in alphabetical order:  
 CREATION_ROLES = {
@@ -17,41 +22,149 @@ CREATION_ROLES = {
     "710": "contributor"
 }
 
+# fields needed for ISNI request in addition to leader:
+RESOURCE_TAGS = ['001', '020', '022', '024', '041', '100', '110', '240', '245', '260', '264', '600', '610', '700', '710']
+
 class ResourceList:
     
-    def __init__(self, input_file=None, format=None):
+    def __init__(self, input_file=None, format=None, workers=1, cache_file=None, author_ids=None, max_titles=None):
         """
         Converts MARC21 bibliographic records into a dict object containing relevant data for ISNI request
-        For faster execution crop MARC21 fields from file except 
-        leader, 001, 020, 022, 024, 041, 100, 110, 240, 245, 260, 264, 600, 610, 700, 710
+        Only fields with tags in RESOURCE_TAGS are decoded from files in ISO 2709 format
         :param input_file: file containing MARC21 bibliographical records
         :param format: format of input_file, either 'marc21' or 'alephseq'
+        :param workers: number of processes reading input_file
+        :param cache_file: file path where titles are saved and loaded from, if input_file is unchanged
+        :param author_ids: local identifiers of authors whose titles are read, titles of all authors are read if not given
+        :param max_titles: number of the most relevant titles retained per author and language, all titles are retained if not given
         """
         self.validator = Validator()
         self.term_encoder = TermEncoder()
         self.titles = {}
+        self.author_ids = None
+        if author_ids is not None:
+            self.author_ids = set(author_ids)
+        self.max_titles = max_titles
+        # edition counts, identifiers and the earliest dates of titles removed from retained titles of authors
+        self.removed_editions = {}
 
         if input_file:
+            if format not in ["marc21", "alephseq"]:
+                logging.error("Not valid format to convert from: %s"%format)
+                sys.exit(2)
+            cache_key = None
+            if cache_file:
+                cache_key = self.get_cache_key(input_file, format)
+                if self.load_cache(cache_file, cache_key):
+                    logging.info("Titles loaded from cache file %s"%cache_file)
+                    return
             logging.info('Loading titles...')
-            
-            if format == "marc21":                       
-                reader = MARCReader(open(input_file, 'rb'), to_unicode=True)
-            elif format == "alephseq":                    
-                reader = aleph_seq_reader.AlephSeqReader(open(input_file, 'r', encoding="utf-8"))
+            if workers and workers > 1:
+                self.read_file_in_parallel(input_file, format, workers)
             else:
-                logging.error("Not valid format to convert from: "%format)
-                sys.exit(2)
-            record = ""
-            while record is not None:
-                try:
-                    record = next(reader, None)
-                except Exception as e:
-                    logging.exception(e)
-                    continue
-                if record:
-                    self.add_record_data(record)
-            reader.close()
+                self.read_file(input_file, format)
             logging.info("Resource records from file %s read"%input_file)
+            if cache_file:
+                self.save_cache(cache_file, cache_key)
+
+    def read_file(self, input_file, format):
+        """
+        Reads titles of works from bibliographic file
+        :param input_file: file containing MARC21 bibliographical records
+        :param format: format of input_file, either 'marc21' or 'alephseq'
+        """
+        if format == "marc21":
+            reader = mmap_marc_reader.MMapMARCReader(input_file, RESOURCE_TAGS)
+        else:
+            reader = aleph_seq_reader.AlephSeqReader(open(input_file, 'r', encoding="utf-8"))
+        record = ""
+        while record is not None:
+            try:
+                record = next(reader, None)
+            except Exception as e:
+                logging.exception(e)
+                continue
+            if record:
+                self.add_record_data(record)
+        reader.close()
+
+    def read_file_in_parallel(self, input_file, format, workers):
+        """
+        Reads titles of works from bibliographic file with multiple processes
+        :param input_file: file containing MARC21 bibliographical records
+        :param format: format of input_file, either 'marc21' or 'alephseq'
+        :param workers: number of processes reading input_file
+        """
+        function = functools.partial(read_titles, author_ids=self.author_ids, max_titles=self.max_titles)
+        for titles, removed_editions in parallel_reader.map_ranges(input_file, format, workers, function):
+            for author_id in removed_editions:
+                for title, editions in removed_editions[author_id].items():
+                    self.add_removed_editions(author_id, title, editions)
+            for author_id in titles:
+                if self.max_titles:
+                    for title in titles[author_id]:
+                        self.add_title(author_id, title)
+                elif author_id in self.titles:
+                    self.titles[author_id].extend(titles[author_id])
+                else:
+                    self.titles[author_id] = titles[author_id]
+
+    def get_cache_key(self, input_file, format):
+        """
+        Creates a key identifying input file and versions of code tables and code used for reading titles
+        :param input_file: file containing MARC21 bibliographical records
+        :param format: format of input_file, either 'marc21' or 'alephseq'
+        """
+        stat = os.stat(input_file)
+        directory = os.path.realpath(os.path.join(os.path.dirname(__file__)))
+        code_files = [os.path.join(directory, 'data', file_name) for file_name in sorted(os.listdir(os.path.join(directory, 'data')))]
+        code_files.extend([os.path.join(directory, file_name) for file_name in ['resource_list.py', 'term_encoder.py', 'validators.py']])
+        code_hash = hashlib.blake2b()
+        for file_path in code_files:
+            code_hash.update(get_file_hash(file_path).encode('ascii'))
+        author_hash = None
+        if self.author_ids is not None:
+            author_hash = hashlib.blake2b('\n'.join(sorted(self.author_ids)).encode('utf-8')).hexdigest()
+        return {'path': os.path.realpath(input_file),
+                'format': format,
+                'authors': author_hash,
+                'max_titles': self.max_titles,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'hash': get_file_hash(input_file),
+                'versions': code_hash.hexdigest()}
+
+    def load_cache(self, cache_file, cache_key):
+        """
+        Loads titles from cache file if cache key matches
+        :param cache_file: file path of pickled titles
+        :param cache_key: dict created with function get_cache_key
+        """
+        if not os.path.isfile(cache_file):
+            return False
+        try:
+            with open(cache_file, 'rb') as fh:
+                key = pickle.load(fh)
+                if key != cache_key:
+                    logging.info("Cache file %s outdated"%cache_file)
+                    return False
+                self.titles = pickle.load(fh)
+        except (pickle.UnpicklingError, EOFError) as e:
+            logging.error("Cache file %s is corrupted: %s"%(cache_file, e))
+            return False
+        return True
+
+    def save_cache(self, cache_file, cache_key):
+        """
+        Saves titles into cache file
+        :param cache_file: file path of pickled titles
+        :param cache_key: dict created with function get_cache_key
+        """
+        temp_file = cache_file + '.tmp'
+        with open(temp_file, 'wb') as fh:
+            pickle.dump(cache_key, fh, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(self.titles, fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
 
     def add_record_data(self, record, search_id=None):
         """
@@ -64,6 +177,8 @@ class ResourceList:
             record_id = record['001'].data
         else:
             return
+        if self.author_ids is not None and not self.has_requested_author(record):
+            return
         title = None
         uniform_title = None
         for field in record.get_fields('240'):
@@ -157,6 +272,8 @@ class ResourceList:
                     #remove parenthesis and text inside, e. g. "(FIN11)":
                     author_id = re.sub("[\(].*?[\)]", "", sf)
                
+                if self.author_ids is not None and author_id not in self.author_ids:
+                    continue
                 if author_id and author_id not in authors:
                     #only one creation role possible in ISNI, the first subfield e is chosen
                     if not(search_id and search_id != author_id):
@@ -173,11 +290,83 @@ class ResourceList:
             for author_id in authors:
                 title_copy = copy.copy(title_of_work)
                 title_copy.update(authors[author_id])
-                if author_id in self.titles:
-                    self.titles[author_id].append(title_copy)
-                else:
-                    self.titles[author_id] = [title_copy]
+                self.add_title(author_id, title_copy)
+
+    def add_title(self, author_id, title):
+        """
+        Adds title of work to titles of author
+        If number of retained titles is limited, editions of same title are merged into one title with edition count
+        and the least relevant title in the language of added title is removed, when the limit is exceeded.
+        Titles are ranked by role, number of editions and date like in MARC21Converter.get_relevant_resources,
+        language is not used for ranking, because language preferences of identity are not known yet.
+        Edition counts, identifiers and the earliest dates of removed titles are kept, so that a removed title returns
+        with the same data as all its editions merged.
+        :param author_id: local identifier of author
+        :param title: dict of title data
+        """
+        if author_id not in self.titles:
+            self.titles[author_id] = []
+        titles = self.titles[author_id]
+        if not self.max_titles:
+            titles.append(title)
+            return
+        if 'editions' not in title:
+            title['editions'] = 1
+        if author_id in self.removed_editions and title['title'] in self.removed_editions[author_id]:
+            editions = self.removed_editions[author_id].pop(title['title'])
+            merge_editions(editions, title)
+            title['editions'] = editions['editions']
+            title['identifiers'] = editions['identifiers']
+            title['date'] = editions['date']
+        for retained_title in titles:
+            if retained_title['title'] == title['title']:
+                merge_editions(retained_title, title)
+                return
+        titles.append(title)
+        same_language = [idx for idx, t in enumerate(titles) if t['language'] == title['language']]
+        if len(same_language) > self.max_titles:
+            # the last one of equally relevant titles is removed like it is ordered last in stable sorting
+            removable = max(same_language, key=lambda idx: (
+                titles[idx]['role'] == None,
+                titles[idx]['role'],
+                -titles[idx]['editions'],
+                titles[idx]['date'] == None,
+                titles[idx]['date'] or '',
+                idx))
+            removed_title = titles.pop(removable)
+            self.add_removed_editions(author_id, removed_title['title'], removed_title)
+
+    def add_removed_editions(self, author_id, title, editions):
+        """
+        Adds edition count, identifiers and date of a title removed from retained titles of author
+        :param author_id: local identifier of author
+        :param title: title of work
+        :param editions: dict with keys editions, identifiers and date
+        """
+        for retained_title in self.titles.get(author_id, []):
+            if retained_title['title'] == title:
+                merge_editions(retained_title, editions)
+                return
+        if author_id not in self.removed_editions:
+            self.removed_editions[author_id] = {}
+        if title in self.removed_editions[author_id]:
+            merge_editions(self.removed_editions[author_id][title], editions)
+        else:
+            self.removed_editions[author_id][title] = {'editions': editions['editions'],
+                                                       'identifiers': editions['identifiers'],
+                                                       'date': editions['date']}
     
+    def has_requested_author(self, record):
+        """
+        Checks if any author identifier in subfield 0 of name fields is in requested author identifiers
+        :param record: bibliographical MARC21 record
+        """
+        for field in record.get_fields('100', '110', '700', '710'):
+            for sf in field.get_subfields('0'):
+                if re.sub("[\(].*?[\)]", "", sf) in self.author_ids:
+                    return True
+        return False
+
     def get_identifiers(self, record):
         """
         Get resource identifiers from MARC21 fields
@@ -255,4 +444,55 @@ class ResourceList:
             data = data[:-1]
         data = data.strip()
         return data
-        
\ No newline at end of file
+
+def read_titles(input_file, format, start, end, author_ids=None, max_titles=None):
+    """
+    Reads titles of works and edition counts of titles not retained from a byte range of bibliographic file,
+    used by worker processes
+    :param input_file: file containing MARC21 bibliographical records
+    :param format: format of input_file, either 'marc21' or 'alephseq'
+    :param start: byte offset of the first record
+    :param end: byte offset after the last record
+    :param author_ids: local identifiers of authors whose titles are read, titles of all authors are read if not given
+    :param max_titles: number of the most relevant titles retained per author and language
+    """
+    resource_list = ResourceList(author_ids=author_ids, max_titles=max_titles)
+    if format == "marc21":
+        reader = mmap_marc_reader.MMapMARCReader(input_file, RESOURCE_TAGS, start, end)
+        for record in reader:
+            resource_list.add_record_data(record)
+        reader.close()
+    else:
+        for record in parallel_reader.read_range(input_file, format, start, end):
+            resource_list.add_record_data(record)
+    return resource_list.titles, resource_list.removed_editions
+
+def merge_editions(title, editions):
+    """
+    Merges edition count, identifiers and the earliest date of editions into title data
+    :param title: dict of title data or removed editions, updated with merged data
+    :param editions: dict of title data or removed editions with keys editions, identifiers and date
+    """
+    title['editions'] += editions['editions']
+    # identifiers may be shared with titles of other authors
+    identifiers = {}
+    for identifier_type in title['identifiers']:
+        identifiers[identifier_type] = list(title['identifiers'][identifier_type])
+    for identifier_type in editions['identifiers']:
+        if identifier_type not in identifiers:
+            identifiers[identifier_type] = []
+        identifiers[identifier_type].extend(editions['identifiers'][identifier_type])
+    title['identifiers'] = identifiers
+    if editions['date'] and (not title['date'] or editions['date'] < title['date']):
+        title['date'] = editions['date']
+
+def get_file_hash(file_path):
+    """
+    Calculates hash of file content
+    :param file_path: path of file
+    """
+    file_hash = hashlib.blake2b()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1048576), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
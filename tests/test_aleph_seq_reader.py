@@ -0,0 +1,48 @@
+import io
+import unittest
+import benchmark
+from tools import aleph_seq_reader
+
+def get_field_values(record):
+    if not record:
+        return record
+    values = [str(record.leader)]
+    for field in record.get_fields():
+        values.append((field.tag,
+                       getattr(field, 'indicators', None),
+                       getattr(field, 'subfields', None),
+                       getattr(field, 'data', None)))
+    return values
+
+class AlephSeqReaderTest(unittest.TestCase):
+
+    def read_values(self, reader_class, file_path):
+        reader = reader_class(open(file_path, 'r', encoding="utf-8"))
+        values = [get_field_values(record) for record in reader]
+        reader.close()
+        return values
+
+    def test_same_records_as_line_reader(self):
+        for file_path in ["tests/authors.seq", "tests/modified_authors.seq", "tests/titles.seq"]:
+            records = self.read_values(aleph_seq_reader.AlephSeqReader, file_path)
+            reference_records = self.read_values(benchmark.AlephSeqLineReader, file_path)
+            self.assertNotEqual(len(records), 0)
+            self.assertEqual(records, reference_records)
+
+    def test_deleted_records(self):
+        lines = ["000000001 LDR   L ^^^^^nz^^a^^^^^^^n^^4500",
+                 "000000001 1001  L $$aSukunimi, Etunimi",
+                 "000000002 LDR   L ^^^^^nz^^a^^^^^^^n^^4500",
+                 "000000002 STA   L $$aDELETED",
+                 "000000003 DEL   L Y",
+                 "000000004 1001  L $$aSukunimi, Etunimi"]
+        reader = aleph_seq_reader.AlephSeqReader(io.StringIO("\n".join(lines) + "\n"))
+        records = list(reader)
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0]['001'].data, "000000001")
+        self.assertEqual(records[1], "")
+        self.assertEqual(records[2], "")
+        self.assertEqual(records[3]['100']['a'], "Sukunimi, Etunimi")
+
+if __name__ == "__main__":
+    unittest.main()
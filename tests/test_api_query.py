@@ -1,7 +1,23 @@
 import unittest
 import configparser
 import json
+import os
+import pickle
+import requests
+import shutil
+import tempfile
+import time
+import urllib
+from unittest import mock
 from tools import api_query
+from tools import rate_limiter
+
+class MockResponse(object):
+
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
 
 class APIQueryTest(unittest.TestCase):
 
@@ -37,5 +53,140 @@ class APIQueryTest(unittest.TestCase):
         query_url = self.sru_api_query._form_query_url(query_strings, additional_parameters=parameters)
         self.assertEqual("http:xxxxx.xxxx?verb=GetRecord&identifier=doi%3A10234.123453%2F45654FASDFDDF", query_url)
 
+    def test_get_session(self):
+        session = api_query.get_session("https://example.org/sru?query=a")
+        self.assertIs(session, api_query.get_session("https://example.org/oai?verb=ListRecords"))
+        self.assertIsNot(session, api_query.get_session("https://example.com/sru"))
+        self.assertIsNot(session, api_query.get_session("https://example.org/sru", pool_size=2))
+        adapter = session.get_adapter("https://example.org/sru")
+        self.assertEqual(adapter._pool_maxsize, api_query.POOL_SIZE)
+        self.assertIn('gzip', session.headers['Accept-Encoding'])
+
+    def test_send_request(self):
+        limiter = rate_limiter.RateLimiter()
+        session = mock.Mock()
+        session.request.side_effect = [MockResponse(503), requests.exceptions.ReadTimeout(), MockResponse(200, "ok")]
+        with mock.patch.object(api_query, 'get_session', return_value=session):
+            response = api_query.send_request('GET', "http://example.org", limiter, retries=2, backoff=0)
+            self.assertEqual(response.text, "ok")
+            self.assertEqual(session.request.call_count, 3)
+            session.request.side_effect = requests.exceptions.ConnectionError()
+            with self.assertRaises(api_query.APIQueryError):
+                api_query.send_request('GET', "http://example.org", limiter, retries=1, backoff=0)
+            session.request.side_effect = None
+            session.request.return_value = MockResponse(503)
+            with self.assertRaises(api_query.APIQueryError):
+                self.sru_api_query.backoff = 0
+                self.sru_api_query.api_search("cn=nlfin", {})
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_send_request_error(self):
+        limiter = rate_limiter.RateLimiter()
+        session = mock.Mock()
+        session.request.side_effect = [requests.exceptions.ChunkedEncodingError(), MockResponse(200, "ok")]
+        with mock.patch.object(api_query, 'get_session', return_value=session):
+            with self.assertRaises(api_query.APIQueryError):
+                api_query.send_request('GET', "http://example.org", limiter, retries=2, backoff=0)
+            self.assertEqual(session.request.call_count, 1)
+            self.assertEqual(limiter.in_flight, 0)
+            # slot of failed request is released for the next request
+            response = api_query.send_request('GET', "http://example.org", limiter)
+            self.assertEqual(response.text, "ok")
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_harvest(self):
+        def oai_response(parameters):
+            page = int(parameters.get('resumptionToken', 'page=0&').split('=')[1][:-1])
+            token = ''
+            if page < 2:
+                token = 'page=%s&amp;'%(page + 1)
+            return ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><ListRecords><record><header>'
+                    '<identifier>oai:test/%s</identifier></header></record>'
+                    '<resumptionToken cursor="0">%s</resumptionToken></ListRecords></OAI-PMH>'%(page, token)).encode('utf-8')
+        query = api_query.APIQuery(config_section=self.config['SRU API'])
+        with mock.patch.object(query, 'api_search_content', side_effect=lambda parameters: oai_response(parameters)) as api_search:
+            pages = list(query.harvest({'verb': 'ListRecords', 'from': '2024-01-01'}))
+            self.assertEqual(len(pages), 3)
+            self.assertEqual(pages[2].identifiers, {'2'})
+            self.assertEqual(pages[1].resumption_token, 'page=2&')
+            self.assertIsNone(pages[2].resumption_token)
+            self.assertEqual(api_search.call_args_list[1].kwargs['parameters'], {'resumptionToken': 'page=1&', 'verb': 'ListRecords'})
+            pages = list(query.harvest({'verb': 'ListRecords', 'from': '2024-01-01'}, 'page=1&'))
+            self.assertEqual(len(pages), 2)
+            self.assertEqual(pages[0].identifiers, {'1'})
+            api_search.side_effect = lambda parameters: b'<OAI-PMH>'
+            with self.assertRaises(api_query.parse_oai_response.ET.XMLSyntaxError):
+                list(query.harvest({'verb': 'ListRecords'}))
+            api_search.side_effect = api_query.APIQueryError()
+            with self.assertRaises(api_query.APIQueryError):
+                list(query.harvest({'verb': 'ListRecords'}))
+
+    def test_get_pages(self):
+        def sru_response(query, parameters):
+            # later pages are answered faster
+            time.sleep((1000 - int(parameters['startRecord'])) / 100000)
+            return parameters['startRecord']
+        query = api_query.APIQuery(config_section=self.config['SRU API'])
+        query.prefetch = 3
+        with mock.patch.object(query, 'api_search', side_effect=sru_response) as api_search:
+            pages = list(query.get_pages('cn=nlfin', 950, 100, {'maximumRecords': '100'}, start_record=101))
+            self.assertEqual(pages, [str(number) for number in range(101, 951, 100)])
+            self.assertEqual(api_search.call_args_list[0].args, ('cn=nlfin', {'maximumRecords': '100', 'startRecord': '101'}))
+            pages = list(query.get_pages('cn=nlfin', 950, 100, start_record=101, max_records=300))
+            self.assertEqual(pages, ['101', '201'])
+            self.assertEqual(list(query.get_pages('cn=nlfin', 100, 100, start_record=101)), [])
+            api_search.side_effect = api_query.APIQueryError()
+            with self.assertRaises(api_query.APIQueryError):
+                list(query.get_pages('cn=nlfin', 950, 100))
+
+    def test_get_isni_query_data(self):
+        def sru_response(url):
+            start_record = int(urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['startRecord'][0])
+            if start_record in failed_pages:
+                raise api_query.APIQueryError("Service unavailable")
+            records = ''.join('<srw:record><srw:recordData><responseRecord><ISNIAssigned><isniUnformatted>%s</isniUnformatted>'
+                              '</ISNIAssigned></responseRecord></srw:recordData></srw:record>'%number
+                              for number in range(start_record, min(start_record + 100, 251)))
+            return MockResponse(200, '<srw:searchRetrieveResponse xmlns:srw="http://www.loc.gov/zing/srw/">'
+                                     '<srw:numberOfRecords>250</srw:numberOfRecords><srw:records>%s</srw:records>'
+                                     '</srw:searchRetrieveResponse>'%records)
+        temp_dir = tempfile.mkdtemp()
+        query_file = os.path.join(temp_dir, 'query.journal')
+        query = api_query.APIQuery(config_section=self.config['SRU API'])
+        try:
+            with mock.patch.object(query, 'get', side_effect=sru_response) as get:
+                failed_pages = [201]
+                with self.assertRaises(api_query.APIQueryError):
+                    query.get_isni_query_data('cn=nlfin', query_file)
+                failed_pages = []
+                get.reset_mock()
+                # pages saved into journal are not requested again
+                results = query.get_isni_query_data('cn=nlfin', query_file)
+                self.assertEqual([result['isni'] for result in results], [str(number) for number in range(1, 251)])
+                self.assertEqual(get.call_count, 1)
+                get.reset_mock()
+                self.assertEqual(query.get_isni_query_data('cn=nlfin', query_file), results)
+                self.assertEqual(get.call_count, 0)
+                self.assertEqual(query.get_isni_query_data('cn=nlfin'), results)
+                self.assertEqual(get.call_count, 3)
+                # query file of earlier versions is converted into journal and resumed from the next page
+                with open(query_file, 'wb') as fh:
+                    pickle.dump({'startRecord': 101, 'query': 'cn=nlfin', 'results': results[:200], 'record number': 250}, fh)
+                os.remove(query_file + '.json')
+                get.reset_mock()
+                self.assertEqual(query.get_isni_query_data('cn=nlfin', query_file), results)
+                self.assertEqual(get.call_count, 1)
+                self.assertEqual(query.get_isni_query_data('cn=nlfin', query_file), results)
+                # other files are not overwritten
+                os.remove(query_file + '.json')
+                with open(query_file, 'wb') as fh:
+                    fh.write(b'data')
+                with self.assertRaises(SystemExit), self.assertLogs(level='ERROR'):
+                    query.get_isni_query_data('cn=nlfin', query_file)
+                with open(query_file, 'rb') as fh:
+                    self.assertEqual(fh.read(), b'data')
+        finally:
+            shutil.rmtree(temp_dir)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import unittest
+import configparser
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+from converter import Converter
+from marc21_converter import MARC21Converter
+
+class MockResponse(object):
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+def send_xml(self, xml, mode, origin=""):
+    time.sleep(random.random() / 100)
+    return MockResponse(400, xml)
+
+class ConverterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        config = configparser.ConfigParser()
+        config.read('tests/config.ini')
+        config['ISNI SRU TEST API'] = {'baseurl': 'http:xxxxx.xxxx', 'timeout': '1'}
+        config['ISNI ATOMPUB TEST API'] = {'baseurl': 'http:xxxxx.xxxx', 'concurrency': '4'}
+        cls.config_file_path = os.path.join(cls.temp_dir, 'config.ini')
+        with open(cls.config_file_path, 'w') as fh:
+            config.write(fh)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def test_concurrent_sending(self):
+        sys.argv = sys.argv[:1]
+        sys.argv.extend([
+            "--mode", "test",
+            "--format", "alephseq",
+            "--authority_files", "tests/modified_authors.seq",
+            "--resource_files", "tests/titles.seq",
+            "--identifier", "ID",
+            "--config_file_path", self.config_file_path
+        ])
+        with mock.patch.object(Converter, 'send_xml', send_xml), \
+             mock.patch.object(MARC21Converter, 'create_isni_fields', return_value=[]) as create_isni_fields, \
+             mock.patch.dict(os.environ, {"ISNI_USER": "", "ISNI_PASSWORD": ""}):
+            Converter()
+        isnis = create_isni_fields.call_args.args[0]
+        self.assertTrue(isnis)
+        # responses are handled in the order of records in authority file
+        self.assertEqual(list(isnis), sorted(isnis))
+        sent_ids = []
+        for record_id in isnis:
+            # records with conversion errors are not sent
+            errors = isnis[record_id]['errors']
+            if errors[0].startswith('<?xml'):
+                sent_ids.append(record_id)
+                self.assertIn('<identifier>(ID)' + record_id + '</identifier>', ''.join(errors))
+        self.assertTrue(sent_ids)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+from tools import journal
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, "harvest.journal")
+        self.parameters = {'verb': 'ListRecords', 'from': '2024-01-01'}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        self.assertEqual(harvest_journal.resume(), [])
+        harvest_journal.append(({'1'}, ['record 1']), 'token1')
+        harvest_journal.append(({'2'}, ['record 2']), 'token2')
+        harvest_journal = journal.Journal(self.file_path, dict(self.parameters))
+        self.assertEqual(harvest_journal.resume(), [({'1'}, ['record 1']), ({'2'}, ['record 2'])])
+        self.assertEqual(harvest_journal.cursor['token'], 'token2')
+        self.assertFalse(harvest_journal.cursor['complete'])
+        harvest_journal.append(({'3'}, ['record 3']), None)
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        self.assertEqual(len(harvest_journal.resume()), 3)
+        self.assertTrue(harvest_journal.cursor['complete'])
+
+    def test_changed_parameters(self):
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        harvest_journal.reset()
+        harvest_journal.append(({'1'}, ['record 1']), 'token1')
+        size = os.path.getsize(self.file_path)
+        harvest_journal = journal.Journal(self.file_path, {'verb': 'ListRecords', 'from': '2024-02-01'})
+        with self.assertRaises(journal.JournalError):
+            harvest_journal.resume()
+        self.assertEqual(os.path.getsize(self.file_path), size)
+        harvest_journal.reset()
+        self.assertEqual(harvest_journal.resume(), [])
+        self.assertEqual(harvest_journal.cursor['token'], None)
+        self.assertEqual(os.path.getsize(self.file_path), 0)
+
+    def test_missing_cursor(self):
+        with open(self.file_path, 'wb') as fh:
+            fh.write(b'data')
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        with self.assertRaises(journal.JournalError):
+            harvest_journal.resume()
+        with open(self.file_path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'data')
+
+    def test_torn_entry(self):
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        harvest_journal.reset()
+        harvest_journal.append(({'1'}, ['record 1']), 'token1')
+        size = os.path.getsize(self.file_path)
+        # entry written partially before crash, cursor is not updated
+        with open(self.file_path, 'ab') as fh:
+            fh.write(journal.PREFIX.pack(1000) + b'partial')
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        self.assertEqual(harvest_journal.resume(), [({'1'}, ['record 1'])])
+        self.assertEqual(os.path.getsize(self.file_path), size)
+        harvest_journal.append(({'2'}, ['record 2']), None)
+        harvest_journal = journal.Journal(self.file_path, self.parameters)
+        self.assertEqual(harvest_journal.resume(), [({'1'}, ['record 1']), ({'2'}, ['record 2'])])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,13 @@
 import unittest
 import shutil
 import sys
+from unittest import mock
 from converter import Converter
+from marc21_converter import MARC21Converter
+from tools import aleph_seq_reader
+from tools import api_query
 from resource_list import ResourceList
-from pymarc import Field, Subfield
+from pymarc import Field, Record, Subfield
 
 class MockArgs(object):
     pass
@@ -95,6 +99,134 @@ class MARC21ConverterTest(unittest.TestCase):
                 tested_ids.append(id)
         self.assertEqual(sorted(expected_ids), sorted(tested_ids))
 
+    def test_iterate_authority_data(self):
+        args = get_mock_args()
+        identities = self.mc.get_authority_data(args, set())
+        streamed_identities = dict(self.mc.iterate_authority_data(args, set()))
+        self.assertEqual(sorted(identities.keys()), sorted(streamed_identities.keys()))
+        for record_id in identities:
+            self.assertEqual(identities[record_id], streamed_identities[record_id])
+
+    def test_convert_records_in_processes(self):
+        args = get_mock_args()
+        identities = self.mc.get_authority_data(args, set())
+        args.conversion_workers = 2
+        with mock.patch('marc21_converter.IDENTITY_BATCH_SIZE', 2):
+            records = self.mc.read_marc_records(args)
+            convertible_fields = self.mc.get_convertible_fields(args)
+            self.assertEqual(self.mc.convert_records(records, convertible_fields, args.identifier, args.conversion_workers),
+                             self.mc.convert_records(records, convertible_fields, args.identifier))
+            self.assertEqual(self.mc.get_authority_data(args, set()), identities)
+
+    def test_api_search_resources(self):
+        args = get_mock_args()
+        identities = self.mc.get_authority_data(args, set())
+        reader = aleph_seq_reader.AlephSeqReader(open(args.resource_files, 'r', encoding="utf-8"))
+        bibliographic_records = [record for record in reader if record]
+        reader.close()
+        args.resource_files = None
+        self.mc.config['BIB SRU API'] = {'baseurl': 'http:xxxxx.xxxx', 'timeout': '1', 'concurrency': '4'}
+        try:
+            with mock.patch.object(MARC21Converter, 'fetch_resource_records', return_value=bibliographic_records) as fetch:
+                api_identities = self.mc.get_authority_data(args, set())
+                self.assertEqual(identities, api_identities)
+                fetched_ids = [call.args[0] for call in fetch.call_args_list]
+                self.assertEqual(len(fetched_ids), len(set(fetched_ids)))
+                streamed_identities = dict(self.mc.iterate_authority_data(args, set()))
+                self.assertEqual(identities, streamed_identities)
+        finally:
+            self.mc.config.remove_section('BIB SRU API')
+
+    def test_stream_linked_organisations(self):
+        args = get_mock_args()
+        identities = self.mc.get_authority_data(args, set())
+        reader = aleph_seq_reader.AlephSeqReader(open(args.resource_files, 'r', encoding="utf-8"))
+        bibliographic_records = [record for record in reader if record]
+        reader.close()
+        args.resource_files = None
+        self.mc.config['BIB SRU API'] = {'baseurl': 'http:xxxxx.xxxx', 'timeout': '1'}
+        try:
+            with mock.patch.object(MARC21Converter, 'fetch_resource_records', return_value=bibliographic_records) as fetch:
+                streamed_identities = dict(self.mc.iterate_authority_data(args, set()))
+                fetched_ids = [call.args[0] for call in fetch.call_args_list]
+        finally:
+            self.mc.config.remove_section('BIB SRU API')
+        self.assertEqual(identities, streamed_identities)
+        # titles of organisations at the end of supersedes chains are requested for merging
+        self.assertIn('000000010', fetched_ids)
+        self.assertIn('000000013', fetched_ids)
+        for record_id in ['000000009', '000000012']:
+            self.assertEqual(streamed_identities[record_id]['organisationNameVariant'],
+                             [{'mainName': '3. yhteisö', 'subdivisionName': []}])
+        self.assertIn('Record 000000009 has same ISNI, but 983 field missing', streamed_identities['000000008']['errors'])
+        self.assertEqual(streamed_identities['000000011']['isNot'], [{'type': 'ISNI', 'identifier': '0000000474394188'}])
+
+    def test_request_authority_records(self):
+        def x_response(parameters):
+            record_ids = [id for id in parameters['doc_num'].split(',') if id != '000000002' or ',' not in parameters['doc_num']]
+            records = ['<record><metadata><oai_marc><fixfield id="001">%s</fixfield></oai_marc></metadata></record>'%id
+                       for id in record_ids if id != '000000004']
+            return '<find-doc>' + ''.join(records) + '</find-doc>'
+        self.mc.config['AUT X API'] = {'baseurl': 'http:xxxxx.xxxx', 'timeout': '1', 'batch_size': '2', 'concurrency': '2'}
+        self.mc.author_query = mock.Mock()
+        self.mc.author_query.api_search.side_effect = lambda parameters: x_response(parameters)
+        try:
+            records = self.mc.request_authority_records({'000000001', '000000002', '000000003', '000000004'})
+        finally:
+            self.mc.config.remove_section('AUT X API')
+        self.assertEqual(sorted(records), ['000000001', '000000002', '000000003'])
+        for record_id in records:
+            self.assertEqual(records[record_id]['001'].data, record_id)
+        requested = [call.kwargs['parameters']['doc_num'] for call in self.mc.author_query.api_search.call_args_list]
+        self.assertEqual(sorted(requested), ['000000001,000000002', '000000002', '000000003,000000004', '000000004'])
+
+    def test_request_linked_records(self):
+        def x_response(parameters):
+            links = {'000000001': ['000000002'], '000000002': ['000000003', '000000004'], '000000003': ['000000004', '000000005'],
+                     '000000004': [], '000000005': ['000000001'], '000000006': ['000000005']}
+            records = []
+            for id in parameters['doc_num'].split(','):
+                fields = ''.join('<varfield id="510" i1="2" i2=" "><subfield label="0">(FIN11)%s</subfield></varfield>'%linked_id
+                                 for linked_id in links[id])
+                records.append('<record><metadata><oai_marc><fixfield id="001">%s</fixfield>%s</oai_marc></metadata></record>'
+                               %(id, fields))
+            return '<find-doc>' + ''.join(records) + '</find-doc>'
+        record = Record()
+        record.add_field(Field(tag='001', data='000000001'),
+                         Field(tag='510', indicators=['2', ' '], subfields=[Subfield('0', '(FIN11)000000002')]))
+        self.mc.config['AUT X API'] = {'baseurl': 'http:xxxxx.xxxx', 'timeout': '1', 'batch_size': '10'}
+        self.mc.author_query = mock.Mock()
+        self.mc.author_query.api_search.side_effect = lambda parameters: x_response(parameters)
+        self.mc.linked_records = {}
+        try:
+            linked_ids = {'000000001'}
+            linked_records = self.mc.request_linked_records({'000000001': record}, linked_ids)
+            self.assertEqual(sorted(linked_records), ['000000002', '000000003', '000000004', '000000005'])
+            self.assertEqual(linked_ids, {'000000001', '000000002', '000000003', '000000004', '000000005'})
+            # linked records are requested once for each level
+            requested = [call.kwargs['parameters']['doc_num'] for call in self.mc.author_query.api_search.call_args_list]
+            self.assertEqual(requested, ['000000002', '000000003,000000004', '000000005'])
+            # records requested for previous authority records are not requested again
+            record = Record()
+            record.add_field(Field(tag='001', data='000000007'),
+                             Field(tag='510', indicators=['2', ' '], subfields=[Subfield('0', '(FIN11)000000003')]),
+                             Field(tag='510', indicators=['2', ' '], subfields=[Subfield('0', '(FIN11)000000006')]))
+            self.mc.author_query.api_search.reset_mock()
+            linked_records = self.mc.request_linked_records({'000000007': record}, {'000000007'})
+            self.assertEqual(sorted(linked_records), ['000000001', '000000002', '000000003', '000000004', '000000005', '000000006'])
+            requested = [call.kwargs['parameters']['doc_num'] for call in self.mc.author_query.api_search.call_args_list]
+            self.assertEqual(requested, ['000000006', '000000001'])
+            # records are skipped, if request fails
+            self.mc.linked_records = {}
+            self.mc.author_query.api_search.side_effect = api_query.APIQueryError()
+            linked_ids = {'000000001'}
+            with self.assertLogs(level='ERROR'):
+                linked_records = self.mc.request_linked_records({'000000001': record}, linked_ids)
+            self.assertEqual(linked_records, {})
+        finally:
+            self.mc.config.remove_section('AUT X API')
+            self.mc.linked_records = {}
+
     def test_get_dates(self):
         identity_type = 'personOrFiction'
 
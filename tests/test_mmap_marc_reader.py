@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from pymarc import MARCReader
+from tools.mmap_marc_reader import MMapMARCReader
+
+class MMapMARCReaderTest(unittest.TestCase):
+
+    def test_same_records_as_marc_reader(self):
+        reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+        records = [record.as_marc() for record in reader]
+        reader.close()
+        reader = MMapMARCReader("tests/titles.mrc")
+        self.assertEqual(records, [record.as_marc() for record in reader])
+        reader.close()
+
+    def test_projected_tags(self):
+        tags = ['001', '245']
+        reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+        records = [record for record in reader]
+        reader.close()
+        reader = MMapMARCReader("tests/titles.mrc", tags)
+        projected_records = [record for record in reader]
+        reader.close()
+        self.assertEqual(len(records), len(projected_records))
+        for record, projected_record in zip(records, projected_records):
+            self.assertEqual(str(record.leader), str(projected_record.leader))
+            self.assertEqual([str(field) for field in record.get_fields(*tags)],
+                             [str(field) for field in projected_record.get_fields()])
+    def test_invalid_record_length(self):
+        reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+        records = [record.as_marc() for record in reader][:2]
+        reader.close()
+        # records with lengths 00000 and 00010 are skipped until the next record terminator
+        data = b'00000nam' + b'\x1d' + records[0] + b'00010nam' + b'\x1d' + records[1]
+        temp_dir = tempfile.mkdtemp()
+        file_path = os.path.join(temp_dir, 'invalid.mrc')
+        with open(file_path, 'wb') as fh:
+            fh.write(data)
+        reader = MMapMARCReader(file_path)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(records, [record.as_marc() for record in reader])
+        reader.close()
+        os.remove(file_path)
+        os.rmdir(temp_dir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from pymarc import MARCReader
+from tools import aleph_seq_reader
+from tools import parallel_reader
+
+class ParallelReaderTest(unittest.TestCase):
+
+    def test_split_file(self):
+        ranges = parallel_reader.split_file("tests/modified_authors.seq", "alephseq", 8)
+        self.assertGreater(len(ranges), 1)
+        with open("tests/modified_authors.seq", 'rb') as fh:
+            data = fh.read()
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(data))
+        for idx in range(1, len(ranges)):
+            start = ranges[idx][0]
+            self.assertEqual(ranges[idx - 1][1], start)
+            # ranges start from the first line of a record
+            self.assertEqual(data[start - 1:start], b'\n')
+            self.assertNotEqual(data[start:start + 9], data[:start].splitlines()[-1][:9])
+        ranges = parallel_reader.split_file("tests/titles.mrc", "marc21", 3)
+        for start, end in ranges[1:]:
+            with open("tests/titles.mrc", 'rb') as fh:
+                fh.seek(start - 1)
+                self.assertEqual(fh.read(1), parallel_reader.RECORD_TERMINATOR)
+
+    def test_read_records(self):
+        reader = aleph_seq_reader.AlephSeqReader(open("tests/modified_authors.seq", 'r', encoding="utf-8"))
+        record_ids = [record['001'].data for record in reader if record]
+        reader.close()
+        records = parallel_reader.read_records("tests/modified_authors.seq", "alephseq", 2)
+        self.assertEqual(record_ids, [record['001'].data for record in records])
+        reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+        records = [record.as_marc() for record in reader]
+        reader.close()
+        parallel_records = parallel_reader.read_records("tests/titles.mrc", "marc21", 2)
+        self.assertEqual(records, [record.as_marc() for record in parallel_records])
+
+if __name__ == "__main__":
+    unittest.main()
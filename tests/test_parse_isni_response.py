@@ -0,0 +1,132 @@
+import unittest
+from tools import parse_isni_response
+
+SRU_RESPONSE = '''<srw:searchRetrieveResponse xmlns:srw="http://www.loc.gov/zing/srw/">
+<srw:numberOfRecords>3</srw:numberOfRecords>
+<srw:records>
+<srw:record><srw:recordData><responseRecord>
+<ISNIAssigned>
+<isniUnformatted>0000000121032683</isniUnformatted>
+<PPN>123456789</PPN>
+<mergedISNI>0000000000000001</mergedISNI>
+<mergedISNI>0000000000000002</mergedISNI>
+<ISNIMetadata>
+<identity>
+<personOrFiction>
+<personalName><forename>Etunimi</forename><surname>Sukunimi</surname><source>NLFIN</source></personalName>
+<personalName><surname>Sukunimi</surname><forename>Etunimi</forename><source>VIAF</source></personalName>
+<personalName><surname>Sukunimi</surname><forename>Etunimi</forename><source>NLFIN</source></personalName>
+<personalNameVariant><surname>Toinen</surname><source>LC</source></personalNameVariant>
+<personalNameVariant><surname>Toinen</surname><forename>E.</forename><source>LC</source></personalNameVariant>
+<personalNameVariant><surname>Toinen</surname><source>BNF</source></personalNameVariant>
+<isRelatedPerson><surname>Sukulainen</surname><ISNI>0000000000000003</ISNI><source>NLFIN</source></isRelatedPerson>
+<additionalInformation>
+<birthDate source="NLFIN">1950</birthDate>
+<birthDate source="VIAF">1950</birthDate>
+<deathDate source="VIAF">2020</deathDate>
+<nationality>FI</nationality>
+<location><countryCode>FI</countryCode><source>NLFIN</source><source>VIAF</source></location>
+<countriesAssociated source="VIAF"><countryCode>SE</countryCode></countriesAssociated>
+</additionalInformation>
+<additionalInformation>
+<birthDate source="LC">1951</birthDate>
+</additionalInformation>
+</personOrFiction>
+</identity>
+<externalInformation><URI>http://example.org/1</URI><URI>http://example.org/2</URI></externalInformation>
+<externalInformation><URI>http://example.org/3</URI></externalInformation>
+<otherIdentifierOfIdentity><type>VIAF</type><identifier>123</identifier><source>VIAF</source></otherIdentifierOfIdentity>
+<otherIdentifierOfIdentity><type>VIAF</type><identifier>123</identifier><source>NLFIN</source></otherIdentifierOfIdentity>
+<otherIdentifierOfIdentity><identifier>456</identifier></otherIdentifierOfIdentity>
+<sources><codeOfSource>NLFIN</codeOfSource><sourceIdentifier>(FI-ASTERI-N)000000001</sourceIdentifier></sources>
+<sources><codeOfSource>NLFIN</codeOfSource><sourceIdentifier>(FI-ASTERI-N)000000002</sourceIdentifier></sources>
+<sources><codeOfSource>VIAF</codeOfSource><sourceIdentifier>123</sourceIdentifier></sources>
+</ISNIMetadata>
+</ISNIAssigned>
+</responseRecord></srw:recordData></srw:record>
+<srw:record><srw:recordData><responseRecord>
+<ISNINotAssigned>
+<PPN>987654321</PPN>
+<ISNIMetadata>
+<identity>
+<organisation>
+<organisationName><mainName>Yhteisö</mainName><subdivisionName>Osasto</subdivisionName><subdivisionName>Yksikkö</subdivisionName><source>NLFIN</source></organisationName>
+<organisationNameVariant><mainName>Yhteisö</mainName><source>NLFIN</source></organisationNameVariant>
+<isRelatedOrganisation><mainName>Edeltäjä</mainName><source>NLFIN</source></isRelatedOrganisation>
+</organisation>
+</identity>
+<sources><codeOfSource>NLFIN</codeOfSource><sourceIdentifier>000000003</sourceIdentifier></sources>
+</ISNIMetadata>
+</ISNINotAssigned>
+</responseRecord></srw:recordData></srw:record>
+<srw:record><srw:recordData><responseRecord>
+<noISNI>
+<reason>possible match</reason>
+<possibleMatch><PPN>111111111</PPN><evaluationScore>80</evaluationScore></possibleMatch>
+<possibleMatch><PPN>222222222</PPN></possibleMatch>
+</noISNI>
+</responseRecord></srw:recordData></srw:record>
+</srw:records>
+</srw:searchRetrieveResponse>'''
+
+ATOMPUB_RESPONSE = '''<responseRecord><noISNI><reason>no match initial database</reason></noISNI></responseRecord>'''
+
+
+class ParseISNIResponseTest(unittest.TestCase):
+
+    def test_sru_response(self):
+        records = parse_isni_response.dictify_xml(SRU_RESPONSE)
+        self.assertEqual(len(records), 3)
+        names = {'main names': [{'values': {'surname': 'Sukunimi', 'forename': 'Etunimi'}, 'sources': ['NLFIN', 'VIAF']}],
+                 'variant names': [{'values': {'surname': 'Toinen'}, 'sources': ['LC', 'BNF']},
+                                   {'values': {'surname': 'Toinen', 'forename': 'E.'}, 'sources': ['LC']}]}
+        self.assertEqual(records[0], {
+            'isni': '0000000121032683',
+            'possible matches': [],
+            'deprecated isnis': ['0000000000000001', '0000000000000002'],
+            'identity type': 'personOrFiction',
+            'uris': ['http://example.org/1', 'http://example.org/2', 'http://example.org/3'],
+            'other identifiers': [{'values': {'type': 'VIAF', 'identifier': '123'}, 'sources': ['VIAF', 'NLFIN']},
+                                  {'values': {'type': None, 'identifier': '456'}, 'sources': [None]}],
+            **names,
+            'related identities': names,
+            'birthDate': [{'values': '1950', 'sources': ['NLFIN', 'VIAF']}, {'values': '1951', 'sources': ['LC']}],
+            'deathDate': [{'values': '2020', 'sources': ['VIAF']}],
+            'nationality': [],
+            'location': [{'values': 'FI', 'sources': ['NLFIN', 'VIAF']}],
+            'countriesAssociated': [{'values': 'SE', 'sources': ['VIAF']}],
+            'sources': {'NLFIN': ['(FI-ASTERI-N)000000001', '(FI-ASTERI-N)000000002'], 'VIAF': ['123']}})
+        # related identities are not the same objects as names
+        self.assertIsNot(records[0]['related identities']['main names'][0], records[0]['main names'][0])
+        names = {'main names': [{'values': {'mainName': 'Yhteisö', 'subdivisionName': ['Osasto', 'Yksikkö']}, 'sources': ['NLFIN']}],
+                 'variant names': [{'values': {'mainName': 'Yhteisö'}, 'sources': ['NLFIN']}]}
+        self.assertEqual(records[1], {
+            'ppn': '987654321',
+            'possible matches': [],
+            'deprecated isnis': [],
+            'identity type': 'organisation',
+            'uris': [],
+            'other identifiers': [],
+            **names,
+            'related identities': names,
+            'sources': {'NLFIN': ['000000003']}})
+        self.assertEqual(records[2], {
+            'reason': 'possible match',
+            'possible matches': [{'ppn': '111111111', 'evaluationScore': '80'}, {'ppn': '222222222'}],
+            'deprecated isnis': []})
+
+    def test_atompub_response(self):
+        self.assertEqual(parse_isni_response.dictify_xml(ATOMPUB_RESPONSE),
+                         [{'reason': 'no match initial database', 'possible matches': [], 'deprecated isnis': []}])
+
+    def test_value_list(self):
+        value_list = parse_isni_response.ValueList()
+        value_list.add({'mainName': 'A', 'subdivisionName': ['B', 'C']}, 'X')
+        value_list.add({'subdivisionName': ['B', 'C'], 'mainName': 'A'}, 'Y')
+        value_list.add({'mainName': 'A', 'subdivisionName': ['C', 'B']}, 'X')
+        value_list.add({'mainName': 'A', 'subdivisionName': ['B', 'C']}, 'X')
+        self.assertEqual(value_list.values, [{'values': {'mainName': 'A', 'subdivisionName': ['B', 'C']}, 'sources': ['X', 'Y']},
+                                             {'values': {'mainName': 'A', 'subdivisionName': ['C', 'B']}, 'sources': ['X']}])
+
+if __name__ == "__main__":
+    unittest.main()
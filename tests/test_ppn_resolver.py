@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from tools import api_query
+from tools import ppn_resolver
+
+def isni_query_data(query):
+    results = []
+    for ppn in query.replace('ppn=', '').split(' or '):
+        if ppn == '000000003':
+            continue
+        if ppn == '000000004':
+            # assigned ISNI without PPN
+            results.append({'isni': '0000000474363461', 'sources': {'ID': ['000000004']}})
+        else:
+            results.append({'ppn': ppn, 'sources': {'ID': [ppn]}})
+    return results
+
+class PPNResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.sru_api_query = mock.Mock()
+        self.sru_api_query.cache_ttl = None
+        self.sru_api_query.get_isni_query_data.side_effect = isni_query_data
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def get_queries(self):
+        return [call.args[0] for call in self.sru_api_query.get_isni_query_data.call_args_list]
+
+    def test_batched_queries(self):
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query, batch_size=2)
+        results = resolver.resolve(['000000001', '000000002', '000000003', '000000001'])
+        self.assertEqual(results, {'000000001': {'ppn': '000000001', 'sources': {'ID': ['000000001']}},
+                                   '000000002': {'ppn': '000000002', 'sources': {'ID': ['000000002']}},
+                                   '000000003': None})
+        self.assertEqual(self.get_queries(), ['ppn=000000001 or ppn=000000002', 'ppn=000000003'])
+        # cached results are not requested again
+        self.sru_api_query.get_isni_query_data.reset_mock()
+        results = resolver.resolve(['000000002', '000000003', '000000005'])
+        self.assertEqual(sorted(results), ['000000002', '000000003', '000000005'])
+        self.assertEqual(self.get_queries(), ['ppn=000000005'])
+
+    def test_results_without_ppn(self):
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query, batch_size=3)
+        results = resolver.resolve(['000000001', '000000004', '000000003'])
+        self.assertEqual(results['000000004']['isni'], '0000000474363461')
+        self.assertIsNone(results['000000003'])
+        self.assertEqual(self.get_queries(), ['ppn=000000001 or ppn=000000004 or ppn=000000003',
+                                              'ppn=000000004', 'ppn=000000003'])
+
+    def test_failed_query(self):
+        self.sru_api_query.get_isni_query_data.side_effect = api_query.APIQueryError("Connection refused")
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query)
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(resolver.resolve(['000000001', '000000002']), {})
+        self.assertEqual(resolver.cache, {})
+
+    def test_cache_file(self):
+        cache_file = os.path.join(self.temp_dir, 'ppn.pickle')
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query, cache_file=cache_file)
+        results = resolver.resolve(['000000001', '000000003'])
+        resolver.save_cache()
+        self.sru_api_query.get_isni_query_data.reset_mock()
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query, cache_file=cache_file)
+        self.assertEqual(resolver.resolve(['000000001', '000000003']), results)
+        self.assertEqual(self.get_queries(), [])
+        # expired results are requested again
+        self.sru_api_query.cache_ttl = 1
+        resolver = ppn_resolver.PPNResolver(self.sru_api_query, cache_file=cache_file)
+        for ppn in resolver.cache:
+            resolver.cache[ppn] = (resolver.cache[ppn][0] - 2, resolver.cache[ppn][1])
+        self.assertEqual(resolver.resolve(['000000001', '000000003']), results)
+        self.assertEqual(self.get_queries(), ['ppn=000000001 or ppn=000000003'])
+
+if __name__ == "__main__":
+    unittest.main()
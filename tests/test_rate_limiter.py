@@ -0,0 +1,45 @@
+import unittest
+import configparser
+import time
+from tools import rate_limiter
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_concurrency_limit(self):
+        limiter = rate_limiter.RateLimiter(max_concurrency=4)
+        self.assertEqual(limiter.limit, 1)
+        for _ in range(5):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 4)
+        start = limiter.acquire()
+        limiter.release(start, failed=True)
+        self.assertEqual(limiter.limit, 2)
+        # requests started before decrease do not decrease limit again
+        limiter.release(limiter.acquire() - 1, failed=True)
+        self.assertEqual(limiter.limit, 2)
+        limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 2.5)
+
+    def test_latency_target(self):
+        limiter = rate_limiter.RateLimiter(max_concurrency=4, latency_target=0.5)
+        limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 2)
+        limiter.release(limiter.acquire() - 1)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_rate(self):
+        limiter = rate_limiter.RateLimiter(rate=50, max_concurrency=4)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.release(limiter.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_default_rate(self):
+        config = configparser.ConfigParser()
+        config['ISNI SRU API'] = {'baseurl': 'https://isni.example.org/sru'}
+        config['BIB SRU API'] = {'baseurl': 'https://bib.example.org/sru'}
+        self.assertEqual(rate_limiter.get_limiter(config['ISNI SRU API']).rate, 1)
+        self.assertIsNone(rate_limiter.get_limiter(config['BIB SRU API']).rate)
+
+if __name__ == "__main__":
+    unittest.main()
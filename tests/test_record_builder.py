@@ -0,0 +1,114 @@
+import io
+import unittest
+import benchmark
+from pymarc import MARCReader, record_to_xml
+from xml.sax.saxutils import escape, quoteattr
+from tools import parse_oai_response
+from tools import parse_sru_response
+
+def get_marcxml_records():
+    reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+    records = [record_to_xml(record, namespace=True).decode('utf-8') for record in reader]
+    reader.close()
+    # record with a comment, an entity and a datafield without indicators
+    records.append('<record xmlns="http://www.loc.gov/MARC21/slim"><leader>00000nam a2200000 i 4500</leader>'
+                   '<controlfield tag="001">000000001</controlfield><controlfield tag="008">200101s2020    fi</controlfield>'
+                   '<datafield tag="245"><subfield code="a">Nimeke <!-- comment -->&amp; alanimeke</subfield></datafield>'
+                   '</record>')
+    return records
+
+def get_oai_marc_records():
+    reader = MARCReader(open("tests/titles.mrc", 'rb'), to_unicode=True)
+    records = []
+    for record in reader:
+        fields = ['<fixfield id="LDR">%s</fixfield>'%escape(str(record.leader))]
+        for field in record.get_fields():
+            if field.is_control_field():
+                fields.append('<fixfield id="%s">%s</fixfield>'%(field.tag, escape(field.data)))
+            else:
+                subfields = ''.join('<subfield label=%s>%s</subfield>'%(quoteattr(subfield.code), escape(subfield.value))
+                                    for subfield in field.subfields)
+                fields.append('<varfield id="%s" i1=%s i2=%s>%s</varfield>'
+                              %(field.tag, quoteattr(field.indicator1), quoteattr(field.indicator2), subfields))
+        fields.append('<fixfield id="FMT">BK</fixfield>')
+        records.append('<oai_marc>%s</oai_marc>'%''.join(fields))
+    reader.close()
+    return records
+
+def get_field_values(record):
+    if not record:
+        return record
+    values = [str(record.leader)]
+    for field in record.get_fields():
+        values.append((field.tag,
+                       getattr(field, 'indicators', None),
+                       getattr(field, 'subfields', None),
+                       getattr(field, 'data', None)))
+    return values
+
+class RecordBuilderTest(unittest.TestCase):
+
+    def assertSameRecords(self, records, reference_records):
+        self.assertNotEqual(len(records), 0)
+        self.assertEqual([get_field_values(record) for record in records],
+                         [get_field_values(record) for record in reference_records])
+
+    def test_oai_pmh_response(self):
+        parameters = {'verb': 'ListRecords'}
+        response = ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><ListRecords>%s</ListRecords></OAI-PMH>'
+                    %''.join('<record><header><identifier>oai:test/%s</identifier></header><metadata>%s</metadata></record>'
+                             %(idx, record) for idx, record in enumerate(get_marcxml_records())))
+        records = parse_oai_response.RecordParser().parse(response, parameters)
+        reference_records = benchmark.SAXRecordParser().parse(response, parameters)
+        self.assertSameRecords(records, reference_records)
+        oai_response = parse_oai_response.OAIResponse(response.encode('utf-8'), parameters)
+        self.assertSameRecords(oai_response.records, reference_records)
+        self.assertEqual(oai_response.identifiers, {str(idx) for idx in range(len(records))})
+        self.assertIsNone(oai_response.resumption_token)
+        response = response.replace('</ListRecords>', '<resumptionToken cursor="0">page=1&amp;</resumptionToken></ListRecords>')
+        oai_response = parse_oai_response.OAIResponseStream(io.BytesIO(response.encode('utf-8')), parameters)
+        self.assertSameRecords(list(oai_response), reference_records)
+        self.assertEqual(oai_response.identifiers, {str(idx) for idx in range(len(records))})
+        self.assertEqual(oai_response.resumption_token, 'page=1&')
+        oai_response = parse_oai_response.OAIResponseStream(io.BytesIO(response.encode('utf-8')), parameters)
+        self.assertEqual(oai_response.resumption_token, 'page=1&')
+        self.assertSameRecords(oai_response.records, reference_records)
+        self.assertSameRecords(list(oai_response), reference_records)
+        # records are not kept when stream is iterated directly
+        oai_response = parse_oai_response.OAIResponseStream(io.BytesIO(response.encode('utf-8')), parameters)
+        self.assertSameRecords(list(oai_response), reference_records)
+        with self.assertRaises(parse_oai_response.ResponseStreamError):
+            oai_response.records
+        with self.assertRaises(parse_oai_response.ResponseStreamError):
+            list(oai_response)
+        # consumed source is not parsed again after partial iteration
+        oai_response = parse_oai_response.OAIResponseStream(io.BytesIO(response.encode('utf-8')), parameters)
+        next(iter(oai_response))
+        for name in ['identifiers', 'records', 'resumption_token']:
+            with self.assertRaises(parse_oai_response.ResponseStreamError):
+                getattr(oai_response, name)
+        self.assertEqual(records[-1]['245']['a'], 'Nimeke & alanimeke')
+        self.assertEqual(records[-1]['008'].data, '200101s2020^^^^fi')
+
+    def test_x_api_response(self):
+        response = '<find-doc>%s</find-doc>'%''.join('<record><doc_number>%s</doc_number><metadata>%s</metadata></record>'
+                                                     %(idx, record) for idx, record in enumerate(get_oai_marc_records()))
+        records = parse_oai_response.RecordParser().parse(response)
+        reference_records = benchmark.SAXRecordParser().parse(response)
+        self.assertSameRecords(records, reference_records)
+        records = parse_oai_response.OAIResponseStream(io.BytesIO(response.encode('utf-8'))).records
+        self.assertSameRecords(records, reference_records)
+
+    def test_sru_response(self):
+        response = ('<zs:searchRetrieveResponse xmlns:zs="http://docs.oasis-open.org/ns/search-ws/sruResponse">'
+                    '<zs:numberOfRecords>2</zs:numberOfRecords><zs:records>%s</zs:records></zs:searchRetrieveResponse>'
+                    %''.join('<zs:record><zs:recordData>%s</zs:recordData></zs:record>'%record for record in get_marcxml_records()))
+        records = parse_sru_response.get_records(response)
+        reference_records = benchmark.get_sru_records_with_sax(response)
+        self.assertSameRecords(records, reference_records)
+        sru_response = parse_sru_response.SRUResponseStream(io.BytesIO(response.encode('utf-8')))
+        self.assertSameRecords(list(sru_response), reference_records)
+        self.assertEqual(sru_response.number_of_records, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pymarc import MARCReader
+from tools import aleph_seq_reader
+from tools.record_index import RecordIndex
+
+class RecordIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.seq_file = os.path.join(cls.temp_dir, "authors.seq")
+        cls.mrc_file = os.path.join(cls.temp_dir, "titles.mrc")
+        shutil.copy("tests/modified_authors.seq", cls.seq_file)
+        shutil.copy("tests/titles.mrc", cls.mrc_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def test_alephseq_index(self):
+        index = RecordIndex(self.seq_file, "alephseq")
+        reader = aleph_seq_reader.AlephSeqReader(open(self.seq_file, 'r', encoding="utf-8"))
+        records = [record for record in reader if record]
+        reader.close()
+        self.assertEqual(len(records), len(index.offsets))
+        for record in records:
+            indexed_record = index.get_record(record['001'].data)
+            self.assertEqual(record.as_dict(), indexed_record.as_dict())
+        index.close()
+        self.assertTrue(os.path.isfile(self.seq_file + ".idx"))
+
+    def test_marc21_index(self):
+        index = RecordIndex(self.mrc_file, "marc21")
+        reader = MARCReader(open(self.mrc_file, 'rb'), to_unicode=True)
+        # the last one of records with same identifier is indexed
+        records = {}
+        for record in reader:
+            records[record['001'].data] = record
+        reader.close()
+        self.assertEqual(sorted(records), sorted(index.offsets))
+        for record_id in records:
+            self.assertEqual(records[record_id].as_marc(), index.get_record(record_id).as_marc())
+        indexed_ids = [record['001'].data for record in index.get_records(records)]
+        self.assertEqual(['3181122', '2041176'], indexed_ids)
+        index.close()
+
+    def test_appended_file(self):
+        index_path = os.path.join(self.temp_dir, "appended.idx")
+        index = RecordIndex(self.seq_file, "alephseq", index_path)
+        number_of_records = len(index.offsets)
+        with open(self.seq_file, 'a', encoding="utf-8") as fh:
+            fh.write("999999999 001   L 999999999\n")
+            fh.write("999999999 1001  L $$aSukunimi, Etunimi\n")
+        index = RecordIndex(self.seq_file, "alephseq", index_path)
+        self.assertEqual(len(index.offsets), number_of_records + 1)
+        record = index.get_record("999999999")
+        self.assertEqual(record['100']['a'], "Sukunimi, Etunimi")
+        index.close()
+
+    def test_rewritten_file(self):
+        file_path = os.path.join(self.temp_dir, "rewritten.seq")
+        shutil.copy("tests/modified_authors.seq", file_path)
+        index = RecordIndex(file_path, "alephseq")
+        index.close()
+        size = os.path.getsize(file_path)
+        mtime = os.stat(file_path).st_mtime
+        # records are rewritten in place so that file size and end of file stay unchanged, but record 2 is moved
+        with open(file_path, 'r', encoding="utf-8") as fh:
+            data = fh.read()
+        data = data.replace("$$aTestiyhteisö1$$0(FIN11)000000001", "$$aTestiyhteisö1 A$$0(FIN11)000000001")
+        data = data.replace("$$aTestiyhteisö2$$0", "$$aTestiyhteis2$$0")
+        with open(file_path, 'w', encoding="utf-8") as fh:
+            fh.write(data)
+        os.utime(file_path, (mtime + 10, mtime + 10))
+        self.assertEqual(size, os.path.getsize(file_path))
+        index = RecordIndex(file_path, "alephseq")
+        self.assertEqual(index.get_record("000000001")['110']['a'], "Testiyhteisö1 A")
+        self.assertEqual(index.get_record("000000002")['110']['a'], "Testiyhteis2")
+        index.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,8 @@
 import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
 from resource_list import ResourceList
 from pymarc import Record, Field, Subfield
 
@@ -19,6 +23,71 @@ class ResourceListTest(unittest.TestCase):
         for id in self.rl.titles:
             self.assertEqual(len(self.rl.titles[id]), numbers[id])
 
+    def test_parallel_loading(self):
+        for input_file, format in [("tests/titles.mrc", "marc21"), ("tests/titles.seq", "alephseq")]:
+            titles = ResourceList(input_file, format).titles
+            self.assertEqual(titles, ResourceList(input_file, format, workers=2).titles)
+
+    def test_author_filter(self):
+        author_ids = {'000000002', '000000004'}
+        titles = ResourceList("tests/titles.mrc", "marc21", author_ids=author_ids).titles
+        self.assertEqual(set(titles), author_ids)
+        for author_id in author_ids:
+            self.assertEqual(titles[author_id], self.rl.titles[author_id])
+        self.assertEqual(titles, ResourceList("tests/titles.mrc", "marc21", workers=2, author_ids=author_ids).titles)
+
+    def test_title_retention(self):
+        rl = ResourceList(max_titles=2)
+        all_titles = ResourceList()
+        for title, date, language in [('B', '1990', 'fin'), ('A', '2000', 'fin'), ('C', '1980', 'fin'),
+                                      ('A', '2001', 'fin'), ('D', '1970', 'swe'), ('A', '2002', 'fin')]:
+            for resource_list in [rl, all_titles]:
+                resource_list.add_title('1', {'title': title, 'date': date, 'language': language, 'role': 'author',
+                                              'identifiers': {'ISBN': [title + date]}})
+        titles = rl.titles['1']
+        self.assertEqual([t['title'] for t in titles], ['C', 'A', 'D'])
+        self.assertEqual(titles[1]['editions'], 3)
+        self.assertEqual(titles[1]['identifiers'], {'ISBN': ['A2000', 'A2001', 'A2002']})
+        self.assertEqual(titles[1]['date'], '2000')
+        self.assertEqual(rl.removed_editions['1'], {'B': {'editions': 1, 'identifiers': {'ISBN': ['B1990']}, 'date': '1990'}})
+        self.assertSameEditions(rl.titles, all_titles.titles)
+        retained = ResourceList("tests/titles.mrc", "marc21", max_titles=1).titles
+        self.assertEqual(set(retained), set(self.rl.titles))
+        for author_id in retained:
+            languages = [t['language'] for t in retained[author_id]]
+            self.assertEqual(len(languages), len(set(languages)))
+        self.assertSameEditions(retained, self.rl.titles)
+        self.assertEqual(retained, ResourceList("tests/titles.mrc", "marc21", workers=2, max_titles=1).titles)
+
+    def assertSameEditions(self, retained, titles):
+        """
+        Checks that retained titles have the same editions, identifiers and earliest dates as all titles
+        """
+        for author_id in retained:
+            for retained_title in retained[author_id]:
+                editions = [t for t in titles[author_id] if t['title'] == retained_title['title']]
+                self.assertEqual(retained_title['editions'], len(editions))
+                dates = [t['date'] for t in editions if t['date']]
+                self.assertEqual(retained_title['date'], min(dates) if dates else None)
+                identifiers = {}
+                for title in editions:
+                    for identifier_type in title['identifiers']:
+                        identifiers.setdefault(identifier_type, []).extend(title['identifiers'][identifier_type])
+                self.assertEqual({key: sorted(value) for key, value in retained_title['identifiers'].items()},
+                                 {key: sorted(value) for key, value in identifiers.items()})
+
+    def test_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        cache_file = os.path.join(temp_dir, "titles.cache")
+        titles = ResourceList("tests/titles.mrc", "marc21", cache_file=cache_file).titles
+        self.assertTrue(os.path.isfile(cache_file))
+        with mock.patch.object(ResourceList, 'read_file') as read_file:
+            self.assertEqual(titles, ResourceList("tests/titles.mrc", "marc21", cache_file=cache_file).titles)
+            read_file.assert_not_called()
+            ResourceList("tests/titles.seq", "alephseq", cache_file=cache_file)
+            read_file.assert_called_once()
+        shutil.rmtree(temp_dir)
+
     def test_title_data(self):
         titles = self.rl.titles['000000004']
         for title in titles:
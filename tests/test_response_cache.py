@@ -0,0 +1,59 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from tools import response_cache
+
+class MockResponse(object):
+
+    def __init__(self, content, encoding='utf-8'):
+        self.status_code = 200
+        self.content = content
+        self.encoding = encoding
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_normalize_url(self):
+        url = "https://User@Example.org/sru/username=user/password=secret/?query=a&maximumRecords=10"
+        self.assertEqual(response_cache.normalize_url(url), "https://example.org/sru/?maximumRecords=10&query=a")
+        self.assertEqual(response_cache.get_key(url), response_cache.get_key("https://example.org/sru/?maximumRecords=10&query=a"))
+
+    def test_get_and_put(self):
+        cache = response_cache.ResponseCache(self.directory)
+        url = "https://example.org/sru?query=a"
+        self.assertIsNone(cache.get(url))
+        cache.put(url, MockResponse("ä".encode('iso8859-1'), 'iso8859-1'))
+        self.assertEqual(cache.get(url).text, "ä")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache = response_cache.ResponseCache(self.directory)
+        self.assertEqual(cache.get(url).content, "ä".encode('iso8859-1'))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(url, ttl=0.01))
+        cache.offline = True
+        self.assertIsNotNone(cache.get(url, ttl=0.01))
+
+    def test_eviction(self):
+        cache = response_cache.ResponseCache(self.directory)
+        cache.put("https://example.org/1", MockResponse(b'x' * 1000))
+        size = cache.size
+        cache = response_cache.ResponseCache(self.directory, max_size=size * 2)
+        self.assertEqual(cache.size, size)
+        cache.put("https://example.org/2", MockResponse(b'x' * 1000))
+        time.sleep(0.01)
+        # the first response is used more recently than the second
+        cache.get("https://example.org/1")
+        cache.put("https://example.org/3", MockResponse(b'x' * 1000))
+        self.assertIsNotNone(cache.get("https://example.org/1"))
+        self.assertIsNone(cache.get("https://example.org/2"))
+        self.assertIsNotNone(cache.get("https://example.org/3"))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,63 +1,95 @@
-import re
 import logging
 from pymarc import Field
 from pymarc import Record
+from pymarc import Subfield
+
+# number of characters read from file at once
+BLOCK_SIZE = 1048576
 
 class AlephSeqReader:
 
     def __init__(self, file_path):
+        """
+        Reads Aleph sequential files in large blocks and returns pymarc records,
+        lines with same system number in the first 9 characters form a record
+        Deleted records are returned as empty strings
+        :param file_path: file object opened in text mode
+        """
         self.file = file_path
-        self.current_line = self.file.readline().rstrip()
-        self.fields = []
-        self.field = None
+        self.records = self.read_records()
 
     def __iter__(self):
         return self
-    
+
     def close(self):
         self.file.close()
 
     def __next__(self):
-        if self.current_line == '':
-            raise StopIteration 
-        current_id = self.current_line[0:9]
-        self.record = Record()
-        while True: 
-            current_id = self.current_line[0:9]
-            field = self.form_field(self.current_line)
-            self.record.add_field(field)
-            self.previous_line = self.current_line
-            self.current_line = self.file.readline().rstrip()
-            if self.current_line[0:9] != current_id:
-                if 'DEL' in self.record:
-                    return ""
-                elif 'STA' in self.record:
-                    for field in self.record.get_fields("STA"):
-                        for sf in field.get_subfields('a'):
-                            if sf == "DELETED":
-                                return ""
-                # add identifier for testing
-                if not self.record['001']:
-                    field = Field(tag='001', data=current_id)
-                    self.record.add_ordered_field(field)
-                return self.record
-                    
-    def form_field(self, line):
-        fields = re.split('\$\$', line)
-        tag = fields[0][10:13]
-        indicators = [fields[0][13], fields[0][14]]
-        if tag == "LDR":
-            self.record.leader = fields[0][18:]
-        field = Field(tag, indicators, [])
-        if len(fields) > 1:
-            for f in fields[1:]:
-                try:
-                    field.add_subfield(f[0], f[1:])
-                except IndexError:
-                    logging.error("indexError %s"%(line))    
-        else:  
+        lines = next(self.records)
+        record_id = lines[0][0:9]
+        record = Record()
+        fields = []
+        deleted = False
+        for line in lines:
+            head, separator, subfield_data = line.partition('$$')
+            tag = head[10:13]
             try:
-                field.data = fields[0][18:]    
+                indicators = [head[13], head[14]]
             except IndexError:
-                    logging.error("indexError %s"%(line))   
-        return field  
\ No newline at end of file
+                logging.error("indexError %s"%(line))
+                continue
+            if tag == "LDR":
+                record.leader = head[18:]
+            elif tag == "DEL":
+                deleted = True
+            if separator:
+                subfields = [Subfield(sf[0], sf[1:]) for sf in subfield_data.split('$$') if sf]
+                if '$$$$' in line or line.endswith('$$'):
+                    logging.error("indexError %s"%(line))
+                field = Field(tag=tag, indicators=indicators, subfields=subfields)
+                if tag == "STA" and ('a', "DELETED") in subfields:
+                    deleted = True
+            else:
+                field = Field(tag=tag, indicators=indicators)
+                field.data = head[18:]
+            fields.append(field)
+        if deleted:
+            return ""
+        record.add_field(*fields)
+        # add identifier for testing
+        if not '001' in record:
+            field = Field(tag='001', data=record_id)
+            record.add_ordered_field(field)
+        return record
+
+    def read_records(self):
+        """
+        Reads lines of file in blocks and groups consecutive lines with same system number
+        Reading ends to the first empty line
+        """
+        lines = []
+        record_id = None
+        remainder = ''
+        while True:
+            block = self.file.read(BLOCK_SIZE)
+            if block:
+                block_lines = (remainder + block).split('\n')
+                remainder = block_lines.pop()
+            else:
+                block_lines = [remainder]
+            for line in block_lines:
+                line = line.rstrip()
+                if not line:
+                    if lines:
+                        yield lines
+                    return
+                line_id = line[0:9]
+                if line_id != record_id:
+                    if lines:
+                        yield lines
+                    record_id = line_id
+                    lines = [line]
+                else:
+                    lines.append(line)
+            if not block:
+                break
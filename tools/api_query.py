@@ -1,14 +1,108 @@
 #!/usr/bin/env python3
+import io
+import itertools
 import json
-import os
 import logging
+import os
 import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import random
 import requests
 import sys
+from tools import journal
 from tools import parse_isni_response
+from tools import parse_oai_response
+from tools import rate_limiter
+from tools import response_cache
+import threading
 import time
 import urllib
 
+# default number of pooled keep-alive connections per host
+POOL_SIZE = 10
+# sessions shared by all queries, keyed by scheme, host and pool size
+sessions = {}
+sessions_lock = threading.Lock()
+# HTTP status codes of responses to requests that may succeed if retried later
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# default number of retries for failed GET requests
+RETRIES = 3
+# default base delay in seconds for exponential backoff between retries
+BACKOFF = 1.0
+# default number of OAI-PMH pages requested ahead of processing
+PREFETCH = 2
+
+class APIQueryError(Exception):
+    pass
+
+def get_session(url, pool_size=POOL_SIZE):
+    """
+    Get a shared session with a pool of keep-alive connections for the host of URL
+    :param url: URL of request
+    :param pool_size: maximum number of connections kept open to the host
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc, pool_size)
+    with sessions_lock:
+        if key not in sessions:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount(parts.scheme + '://' + parts.netloc, adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+            sessions[key] = session
+        return sessions[key]
+
+def send_request(method, url, limiter, pool_size=POOL_SIZE, retries=0, backoff=BACKOFF, **kwargs):
+    """
+    Sends HTTP request with shared session within limits of rate limiter
+    Requests failing with connection error, timeout or status code in RETRY_STATUS_CODES are retried with
+    jittered exponential backoff or after delay given by server in Retry-After header.
+    Raises APIQueryError if request fails after retries without response or fails with another error of requests.
+    Response is returned if request fails after retries with response.
+    :param method: HTTP method, only idempotent requests should be retried
+    :param url: URL of request
+    :param limiter: RateLimiter of endpoint
+    :param pool_size: maximum number of connections kept open to the host
+    :param retries: number of retries
+    :param backoff: base delay in seconds between retries
+    :param kwargs: keyword arguments of requests.Session.request
+    """
+    attempt = 0
+    while True:
+        start = limiter.acquire()
+        response = None
+        error = None
+        failed = False
+        try:
+            response = get_session(url, pool_size).request(method, url, **kwargs)
+            failed = response.status_code in RETRY_STATUS_CODES
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            error = e
+            failed = True
+        except requests.exceptions.RequestException as e:
+            # other errors, e.g. invalid URLs or too many redirects, are not retried
+            raise APIQueryError("Request %s failed: %s"%(url, e))
+        finally:
+            limiter.release(start, failed)
+        if not failed:
+            return response
+        if attempt >= retries:
+            if error:
+                raise APIQueryError("Request %s failed: %s"%(url, error))
+            return response
+        attempt += 1
+        delay = random.uniform(0, backoff * 2 ** attempt)
+        if response is not None:
+            logging.warning("Response status %s for request %s, retrying"%(response.status_code, url))
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+        else:
+            logging.warning("Request %s failed: %s, retrying"%(url, error))
+        time.sleep(delay)
+
 class APIQuery():
 
     def __init__(self, config_section, username=None, password=None):
@@ -31,6 +125,17 @@ class APIQuery():
         self.username = None
         self.password = None
         self.timeout = int(config_section.get('timeout'))
+        self.pool_size = int(config_section.get('pool_size', fallback=POOL_SIZE))
+        self.retries = int(config_section.get('retries', fallback=RETRIES))
+        self.backoff = float(config_section.get('backoff', fallback=BACKOFF))
+        self.prefetch = int(config_section.get('prefetch', fallback=PREFETCH))
+        self.limiter = rate_limiter.get_limiter(config_section)
+        # response bodies are parsed incrementally while they are received
+        self.stream = config_section.getboolean('stream', fallback=False)
+        # responses are cached only if cache_ttl is set, value 0 means that cached responses do not expire
+        self.cache_ttl = config_section.get('cache_ttl', fallback=None)
+        if self.cache_ttl is not None:
+            self.cache_ttl = float(self.cache_ttl)
         if username:
             self.username = username
         if password:
@@ -67,55 +172,239 @@ class APIQuery():
         :param parameters: a dict of keyword arguments used as search parameters
         """
         url = self._form_query_url(query, parameters)
+
+        return self.get(url).text
+
+    def api_search_content(self, query="", parameters=None):
+        """
+        Forms query URL and sends OAI-PMH or SRU API request, returns response body as bytes
+        :param query: a string containing sru search query
+        :param parameters: a dict of keyword arguments used as search parameters
+        """
+        url = self._form_query_url(query, parameters)
+
+        return self.get(url).content
+
+    def api_search_stream(self, query="", parameters=None):
+        """
+        Forms query URL and sends OAI-PMH or SRU API request, returns file-like object of response body read while it is received
+        Response body is read into memory, if response is read from or saved into response cache.
+        Returned object should be closed after reading to release connection.
+        :param query: a string containing sru search query
+        :param parameters: a dict of keyword arguments used as search parameters
+        """
+        url = self._form_query_url(query, parameters)
+        cache = response_cache.cache
+        if cache and (self.cache_ttl is not None or cache.offline):
+            return io.BytesIO(self.get(url).content)
+        r = send_request('GET', url, self.limiter, self.pool_size, self.retries, self.backoff, timeout=self.timeout, stream=True)
+        if r.status_code in RETRY_STATUS_CODES:
+            r.close()
+            raise APIQueryError("Request %s failed with status %s"%(url, r.status_code))
+        r.raw.decode_content = True
+
+        return r.raw
+
+    def parse_stream(self, query, parameters, parse):
+        """
+        Sends API request and returns result of parsing streamed response body
+        :param query: a string containing sru search query
+        :param parameters: a dict of keyword arguments used as search parameters
+        :param parse: function called with file-like response body
+        """
+        with self.api_search_stream(query, parameters) as body:
+            return parse(body)
+
+    def get(self, url):
+        """
+        Sends GET request and retries it, if it fails
+        Response is read from and saved into response cache, if caching is set
+        Raises APIQueryError if request fails after retries or response is not cached in offline mode
+        :param url: URL of request
+        """
+        cache = response_cache.cache
+        cached = cache and (self.cache_ttl is not None or cache.offline)
+        if cached:
+            r = cache.get(url, self.cache_ttl)
+            if r:
+                return r
+            if cache.offline:
+                raise APIQueryError("Response of request %s not cached"%url)
+        r = send_request('GET', url, self.limiter, self.pool_size, self.retries, self.backoff, timeout=self.timeout)
+        if r.status_code in RETRY_STATUS_CODES:
+            raise APIQueryError("Request %s failed with status %s"%(url, r.status_code))
+        if cached and r.status_code == 200:
+            cache.put(url, r)
+
+        return r
+
+    def harvest(self, parameters, token=None):
+        """
+        Yields OAIResponse objects of all pages of a list request
+        Next page is requested and parsed in a background thread as soon as resumption token is found from previous page,
+        while previous pages are processed. Number of pages requested ahead is set with prefetch in config section.
+        :param parameters: a dict of OAI-PMH query parameters, e.g. {'verb': 'ListRecords', 'from': '2024-01-01'}
+        :param token: resumption token of the first requested page for continuing an interrupted harvest
+        """
+        pages = queue.Queue(maxsize=self.prefetch)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch_pages():
+            try:
+                query_parameters = parameters
+                if token:
+                    query_parameters = {'resumptionToken': token, 'verb': parameters['verb']}
+                while True:
+                    if self.stream:
+                        with self.api_search_stream(parameters=query_parameters) as body:
+                            response = parse_oai_response.OAIResponseStream(body, parameters)
+                            response.parse()
+                    else:
+                        response = parse_oai_response.OAIResponse(self.api_search_content(parameters=query_parameters), parameters)
+                    next_token = response.resumption_token
+                    if not put(response) or not next_token:
+                        break
+                    query_parameters = {'resumptionToken': next_token, 'verb': parameters['verb']}
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        worker = threading.Thread(target=fetch_pages, daemon=True)
+        worker.start()
         try:
-            r = requests.get(url, timeout=self.timeout)
-        except requests.exceptions.ReadTimeout:
-            logging.error("Timeout for query %s"%url)
-            return
+            while True:
+                try:
+                    page = pages.get(timeout=1)
+                except queue.Empty:
+                    if worker.is_alive():
+                        continue
+                    # worker may have put the last page just before it stopped
+                    if pages.empty():
+                        raise APIQueryError("Harvesting stopped unexpectedly")
+                    continue
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            stopped.set()
 
-        return r.text
+    def get_pages(self, query, number_of_records, page_size, parameters=None, start_record=1, max_records=None, parse=None):
+        """
+        Requests pages of SRU query results concurrently and yields responses in order of pages
+        Number of pages requested ahead of the yielded page is set with prefetch in config section,
+        requests are limited by rate limiter of API endpoint.
+        :param query: a string containing sru search query
+        :param number_of_records: number of records in query results, e.g. numberOfRecords of the first page
+        :param page_size: number of records in a page, i.e. maximumRecords
+        :param parameters: a dict of additional search parameters, startRecord of page is added to them
+        :param start_record: startRecord of the first requested page
+        :param max_records: maximum number of requested records
+        :param parse: function called in worker thread with streamed response body of a page, its result is yielded instead of response
+        """
+        if max_records is not None:
+            number_of_records = min(number_of_records, max_records)
+        futures = deque()
+        with ThreadPoolExecutor(max_workers=max(1, self.prefetch)) as executor:
+            try:
+                for page_start_record in range(start_record, number_of_records + 1, page_size):
+                    page_parameters = dict(parameters or {})
+                    page_parameters['startRecord'] = str(page_start_record)
+                    if parse:
+                        futures.append(executor.submit(self.parse_stream, query, page_parameters, parse))
+                    else:
+                        futures.append(executor.submit(self.api_search, query, page_parameters))
+                    if len(futures) > self.prefetch:
+                        yield futures.popleft().result()
+                while futures:
+                    yield futures.popleft().result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def convert_query_file(self, query_file):
+        """
+        Converts query results saved as a single pickle by earlier versions into a journal of the same query
+        Exits if query file is neither a journal nor a pickle of query results
+        :param query_file: File path of query results
+        """
+        try:
+            with open(query_file, 'rb') as fh:
+                data = pickle.load(fh)
+            query = data['query']
+            results = data['results']
+            start_record = data['startRecord']
+            number_of_records = data['record number']
+        except (pickle.UnpicklingError, EOFError, KeyError, TypeError) as e:
+            logging.error("Query result file %s is not a journal of query results: %s"%(query_file, e))
+            sys.exit(2)
+        logging.info("Converting query result file %s into journal"%query_file)
+        # the last saved page started from startRecord
+        next_start_record = None
+        if number_of_records and start_record + 100 <= number_of_records:
+            next_start_record = start_record + 100
+        query_journal = journal.Journal(query_file, {'query': query})
+        query_journal.reset()
+        query_journal.append(results, next_start_record)
 
     def get_isni_query_data(self, query, query_file=None):
         """
         Performs ISNI SRU API queries and parses query data into dict
         :param query: a string containing ISNI sru search query
-        :param record_schema: ISNI ARU API recordSchema ("isni-e" or "isni-b")
-        :param query_file: File path to load/save query results in pickle file for possibly continuing interrupted queries
-        """
-        data = {}
-        data = {'startRecord': 1, 'query': query, 'results': [], 'record number': 2}
-        if query_file and os.path.isfile(query_file):
-            with open(query_file, 'rb') as input_file:
-                data = pickle.load(input_file)
-                if data['query'] != query:
-                    while True:
-                        answer = input("Query result file exits with different query. Overwrite (Y/N)?")
-                        if answer.lower() == "y":
-                            break
-                        if answer.lower() == "n":
-                            sys.exit(2)
-        startRecord = data['startRecord']
-        if not data['record number']:
-            logging.error("Query %s results missing number of records"%data['query'])
-        else:
-            while startRecord <= data['record number']:
-                data['startRecord'] = startRecord
-                additional_parameters = {'maximumRecords': '100', 'startRecord': str(startRecord)}
-                url = self._form_query_url(query, additional_parameters)
-                try:
-                    results = requests.get(url, timeout=self.timeout).text
-                except requests.exceptions.ReadTimeout:
-                    logging.error("Timeout for query %s"%url)
-                data['record number'] = parse_isni_response.get_number_of_records(results)
-                data['results'].extend(parse_isni_response.dictify_xml(results))
-                if query_file:
-                    with open(query_file, 'wb') as output:
-                        pickle.dump(data, output, pickle.HIGHEST_PROTOCOL)
-                if not data['record number']:
-                    break
-                if data['record number'] > 100:
-                    logging.info("Querying records from number %s"%startRecord)
-                    time.sleep(1)
-                startRecord += 100
+        :param query_file: File path of journal where results of every page are appended for possibly continuing interrupted queries
+        """
+        results = []
+        start_record = 1
+        query_journal = None
+        if query_file:
+            query_journal = journal.Journal(query_file, {'query': query})
+            cursor = query_journal.read_cursor()
+            if not cursor and query_journal.has_data():
+                self.convert_query_file(query_file)
+                cursor = query_journal.read_cursor()
+            if cursor and cursor.get('parameters') != query_journal.parameters_hash:
+                while True:
+                    answer = input("Query result file exits with different query. Overwrite (Y/N)?")
+                    if answer.lower() == "y":
+                        query_journal.reset()
+                        break
+                    if answer.lower() == "n":
+                        sys.exit(2)
+            for page_results in query_journal.replay():
+                results.extend(page_results)
+            if query_journal.cursor['complete']:
+                return results
+            start_record = query_journal.cursor['token'] or 1
+        additional_parameters = {'maximumRecords': '100', 'startRecord': str(start_record)}
+        response = self.api_search(query, additional_parameters)
+        number_of_records = parse_isni_response.get_number_of_records(response)
+        if number_of_records is None:
+            logging.error("Query %s results missing number of records"%query)
+            number_of_records = 0
+        # pages after the first one are requested concurrently
+        del(additional_parameters['startRecord'])
+        responses = itertools.chain([response], self.get_pages(query, number_of_records, 100, additional_parameters, start_record + 100))
+        for response in responses:
+            page_results = parse_isni_response.dictify_xml(response)
+            results.extend(page_results)
+            if number_of_records > 100:
+                logging.info("Querying records from number %s"%start_record)
+            start_record += 100
+            if query_journal:
+                next_start_record = None
+                if start_record <= number_of_records:
+                    next_start_record = start_record
+                query_journal.append(page_results, next_start_record)
 
-        return data['results']
+        return results
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import struct
+
+# byte length of the length prefix of entries
+PREFIX = struct.Struct('>Q')
+
+class JournalError(Exception):
+    pass
+
+class Journal:
+
+    def __init__(self, file_path, parameters):
+        """
+        Append-only journal of harvested or queried pages with a cursor saved after every page
+        Entries are saved as length-prefixed pickles into file_path and cursor as JSON into file_path with suffix .json.
+        Cursor contains number of bytes of complete entries, so entries written partially when crashing are discarded.
+        Journal is valid only for the same parameters that were used when it was created.
+        :param file_path: file path of journal
+        :param parameters: JSON serializable parameters identifying harvest or query
+        """
+        self.file_path = file_path
+        self.cursor_path = file_path + '.json'
+        self.parameters_hash = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()
+        self.cursor = {'parameters': self.parameters_hash, 'size': 0, 'pages': 0, 'token': None, 'complete': False}
+
+    def resume(self):
+        """
+        Loads cursor and returns a list of saved entries, if journal exists and it was created with same parameters
+        Journal is started empty, if journal file does not exist or is empty
+        Raises JournalError, if journal file contains data without cursor or with cursor of different parameters
+        """
+        return list(self.replay())
+
+    def replay(self):
+        """
+        Loads cursor and yields saved entries one by one, if journal exists and it was created with same parameters
+        Journal is started empty, if journal file does not exist or is empty
+        Raises JournalError, if journal file contains data without cursor or with cursor of different parameters,
+        so that data is not lost without asking, journal can be emptied with reset function
+        """
+        cursor = self.read_cursor()
+        if not cursor or cursor.get('parameters') != self.parameters_hash:
+            if self.has_data():
+                if cursor:
+                    raise JournalError("Journal %s was created with different parameters"%self.file_path)
+                raise JournalError("Journal %s has no valid cursor"%self.file_path)
+            self.reset()
+            return
+        self.cursor = cursor
+        logging.info("Resuming from %s pages saved in journal %s"%(cursor['pages'], self.file_path))
+        # remove partially written entry after the last complete entry
+        with open(self.file_path, 'r+b') as fh:
+            fh.truncate(cursor['size'])
+        with open(self.file_path, 'rb') as fh:
+            position = 0
+            while position < cursor['size']:
+                length = PREFIX.unpack(fh.read(PREFIX.size))[0]
+                yield pickle.loads(fh.read(length))
+                position += PREFIX.size + length
+
+    def read_cursor(self):
+        """
+        Returns saved cursor or None, if journal does not exist or cursor is corrupted
+        """
+        if os.path.isfile(self.cursor_path) and os.path.isfile(self.file_path):
+            try:
+                with open(self.cursor_path, 'r', encoding='utf-8') as fh:
+                    return json.load(fh)
+            except json.decoder.JSONDecodeError as e:
+                logging.error("Journal cursor %s is corrupted: %s"%(self.cursor_path, e))
+
+    def has_data(self):
+        """
+        Checks if journal file exists and is not empty
+        """
+        return os.path.isfile(self.file_path) and os.path.getsize(self.file_path) > 0
+
+    def reset(self):
+        """
+        Empties journal
+        """
+        self.cursor = {'parameters': self.parameters_hash, 'size': 0, 'pages': 0, 'token': None, 'complete': False}
+        open(self.file_path, 'wb').close()
+        self.save_cursor()
+
+    def append(self, entry, token):
+        """
+        Saves entry and resumption token of the next page
+        :param entry: picklable data of a page
+        :param token: JSON serializable resumption token or position of the next page, None if page is the last one
+        """
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with open(self.file_path, 'ab') as fh:
+            fh.write(PREFIX.pack(len(data)))
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        self.cursor['size'] += PREFIX.size + len(data)
+        self.cursor['pages'] += 1
+        self.cursor['token'] = token
+        self.cursor['complete'] = not token
+        self.save_cursor()
+
+    def save_cursor(self):
+        temp_path = self.cursor_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self.cursor, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, self.cursor_path)
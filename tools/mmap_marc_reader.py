@@ -0,0 +1,120 @@
+import logging
+import mmap
+import os
+from pymarc import Field, Record, Subfield
+from pymarc.marc8 import marc8_to_unicode
+
+LEADER_LENGTH = 24
+DIRECTORY_ENTRY_LENGTH = 12
+RECORD_TERMINATOR = b'\x1d'
+SUBFIELD_INDICATOR = b'\x1f'
+
+class MMapMARCReader:
+
+    def __init__(self, file_path, tags=None, start=0, end=None):
+        """
+        Reads ISO 2709 records from a memory mapped file
+        Only leader and directory are parsed for every record. Data of fields is decoded only for tags
+        in parameter tags, other fields are skipped without copying their data.
+        :param file_path: file containing MARC21 records
+        :param tags: tags of fields decoded into records, all fields are decoded if not given
+        :param start: byte offset of the first record read
+        :param end: byte offset after the last record read
+        """
+        self.file = open(file_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = b''
+        if size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.tags = None
+        if tags:
+            self.tags = set(tags)
+        self.position = start
+        self.end = size
+        if end is not None:
+            self.end = end
+
+    def __iter__(self):
+        return self
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __next__(self):
+        while self.position < self.end:
+            offset = self.position
+            try:
+                length = int(self.data[offset:offset + 5])
+                if length < LEADER_LENGTH:
+                    raise ValueError
+            except ValueError:
+                if self.data[offset:self.end].strip(b'\x1a\r\n '):
+                    logging.error("Invalid record length in record at byte %s"%offset)
+                # continue from the next record
+                self.position = self.data.find(RECORD_TERMINATOR, offset, self.end) + 1
+                if not self.position:
+                    break
+                continue
+            self.position = offset + length
+            if self.position > self.end:
+                logging.error("Truncated record at byte %s"%offset)
+                break
+            try:
+                return self.parse_record(offset)
+            except (ValueError, UnicodeDecodeError) as e:
+                logging.error("Invalid record at byte %s: %s"%(offset, e))
+        raise StopIteration
+
+    def parse_record(self, offset):
+        """
+        Parses a record from leader, directory and fields with projected tags
+        :param offset: byte offset of record
+        """
+        data = self.data
+        leader = data[offset:offset + LEADER_LENGTH].decode('ascii')
+        base_address = offset + int(leader[12:17])
+        utf8 = leader[9] == 'a'
+        record = Record()
+        record.leader = leader
+        directory = data[offset + LEADER_LENGTH:base_address - 1]
+        fields = []
+        for idx in range(0, len(directory) - DIRECTORY_ENTRY_LENGTH + 1, DIRECTORY_ENTRY_LENGTH):
+            tag = directory[idx:idx + 3].decode('ascii')
+            if self.tags is not None and tag not in self.tags:
+                continue
+            start = base_address + int(directory[idx + 7:idx + 12])
+            field_data = data[start:start + int(directory[idx + 3:idx + 7]) - 1]
+            fields.append(self.decode_field(tag, field_data, utf8))
+        record.add_field(*fields)
+
+        return record
+
+    def decode_field(self, tag, field_data, utf8):
+        """
+        Decodes field data the same way as pymarc MARCReader
+        :param tag: tag of field
+        :param field_data: bytes of field without field terminator
+        :param utf8: True if record is encoded in UTF-8, otherwise MARC-8
+        """
+        if tag < "010" and tag.isdigit():
+            if utf8:
+                return Field(tag=tag, data=field_data.decode('utf-8'))
+            return Field(tag=tag, data=field_data.decode('iso8859-1'))
+        subfield_data = field_data.split(SUBFIELD_INDICATOR)
+        indicators = subfield_data[0].decode('ascii')
+        # missing indicators are replaced with blanks
+        indicators = [(indicators + "  ")[0], (indicators + "  ")[1]]
+        subfields = []
+        for sf in subfield_data[1:]:
+            if not sf:
+                continue
+            code = sf[0:1].decode('ascii', errors='replace')
+            if utf8:
+                value = sf[1:].decode('utf-8')
+            else:
+                value = marc8_to_unicode(sf[1:])
+            subfields.append(Subfield(code=code, value=value))
+
+        return Field(tag=tag, indicators=indicators, subfields=subfields)
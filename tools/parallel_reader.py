@@ -0,0 +1,117 @@
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pymarc import MARCReader
+from tools import aleph_seq_reader
+
+RECORD_TERMINATOR = b'\x1d'
+# number of byte ranges per worker process to balance uneven ranges
+RANGES_PER_WORKER = 4
+# number of bytes read at once when searching for record boundaries
+READ_SIZE = 65536
+
+def find_boundary(fh, position, format):
+    """
+    Finds the first record boundary at or after position in ISO 2709 or Aleph sequential file
+    :param fh: file object opened in binary mode
+    :param position: byte offset in file
+    :param format: format of file, either 'marc21' or 'alephseq'
+    """
+    fh.seek(position)
+    if format == 'marc21':
+        while True:
+            data = fh.read(READ_SIZE)
+            if not data:
+                return None
+            idx = data.find(RECORD_TERMINATOR)
+            if idx > -1:
+                return position + idx + 1
+            position += len(data)
+    else:
+        # skip the line in which position is
+        position += len(fh.readline())
+        record_id = None
+        for line in fh:
+            if record_id is not None and line[0:9] != record_id:
+                return position
+            record_id = line[0:9]
+            position += len(line)
+        return None
+
+def split_file(file_path, format, number_of_ranges):
+    """
+    Splits file into byte ranges so that ISO 2709 records are split after record terminators
+    and Aleph sequential records are split where system number changes
+    :param file_path: file containing MARC21 records
+    :param format: format of file, either 'marc21' or 'alephseq'
+    :param number_of_ranges: maximum number of ranges
+    """
+    size = os.path.getsize(file_path)
+    boundaries = [0]
+    with open(file_path, 'rb') as fh:
+        for idx in range(1, number_of_ranges):
+            position = size * idx // number_of_ranges
+            if position <= boundaries[-1]:
+                continue
+            boundary = find_boundary(fh, position, format)
+            if boundary is None or boundary >= size:
+                break
+            boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def read_range(file_path, format, start, end):
+    """
+    Reads MARC21 records from a byte range of file, records that cannot be parsed are logged and skipped
+    :param file_path: file containing MARC21 records
+    :param format: format of file, either 'marc21' or 'alephseq'
+    :param start: byte offset of the first record
+    :param end: byte offset after the last record
+    """
+    with open(file_path, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    if format == 'marc21':
+        reader = MARCReader(io.BytesIO(data), to_unicode=True)
+    else:
+        reader = aleph_seq_reader.AlephSeqReader(io.StringIO(data.decode('utf-8')))
+    records = []
+    record = ""
+    while record is not None:
+        try:
+            record = next(reader, None)
+        except Exception as e:
+            logging.exception(e)
+            continue
+        if record:
+            records.append(record)
+    return records
+
+def map_ranges(file_path, format, workers, function):
+    """
+    Splits file into byte ranges and processes them in a process pool
+    Results are yielded in the original order of ranges in file
+    :param file_path: file containing MARC21 records
+    :param format: format of file, either 'marc21' or 'alephseq'
+    :param workers: number of worker processes
+    :param function: picklable function with parameters file_path, format, start and end
+    """
+    ranges = split_file(file_path, format, workers * RANGES_PER_WORKER)
+    logging.info("Reading file %s in %s parts with %s processes"%(file_path, len(ranges), workers))
+    starts = [start for start, end in ranges]
+    ends = [end for start, end in ranges]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(function, [file_path] * len(ranges), [format] * len(ranges), starts, ends):
+            yield result
+
+def read_records(file_path, format, workers):
+    """
+    Reads MARC21 records from file with multiple processes and yields them in the original order
+    :param file_path: file containing MARC21 records
+    :param format: format of file, either 'marc21' or 'alephseq'
+    :param workers: number of worker processes
+    """
+    for records in map_ranges(file_path, format, workers, read_range):
+        for record in records:
+            yield record
@@ -1,7 +1,13 @@
-import json
 from lxml import etree as ET
 
 NAMESPACES = {'srw': 'http://www.loc.gov/zing/srw/'}
+# statuses of response records in order of precedence
+STATUSES = ['ISNIAssigned', 'ISNINotAssigned', 'noISNI']
+# name elements of identity types and lists of names where they are added
+NAME_TYPES = {'personOrFiction': {'personalName': 'main names', 'personalNameVariant': 'variant names'},
+              'organisation': {'organisationName': 'main names', 'organisationNameVariant': 'variant names'}}
+# name attributes of identity types
+NAME_KEYS = {'personOrFiction': ['surname', 'forename'], 'organisation': ['mainName', 'subdivisionName']}
 
 def get_number_of_records(response):
     root = ET.fromstring(bytes(response, encoding='latin1'))
@@ -26,223 +32,199 @@ def get_response_records(response):
                     response_records.append(response_record)
     return response_records
 
-def add_values_to_list(valuelist, values, source_code):
+class ValueList:
+
+    def __init__(self):
+        """
+        List of dicts with keys 'values' and 'sources', values are deduplicated with hash keys
+        """
+        self.values = []
+        # value dicts and sets of their source codes by hash keys of values
+        self.index = {}
+
+    def add(self, values, source_code):
+        """
+        Adds a dict with key 'values' to list if list does not contain values. If values exits, just add source code to list.
+        """
+        key = get_hash_key(values)
+        if key not in self.index:
+            value_data = {'values': values, 'sources': [source_code]}
+            self.index[key] = (value_data, {source_code})
+            self.values.append(value_data)
+        else:
+            value_data, source_codes = self.index[key]
+            if source_code not in source_codes:
+                source_codes.add(source_code)
+                value_data['sources'].append(source_code)
+
+def get_hash_key(values):
     """
-    Adds a dict with key 'values' to list if list does not contain values. If values exits, just add source code to list. 
+    Get hashable key of a string or a dict of strings and lists of strings, equal for equal values
     """
-    value_data = {'values': values, 'sources': [source_code]}
-    if not any(values == value_obj['values'] for value_obj in valuelist):
-        valuelist.append(value_data)
-    else:
-        for value_obj in valuelist:
-            if values == value_obj['values']:
-                if source_code not in value_obj['sources']:
-                    value_obj['sources'].append(source_code)
+    if isinstance(values, dict):
+        return frozenset((key, tuple(value) if isinstance(value, list) else value) for key, value in values.items())
+    return values
 
-def get_status(record):
+def get_name_attributes(name, keys):
     """
-    Gets ISNI status from ISNI record. In AtomPub response unassigned records have status noISNI
+    Get attributes of name element in order of keys and source code of name
     """
-    if record.findall('ISNIAssigned'):
-        return 'ISNIAssigned'
-    if record.findall('ISNINotAssigned'):
-        return 'ISNINotAssigned'
-    if record.findall('noISNI'):
-        return 'noISNI'
-
-def get_reason(record, status):
-    for reason in record.findall(status + '/reason'):
-        return reason.text
-
-def get_identifier(record, status):
-    for isni_data in record.findall(status):
-        for identifier in isni_data.findall('isniUnformatted'):
-            return {'type': 'isni', 'identifier': identifier.text}
-        for identifier in isni_data.findall('PPN'):
-            return {'type': 'ppn', 'identifier': identifier.text}
-
-def get_deprecated_isnis(record, status):
-    deprecated_isnis = []
-    for deprecated_isni in record.findall(status + '/mergedISNI'):
-        deprecated_isnis.append(deprecated_isni.text)
-    
-    return deprecated_isnis
-
-def get_possible_matches(record, status):
+    attributes = {}
+    source_code = None
+    for elem in name:
+        if elem.tag == 'source':
+            source_code = elem.text
+        elif elem.tag == 'subdivisionName' and elem.tag in keys:
+            attributes.setdefault(elem.tag, []).append(elem.text)
+        elif elem.tag in keys:
+            attributes[elem.tag] = elem.text
+    name_data = {key: attributes[key] for key in keys if key in attributes}
+    return name_data, source_code
+
+def get_names(name_entries):
+    """
+    Get main names and variant names from tuples of name list, name attributes and source code
+    """
+    names = {'main names': ValueList(), 'variant names': ValueList()}
+    for name_list, name_data, source_code in name_entries:
+        # name attributes are copied for every returned dict
+        name_data = {key: list(value) if isinstance(value, list) else value for key, value in name_data.items()}
+        names[name_list].add(name_data, source_code)
+    return {name_list: names[name_list].values for name_list in names}
+
+def get_additional_information(info, additional_info):
     """
-    Gets possible matches from AtomPub response
+    Adds values of additional information element into dict of ValueLists
     """
+    for elem in info:
+        if not isinstance(elem.tag, str):
+            continue
+        if elem.tag not in additional_info:
+            additional_info[elem.tag] = ValueList()
+        value = elem.text
+        source_codes = []
+        for data in elem:
+            if data.tag == 'countryCode' and elem.tag in ['countriesAssociated', 'location']:
+                value = data.text
+            elif data.tag == 'source' and elem.tag == 'location':
+                source_codes.append(data.text)
+        if elem.tag not in ['location', 'nationality']:
+            source_codes.append(elem.attrib['source'])
+        for source_code in source_codes:
+            additional_info[elem.tag].add(value, source_code)
+
+def dictify_record(record):
+    """
+    Converts an ISNI response record to dict walking through the record once
+    :param record: responseRecord element
+    """
+    status_elements = {}
+    for elem in record:
+        if elem.tag in STATUSES:
+            status_elements.setdefault(elem.tag, []).append(elem)
+    status = None
+    for status_tag in STATUSES:
+        if status_tag in status_elements:
+            status = status_tag
+            break
+    reasons = []
+    identifier = None
     possible_matches = []
-    for pm in record.findall(status + '/possibleMatch'):
-        values = {}
-        for ppn in pm.findall('PPN'):
-            values['ppn'] = ppn.text
-        for score in pm.findall('evaluationScore'):
-            values['evaluationScore'] = score.text
-        possible_matches.append(values)
-    
-    return possible_matches
-
-def get_identity_type(record, status):
-    for data in record.findall(status + '/ISNIMetadata/identity'):
-        for elem in data:
-            if elem.tag:
-                return elem.tag
-
-def get_source_identifiers(record, status):
-    sources = {}
-    for data in record.findall(status + '/ISNIMetadata/sources'):
-        source_code = None
-        identifier = None
-        for code_of_source in data.findall('codeOfSource'):
-            source_code = code_of_source.text
-        for source_identifier in data.findall('sourceIdentifier'):
-            identifier = source_identifier.text
-        if source_code not in sources:
-            sources[source_code] = []
-        sources[source_code].append(identifier)
-
-    return sources
-
-def get_external_information(record, status):
+    deprecated_isnis = []
+    identities = []
     uris = []
-    for info in record.findall(status + '/ISNIMetadata/externalInformation'):
-        for uri in info.findall('URI'):
-            uris.append(uri.text)
-
-    return uris
-
-def get_other_identifiers(record, status):
-    other_identifiers = []
-    for other_identifier in record.findall(status + '/ISNIMetadata/otherIdentifierOfIdentity'):
-        identifier_type = None
-        identifier = None
-        source_code = None
-        for identifier_type in other_identifier.findall('type'):
-            identifier_type = identifier_type.text
-        for identifier in other_identifier.findall('identifier'):
-            identifier = identifier.text
-        for source in other_identifier.findall('source'):
-            source_code = source.text
-        values = {'type': identifier_type, 'identifier': identifier}
-        add_values_to_list(other_identifiers, values, source_code)
-
-    return other_identifiers
-
-def get_name_attributes(name, keys):
-    name_data = {}
-    for attrib in keys:
-        for elem in name.findall(attrib):
-            if attrib == 'subdivisionName':
-                if not attrib in name_data:
-                    name_data[attrib] = []
-                name_data[attrib].append(elem.text)
-            else:
-                name_data[attrib] = elem.text
-    return name_data
-
-def get_name_variants(record, status, identity_type):
-    names = {'main names': [], 'variant names': []}
-    path = status + '/ISNIMetadata/identity/' + identity_type + '/'
-    if identity_type == 'personOrFiction':
-        name_types = ['personalName', 'personalNameVariant']
-    elif identity_type == 'organisation':
-        name_types = ['organisationName', 'organisationNameVariant']
-    for name_type in name_types:
-        name_path = path + name_type
-        for variant_name in record.findall(name_path):
-            keys = []
-            name = {}
-            source_code = None
-            if identity_type == 'personOrFiction':
-                keys = ['surname', 'forename'] 
-            elif identity_type == 'organisation':
-                keys = ['mainName', 'subdivisionName']
-            name['values'] = get_name_attributes(variant_name, keys)
-            for source in variant_name.findall('source'):
-                source_code = source.text
-            if name_type in ['personalName', 'organisationName']:
-                add_values_to_list(names['main names'], name['values'], source_code)
-            if name_type in ['personalNameVariant', 'organisationNameVariant']:
-                add_values_to_list(names['variant names'], name['values'], source_code)
-
-    return names
-
-def get_related_identitites(record, status, identity_type):
-    related_identities = []
-    path = status + '/ISNIMetadata/identity/' + identity_type + '/'
-    related_types = ['isRelatedPerson', 'isRelatedOrganisation']
-    for related_type in related_types:
-        name_path = path + related_type
-        for related in record.findall(name_path):
-            keys = []
-            source_code = None
-            if related_type == 'isRelatedPerson':
-                related_identity_type = 'personOrFiction'
-                keys = ['surname', 'forename'] 
-            if related_type == 'isRelatedOrganisation':
-                related_identity_type = 'organisation'
-                keys = ['mainName', 'subdivisionName']
-            related_identity = {'values': {'identity type': related_identity_type}}
-            related_identity['values'].update(get_name_attributes(related, keys))
-            isni = None
-            for identifier in related.findall('ISNI'):
-                isni = identifier.text
-            related_identity['values']['ISNI'] = isni
-            for source in related.findall('source'):
-                source_code = source.text
-            add_values_to_list(related_identities, related_identity['values'], source_code)
-
-    return related_identities
-
-def get_additional_information(record, status, identity_type):
-    path = status + '/ISNIMetadata/identity/' + identity_type + '/additionalInformation'
-    additional_info = {}
-    for info in record.findall(path):
-        for elem in info:
-            source_codes = []
-            if elem.tag not in additional_info:
-                additional_info[elem.tag] = []
-            for data in info.findall(elem.tag):
-                value = elem.text
-            if elem.tag == 'countriesAssociated':
-                for county_code in elem.findall('countryCode'):
-                    value = county_code.text
-            if elem.tag == 'location':
-                for county_code in elem.findall('countryCode'):
-                    value = county_code.text
-                for source_code in elem.findall('source'):
-                    source_codes.append(source_code.text)
-            elif elem.tag != 'nationality':
-                source_codes.append(json.loads(str(elem.attrib).replace('\'', '"'))['source'])
-            for source_code in source_codes:
-                add_values_to_list(additional_info[elem.tag], value, source_code)
-
-    return additional_info
-
-def dictify_xml(response):    
-    response_records = get_response_records(response)
-    isnis = []
-    for record in response_records:
-        status = get_status(record)
-        isni_record = {}
-        identifier_obj = get_identifier(record, status)
-        if status == 'noISNI':
-            isni_record['reason'] = get_reason(record, status)
-        if identifier_obj:
-            isni_record[identifier_obj['type']] = identifier_obj['identifier']
-        isni_record['possible matches'] = get_possible_matches(record, status)
-        isni_record['deprecated isnis'] = get_deprecated_isnis(record, status)
-        identity_type = get_identity_type(record, status)
+    other_identifiers = ValueList()
+    sources = {}
+    for status_element in status_elements.get(status, []):
+        isni = None
+        ppn = None
+        for elem in status_element:
+            tag = elem.tag
+            if tag == 'reason':
+                reasons.append(elem.text)
+            elif tag == 'isniUnformatted' and not isni:
+                isni = {'type': 'isni', 'identifier': elem.text}
+            elif tag == 'PPN' and not ppn:
+                ppn = {'type': 'ppn', 'identifier': elem.text}
+            elif tag == 'possibleMatch':
+                values = {}
+                ppns = [data.text for data in elem if data.tag == 'PPN']
+                scores = [data.text for data in elem if data.tag == 'evaluationScore']
+                if ppns:
+                    values['ppn'] = ppns[-1]
+                if scores:
+                    values['evaluationScore'] = scores[-1]
+                possible_matches.append(values)
+            elif tag == 'mergedISNI':
+                deprecated_isnis.append(elem.text)
+            elif tag == 'ISNIMetadata':
+                for data in elem:
+                    if data.tag == 'identity':
+                        identities.append(data)
+                    elif data.tag == 'externalInformation':
+                        uris.extend(uri.text for uri in data if uri.tag == 'URI')
+                    elif data.tag == 'otherIdentifierOfIdentity':
+                        values = {'type': None, 'identifier': None}
+                        source_code = None
+                        for other_identifier in data:
+                            if other_identifier.tag in values:
+                                values[other_identifier.tag] = other_identifier.text
+                            elif other_identifier.tag == 'source':
+                                source_code = other_identifier.text
+                        other_identifiers.add(values, source_code)
+                    elif data.tag == 'sources':
+                        source_code = None
+                        source_identifier = None
+                        for source in data:
+                            if source.tag == 'codeOfSource':
+                                source_code = source.text
+                            elif source.tag == 'sourceIdentifier':
+                                source_identifier = source.text
+                        sources.setdefault(source_code, []).append(source_identifier)
+        if not identifier:
+            identifier = isni or ppn
+
+    isni_record = {}
+    if status == 'noISNI':
+        isni_record['reason'] = reasons[0] if reasons else None
+    if identifier:
+        isni_record[identifier['type']] = identifier['identifier']
+    isni_record['possible matches'] = possible_matches
+    isni_record['deprecated isnis'] = deprecated_isnis
+    identity_type = None
+    for identity in identities:
+        for elem in identity:
+            if isinstance(elem.tag, str):
+                identity_type = elem.tag
+                break
         if identity_type:
-            isni_record['identity type'] = identity_type
-            isni_record['uris'] = get_external_information(record, status)
-            isni_record['other identifiers'] = get_other_identifiers(record, status)
-            isni_record.update(get_name_variants(record, status, identity_type))
-            isni_record['related identities'] = get_related_identitites(record, status, identity_type)
-            isni_record.update(get_additional_information(record, status, identity_type))
-            isni_record['related identities'] = get_name_variants(record, status, identity_type)
-            isni_record['sources'] = get_source_identifiers(record, status)
-        isnis.append(isni_record)
-
-    return isnis
\ No newline at end of file
+            break
+    if identity_type:
+        name_types = NAME_TYPES.get(identity_type, {})
+        keys = NAME_KEYS.get(identity_type, [])
+        name_entries = []
+        additional_info = {}
+        for identity in identities:
+            for identity_data in identity:
+                if identity_data.tag != identity_type:
+                    continue
+                for elem in identity_data:
+                    if elem.tag in name_types:
+                        name_data, source_code = get_name_attributes(elem, keys)
+                        name_entries.append((name_types[elem.tag], name_data, source_code))
+                    elif elem.tag == 'additionalInformation':
+                        get_additional_information(elem, additional_info)
+        isni_record['identity type'] = identity_type
+        isni_record['uris'] = uris
+        isni_record['other identifiers'] = other_identifiers.values
+        isni_record.update(get_names(name_entries))
+        # related identities are replaced with names of identity
+        isni_record['related identities'] = get_names(name_entries)
+        for tag in additional_info:
+            isni_record[tag] = additional_info[tag].values
+        isni_record['sources'] = sources
+
+    return isni_record
+
+def dictify_xml(response):
+    return [dictify_record(record) for record in get_response_records(response)]
@@ -1,111 +1,243 @@
 #import pymarc
 from pymarc import Record, Field
-from pymarc import XmlHandler as OAIHandler
 from lxml import etree as ET
-import xml.sax
-from xml.sax import make_parser
-from xml.sax.handler import feature_namespaces
-import unicodedata
-import io
+from tools.record_builder import RecordBuilder
 
 NAMESPACES = {'oai': 'http://www.openarchives.org/OAI/2.0/'}
 
-def startElementNS(self, name, qname, attrs):
-    """monkey patched pymarc function for OAI-PMH response"""
-    element = name[1]
-    self._text = []
-
-    if element in ["oai_marc", "record"]:
-        self._record = Record(force_utf8=True)
-    elif element == "fixfield":
-        tag = attrs.getValue((None, u"id"))
-        self._field = Field(tag)
-    elif element == "varfield":
-        tag = attrs.getValue((None, u"id"))
-        ind1 = attrs.get((None, u"i1"), u" ")
-        ind2 = attrs.get((None, u"i2"), u" ")
-        self._field = Field(tag, [ind1, ind2])
-    elif element == "controlfield":
-        tag = attrs.getValue((None, u"tag"))
-        self._field = Field(tag)
-    elif element == "datafield":
-        tag = attrs.getValue((None, u"tag"))
-        ind1 = attrs.get((None, u"ind1"), u" ")
-        ind2 = attrs.get((None, u"ind2"), u" ")
-        self._field = Field(tag, [ind1, ind2])
-    elif element == "subfield":
-        # regular MARCXML:
-        if name[0] == 'http://www.loc.gov/MARC21/slim':
-            self._subfield_code = attrs[(None, "code")]
-        else:
-            self._subfield_code = attrs[(None, "label")]
-
-def endElementNS(self, name, qname):
-    """monkey patched pymarc function for OAI-PMH response"""
-    element = name[1]
-    if self.normalize_form is not None:
-        text = unicodedata.normalize(self.normalize_form, u"".join(self._text))
-    else:
-        text = u"".join(self._text)
-    if element in ["oai_marc", "record"]:
-        self.process_record(self._record)
-        self._record = None
-    elif element == "leader":
-        self._record.leader = text.replace(' ', '^')
-    elif element in ["fixfield", "controlfield"]:
-        if self._field.tag == "LDR":
-            self._record.leader = text
-        else:
-            if self._field.tag == "008":
-                text = text.replace(' ', '^')
-            self._field.data = text
-            self._record.add_field(self._field)
-        self._field = None
-    elif element in ["varfield", "datafield"]:
-        self._record.add_field(self._field)
-        self._field = None
-    elif element == "subfield":
-        self._field.add_subfield(self._subfield_code, text)
-        self._subfield_code = None
-
-    self._text = []
+class ResponseStreamError(Exception):
+    pass
 
 def get_identifiers(response, parameters):
-    root = ET.fromstring(bytes(response, encoding='utf-8'))
-    identifiers = set()
-    verb = parameters['verb']
-    for identifier in root.findall('oai:' + verb + '/oai:record/oai:header/oai:identifier', NAMESPACES):
-        identifiers.add(identifier.text.split('/')[-1])
-    return identifiers
+    return OAIResponse(bytes(response, encoding='utf-8'), parameters).identifiers
 
 def get_resumption_token(response, parameters):
-    verb = parameters['verb']
-    root = ET.fromstring(bytes(response, encoding='utf-8'))
-    for token in root.findall('oai:' + verb + '/oai:resumptionToken', NAMESPACES):
-        return token.text
+    return OAIResponse(bytes(response, encoding='utf-8'), parameters).resumption_token
 
 def get_records(response, parameters=None):
-    root = ET.fromstring(bytes(response, encoding='utf-8'))
-    # these pymarc functions are overridden by parse_oai_response 
-    OAIHandler.startElementNS = startElementNS
-    OAIHandler.endElementNS = endElementNS
-    marc_records = []
+    return RecordParser().parse(response, parameters)
+
+def get_records_path(parameters=None):
+    """
+    Get path of elements containing records in response
+    :param parameters: OAI-PMH query parameters, not given for X API responses
+    """
     # path for X query:
     if not parameters:
-        path = 'record'
-    else:
-        verb = parameters['verb']
-        #path = 'oai:' + verb + '/oai:record/oai:metadata/oai:record'
-        path = 'oai:' + verb + '/oai:record/oai:metadata'
-    for records in root.findall(path, NAMESPACES):
-        string_et = ET.tostring(records, encoding='utf-8', method='xml')
-        string_xml = string_et.decode("utf-8") 
-        f = io.StringIO(string_xml)
-        handler = OAIHandler()
-        parser = make_parser()
-        parser.setContentHandler(handler)
-        parser.setFeature(feature_namespaces, 1)
-        parser.parse(f)
-        marc_records.extend(handler.records)
-
-    return marc_records
\ No newline at end of file
+        return 'record'
+    verb = parameters['verb']
+    #path = 'oai:' + verb + '/oai:record/oai:metadata/oai:record'
+    return 'oai:' + verb + '/oai:record/oai:metadata'
+
+class OAIRecordBuilder(RecordBuilder):
+    """
+    Builds records from MARCXML and Aleph oai_marc elements the same way as pymarc XmlHandler with OAIHandler functions of benchmark.py
+    """
+
+    def start(self, name, namespace, element):
+        if name in ["oai_marc", "record"]:
+            self._record = Record(force_utf8=True)
+        elif name == "fixfield":
+            self._field = Field(element.attrib["id"])
+        elif name == "varfield":
+            self._field = Field(element.attrib["id"], [element.get("i1", " "), element.get("i2", " ")])
+        elif name == "controlfield":
+            self._field = Field(element.attrib["tag"])
+        elif name == "datafield":
+            self._field = Field(element.attrib["tag"], [element.get("ind1", " "), element.get("ind2", " ")])
+        elif name == "subfield":
+            # regular MARCXML:
+            if namespace == 'http://www.loc.gov/MARC21/slim':
+                self._subfield_code = element.attrib["code"]
+            else:
+                self._subfield_code = element.attrib["label"]
+
+    def end(self, name, namespace, text):
+        if name in ["oai_marc", "record"]:
+            self.records.append(self._record)
+            self._record = None
+        elif name == "leader":
+            self._record.leader = text.replace(' ', '^')
+        elif name in ["fixfield", "controlfield"]:
+            if self._field.tag == "LDR":
+                self._record.leader = text
+            else:
+                if self._field.tag == "008":
+                    text = text.replace(' ', '^')
+                self._field.data = text
+                self._record.add_field(self._field)
+            self._field = None
+        elif name in ["varfield", "datafield"]:
+            self._record.add_field(self._field)
+            self._field = None
+        elif name == "subfield":
+            self._field.add_subfield(self._subfield_code, text)
+            self._subfield_code = None
+
+class RecordParser:
+
+    def __init__(self):
+        """
+        Parses MARC21 records from OAI-PMH and X API responses building records directly from parsed elements
+        """
+        self.builder = OAIRecordBuilder()
+
+    def parse(self, response, parameters=None):
+        """
+        Get MARC21 records from response
+        :param response: OAI-PMH or X API response
+        :param parameters: OAI-PMH query parameters, not given for X API responses
+        """
+        root = ET.fromstring(bytes(response, encoding='utf-8'))
+
+        return self.parse_element(root, parameters)
+
+    def parse_element(self, root, parameters=None):
+        """
+        Get MARC21 records from parsed response
+        :param root: root element of OAI-PMH or X API response
+        :param parameters: OAI-PMH query parameters, not given for X API responses
+        """
+        records = []
+        for element in root.findall(get_records_path(parameters), NAMESPACES):
+            records.extend(self.builder.build(element))
+
+        return records
+
+class OAIResponse:
+
+    def __init__(self, content, parameters):
+        """
+        OAI-PMH response parsed once from bytes, identifiers, records and resumption token are read when first needed
+        :param content: bytes of OAI-PMH response
+        :param parameters: OAI-PMH query parameters
+        """
+        self.root = ET.fromstring(content)
+        self.verb = parameters['verb']
+        self.parameters = parameters
+        self._identifiers = None
+        self._records = None
+
+    @property
+    def identifiers(self):
+        """
+        Local identifiers of records in response header, including deleted records
+        """
+        if self._identifiers is None:
+            self._identifiers = set()
+            for identifier in self.root.findall('oai:' + self.verb + '/oai:record/oai:header/oai:identifier', NAMESPACES):
+                self._identifiers.add(identifier.text.split('/')[-1])
+        return self._identifiers
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = RecordParser().parse_element(self.root, self.parameters)
+        return self._records
+
+    @property
+    def resumption_token(self):
+        """
+        Resumption token of the next page or None, if response is the last page
+        """
+        for token in self.root.findall('oai:' + self.verb + '/oai:resumptionToken', NAMESPACES):
+            if token.text and token.text.strip():
+                return token.text.strip()
+
+class OAIResponseStream:
+
+    def __init__(self, source, parameters=None):
+        """
+        OAI-PMH or X API response parsed incrementally from file-like object or file path with iterparse
+        Records are built as soon as their element closes and elements are cleared after that, so the whole tree is never in memory.
+        Iterating yields records one by one without keeping them, identifiers and resumption token are available after iterating to the end.
+        Otherwise identifiers, records and resumption token parse the whole response and keep its records when first needed.
+        Source is read only once, so records are not available after iterating and nothing is available after partial iteration.
+        :param source: file-like object returning bytes of response or file path
+        :param parameters: OAI-PMH query parameters, not given for X API responses
+        """
+        self.source = source
+        self.parameters = parameters
+        self.started = False
+        self.complete = False
+        self._identifiers = set()
+        self._records = None
+        self._resumption_token = None
+
+    def __iter__(self):
+        if self._records is not None:
+            yield from self._records
+            return
+        if self.started:
+            raise ResponseStreamError("Response stream is already iterated")
+        self.started = True
+        builder = OAIRecordBuilder()
+        if self.parameters:
+            oai = '{%s}'%NAMESPACES['oai']
+            parent_tag = oai + self.parameters['verb']
+            tags = [oai + 'record', oai + 'resumptionToken']
+        else:
+            parent_tag = None
+            tags = ['record']
+        for event, element in ET.iterparse(self.source, events=('end',), tag=tags):
+            parent = element.getparent()
+            # only records of root element in X API response
+            if parent is None or parent_tag and parent.tag != parent_tag or not parent_tag and parent.getparent() is not None:
+                continue
+            if element.tag == tags[-1] and self.parameters:
+                if element.text and element.text.strip():
+                    self._resumption_token = element.text.strip()
+                continue
+            if self.parameters:
+                for identifier in element.findall('oai:header/oai:identifier', NAMESPACES):
+                    self._identifiers.add(identifier.text.split('/')[-1])
+                for metadata in element.findall('oai:metadata', NAMESPACES):
+                    for record in builder.build(metadata):
+                        yield record
+            else:
+                for record in builder.build(element):
+                    yield record
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del parent[0]
+        self.complete = True
+
+    def parse(self):
+        """
+        Parses the whole response and keeps its records
+        Raises ResponseStreamError, if response stream is already iterated
+        """
+        if self._records is None:
+            if self.started:
+                raise ResponseStreamError("Records of response stream are not kept after iterating it")
+            self._records = list(self)
+
+    def check_complete(self):
+        """
+        Parses the whole response, if response stream is not iterated to the end
+        """
+        if not self.complete:
+            if self.started and self._records is None:
+                raise ResponseStreamError("Response stream is iterated only partially")
+            self.parse()
+
+    @property
+    def identifiers(self):
+        """
+        Local identifiers of records in response header, including deleted records
+        """
+        self.check_complete()
+        return self._identifiers
+
+    @property
+    def records(self):
+        self.parse()
+        return self._records
+
+    @property
+    def resumption_token(self):
+        """
+        Resumption token of the next page or None, if response is the last page
+        """
+        self.check_complete()
+        return self._resumption_token
@@ -0,0 +1,102 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from tools import api_query
+
+# default number of PPNs combined into one ISNI SRU query
+BATCH_SIZE = 10
+
+class PPNResolver:
+
+    def __init__(self, sru_api_query, batch_size=BATCH_SIZE, cache_file=None):
+        """
+        Requests ISNI data of PPN identifiers with ISNI SRU API queries combining several PPNs with or operator
+        Results are cached for the run and saved into cache file, if cache file is given.
+        Cached results older than cache_ttl of ISNI SRU API query are requested again.
+        :param sru_api_query: APIQuery of ISNI SRU API
+        :param batch_size: maximum number of PPNs in one query
+        :param cache_file: file path of pickled results from previous runs
+        """
+        self.sru_api_query = sru_api_query
+        self.batch_size = max(1, batch_size)
+        self.cache_file = cache_file
+        self.ttl = sru_api_query.cache_ttl
+        # results with PPN as key, value is a tuple of request time and ISNI data or None if PPN was not found
+        self.cache = {}
+        self.lock = threading.Lock()
+        if cache_file and os.path.isfile(cache_file):
+            try:
+                with open(cache_file, 'rb') as fh:
+                    self.cache = pickle.load(fh)
+            except (pickle.UnpicklingError, EOFError) as e:
+                logging.error("Cache file %s is corrupted: %s"%(cache_file, e))
+
+    def resolve(self, ppns):
+        """
+        Returns a dict of ISNI data of PPNs, value is None if PPN is not found from ISNI.
+        PPNs whose requests failed are logged and left out of returned dict.
+        :param ppns: list of PPN identifiers
+        """
+        results = {}
+        uncached_ppns = []
+        with self.lock:
+            for ppn in ppns:
+                if ppn in self.cache and not self.is_expired(self.cache[ppn][0]):
+                    results[ppn] = self.cache[ppn][1]
+                elif ppn not in uncached_ppns:
+                    uncached_ppns.append(ppn)
+        for idx in range(0, len(uncached_ppns), self.batch_size):
+            results.update(self.request_isni_data(uncached_ppns[idx:idx + self.batch_size]))
+
+        return results
+
+    def request_isni_data(self, ppns):
+        """
+        Requests ISNI data of PPNs with one query and caches results
+        ISNI data of assigned ISNI identifiers may not contain PPN, so PPNs of unidentified results are requested one by one
+        :param ppns: list of PPN identifiers
+        """
+        results = {}
+        query = ' or '.join('ppn=' + ppn for ppn in ppns)
+        try:
+            isni_data = self.sru_api_query.get_isni_query_data(query)
+        except api_query.APIQueryError as e:
+            logging.error("ISNI data of PPNs %s not requested: %s"%(", ".join(ppns), e))
+            return results
+        if len(ppns) == 1:
+            results[ppns[0]] = isni_data[0] if isni_data else None
+        else:
+            unidentified = False
+            for result in isni_data:
+                if result.get('ppn') in ppns:
+                    results[result['ppn']] = result
+                else:
+                    unidentified = True
+            for ppn in ppns:
+                if ppn not in results:
+                    if unidentified:
+                        results.update(self.request_isni_data([ppn]))
+                    else:
+                        results[ppn] = None
+        with self.lock:
+            for ppn in results:
+                self.cache[ppn] = (time.time(), results[ppn])
+
+        return results
+
+    def is_expired(self, request_time):
+        return self.ttl is not None and self.ttl > 0 and time.time() - request_time > self.ttl
+
+    def save_cache(self):
+        """
+        Saves results into cache file
+        """
+        if not self.cache_file:
+            return
+        temp_file = self.cache_file + '.tmp'
+        with self.lock:
+            with open(temp_file, 'wb') as fh:
+                pickle.dump(self.cache, fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, self.cache_file)
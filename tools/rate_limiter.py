@@ -0,0 +1,100 @@
+import threading
+import time
+import urllib
+
+# default maximum number of concurrent requests to an endpoint
+MAX_CONCURRENCY = 10
+# rate limits in requests per second used for config sections without rate_limit
+# ISNI SRU API was queried at most once per second before rate limiting was configurable
+DEFAULT_RATE_LIMITS = {'ISNI SRU API': 1, 'ISNI SRU TEST API': 1}
+# limiters shared by all requests, keyed by endpoint URL
+limiters = {}
+limiters_lock = threading.Lock()
+
+class RateLimiter:
+
+    def __init__(self, rate=None, burst=1, max_concurrency=MAX_CONCURRENCY, latency_target=None):
+        """
+        Token bucket rate limiter with adaptive concurrency limit for requests to an API endpoint
+        Concurrency limit is adjusted with additive increase and multiplicative decrease (AIMD):
+        limit is halved when a request fails or its latency exceeds latency target and increased by one
+        after a full window of successful requests. Limit grows by one with every successful request
+        until the first decrease.
+        :param rate: maximum number of requests started per second, not limited if not given
+        :param burst: number of requests that can be started at once after idle time
+        :param max_concurrency: maximum number of concurrent requests
+        :param latency_target: latency in seconds over which requests are considered slow
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.max_concurrency = max(1, max_concurrency)
+        self.latency_target = latency_target
+        self.limit = 1.0
+        self.in_flight = 0
+        self.slow_start = True
+        # requests started before the latest decrease do not decrease limit again
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Waits until a request can be started within concurrency limit and rate
+        Returns the start time of request, which is given to release function
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            if self.rate:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    self.condition.wait((1 - self.tokens) / self.rate)
+            return time.monotonic()
+
+    def release(self, start, failed=False):
+        """
+        Marks a request finished and adjusts concurrency limit
+        :param start: start time of request returned by acquire function
+        :param failed: True if request failed or was rejected by server because of load
+        """
+        with self.condition:
+            self.in_flight -= 1
+            latency = time.monotonic() - start
+            if failed or self.latency_target and latency > self.latency_target:
+                if start >= self.decreased:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.decreased = time.monotonic()
+                    self.slow_start = False
+            elif self.slow_start:
+                self.limit = min(self.max_concurrency, self.limit + 1)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+def get_limiter(config_section):
+    """
+    Get a shared rate limiter for the endpoint in config section
+    Limits are read from config section keys rate_limit, burst, max_concurrency and latency_target,
+    rate limit of ISNI SRU API sections is one request per second if rate_limit is not set
+    :param config_section: a section of config file parsed by ConfigParser
+    """
+    url = config_section.get('baseurl') or ''
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc, parts.path)
+    with limiters_lock:
+        if key not in limiters:
+            rate = config_section.get('rate_limit', fallback=DEFAULT_RATE_LIMITS.get(getattr(config_section, 'name', None)))
+            latency_target = config_section.get('latency_target', fallback=None)
+            limiters[key] = RateLimiter(
+                rate=float(rate) if rate else None,
+                burst=int(config_section.get('burst', fallback=1)),
+                max_concurrency=int(config_section.get('max_concurrency', fallback=MAX_CONCURRENCY)),
+                latency_target=float(latency_target) if latency_target else None)
+        return limiters[key]
@@ -0,0 +1,54 @@
+from lxml import etree as ET
+
+class RecordBuilder:
+
+    def __init__(self):
+        """
+        Builds pymarc records from parsed lxml elements without serializing and parsing them again with SAX parser
+        Elements are handled in document order with start and end functions of subclasses, which are given
+        the same text content as pymarc XmlHandler: text after the start tag of a leaf element or after the last child element.
+        """
+        self.records = []
+        self._record = None
+        self._field = None
+        self._subfield_code = None
+
+    def build(self, element):
+        """
+        Returns records built from element and its descendants
+        :param element: lxml element
+        """
+        self.records = []
+        self.walk(element)
+
+        return self.records
+
+    def walk(self, element):
+        qname = ET.QName(element)
+        self.start(qname.localname, qname.namespace, element)
+        text = [element.text or '']
+        for child in element:
+            # comments and processing instructions do not end text content
+            if isinstance(child.tag, str):
+                self.walk(child)
+                text = []
+            text.append(child.tail or '')
+        self.end(qname.localname, qname.namespace, ''.join(text))
+
+    def start(self, name, namespace, element):
+        """
+        Handles start of element, elements are ignored unless overridden in subclass
+        :param name: local name of element
+        :param namespace: namespace of element
+        :param element: lxml element
+        """
+        pass
+
+    def end(self, name, namespace, text):
+        """
+        Handles end of element, elements are ignored unless overridden in subclass
+        :param name: local name of element
+        :param namespace: namespace of element
+        :param text: text content of element
+        """
+        pass
@@ -0,0 +1,195 @@
+import hashlib
+import io
+import logging
+import os
+import pickle
+from pymarc import MARCReader
+from tools import aleph_seq_reader
+
+FIELD_TERMINATOR = b'\x1e'
+# size of blocks read when computing digest of indexed data
+BLOCK_SIZE = 1024 * 1024
+
+class RecordIndex:
+
+    def __init__(self, file_path, format, index_path=None):
+        """
+        Persistent index of byte offsets and lengths of records in ISO 2709 or Aleph sequential file
+        Records are keyed by identifier in field 001, the last one of records with the same identifier is indexed.
+        Index is saved into file with suffix .idx and updated incrementally, if records are appended to indexed file.
+        Appending is detected by comparing digest of previously indexed bytes, otherwise changed file is indexed again.
+        :param file_path: file containing MARC21 records
+        :param format: format of file, either 'marc21' or 'alephseq'
+        :param index_path: file path of index file, default is file_path with suffix .idx
+        """
+        if format not in ['marc21', 'alephseq']:
+            raise ValueError("Not valid format to index: %s"%format)
+        self.file_path = file_path
+        self.format = format
+        self.index_path = index_path
+        if not self.index_path:
+            self.index_path = file_path + '.idx'
+        self.offsets = {}
+        # position in file, from where indexing is continued when file is appended
+        self.position = 0
+        self.digest = None
+        self.file = None
+        self.update()
+
+    def update(self):
+        """
+        Loads index from index file and indexes records not yet indexed
+        """
+        stat = os.stat(self.file_path)
+        data = None
+        if os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path, 'rb') as fh:
+                    data = pickle.load(fh)
+            except (pickle.UnpicklingError, EOFError) as e:
+                logging.error("Index file %s is corrupted: %s"%(self.index_path, e))
+        if data and data['format'] == self.format:
+            if data['size'] == stat.st_size and data['mtime'] == stat.st_mtime:
+                self.offsets = data['offsets']
+                self.position = data['position']
+                self.digest = data.get('digest')
+                return
+            # index files of older versions without digest are indexed again
+            if data['size'] <= stat.st_size and data.get('digest') \
+                    and self.read_digest(data['position']) == data['digest']:
+                logging.info("Updating index of file %s"%self.file_path)
+                self.offsets = data['offsets']
+                self.position = data['position']
+        if not self.offsets:
+            logging.info("Indexing file %s"%self.file_path)
+            self.position = 0
+        if self.format == 'marc21':
+            self.index_marc21()
+        else:
+            self.index_alephseq()
+        self.digest = self.read_digest(self.position)
+        with open(self.index_path, 'wb') as fh:
+            data = {'format': self.format,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'position': self.position,
+                    'digest': self.digest,
+                    'offsets': self.offsets}
+            pickle.dump(data, fh, pickle.HIGHEST_PROTOCOL)
+        logging.info("Number of records in index: %s"%len(self.offsets))
+
+    def read_digest(self, position):
+        """
+        Computes SHA-256 digest of bytes preceding position in indexed file
+        :param position: byte offset in indexed file
+        """
+        digest = hashlib.sha256()
+        with open(self.file_path, 'rb') as fh:
+            remaining = position
+            while remaining > 0:
+                block = fh.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest.hexdigest()
+
+    def index_marc21(self):
+        """
+        Indexes ISO 2709 records by reading record lengths from leaders and field 001 from directories
+        """
+        with open(self.file_path, 'rb') as fh:
+            fh.seek(self.position)
+            while True:
+                offset = fh.tell()
+                record_length = fh.read(5)
+                if len(record_length) < 5 or not record_length.isdigit():
+                    if record_length.strip(b'\x1a\r\n '):
+                        logging.error("Invalid record length in file %s at byte %s"%(self.file_path, offset))
+                    break
+                length = int(record_length)
+                data = record_length + fh.read(length - 5)
+                if len(data) < length:
+                    # incomplete record at the end of file
+                    break
+                self.position = offset + length
+                record_id = get_control_number(data)
+                if record_id:
+                    self.offsets[record_id] = (offset, length)
+
+    def index_alephseq(self):
+        """
+        Indexes Aleph sequential records consisting of consecutive lines with same system number
+        Indexing stops to the first empty line like AlephSeqReader
+        """
+        with open(self.file_path, 'rb') as fh:
+            fh.seek(self.position)
+            offset = self.position
+            record_id = None
+            record_offset = offset
+            for line in fh:
+                line_id = line[0:9]
+                if not line.rstrip():
+                    break
+                if line_id != record_id:
+                    if record_id:
+                        self.offsets[record_id.decode('utf-8')] = (record_offset, offset - record_offset)
+                    record_id = line_id
+                    record_offset = offset
+                offset += len(line)
+            if record_id:
+                self.offsets[record_id.decode('utf-8')] = (record_offset, offset - record_offset)
+                # the last record is indexed again when file is appended, in case record lines continue
+                self.position = record_offset
+
+    def get_record(self, record_id):
+        """
+        Reads a record from indexed file
+        :param record_id: identifier of record in field 001
+        """
+        if record_id not in self.offsets:
+            return None
+        if not self.file:
+            self.file = open(self.file_path, 'rb')
+        offset, length = self.offsets[record_id]
+        self.file.seek(offset)
+        data = self.file.read(length)
+        if self.format == 'marc21':
+            reader = MARCReader(io.BytesIO(data), to_unicode=True)
+        else:
+            reader = aleph_seq_reader.AlephSeqReader(io.StringIO(data.decode('utf-8')))
+        return next(reader, None)
+
+    def get_records(self, record_ids):
+        """
+        Reads records in the order of their position in indexed file, missing and deleted records are skipped
+        :param record_ids: identifiers of records in field 001
+        """
+        record_ids = sorted((id for id in record_ids if id in self.offsets), key=lambda id: self.offsets[id][0])
+        for record_id in record_ids:
+            record = self.get_record(record_id)
+            if record:
+                yield record
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+def get_control_number(data):
+    """
+    Get value of field 001 from ISO 2709 record using record directory
+    :param data: bytes of a record in ISO 2709 format
+    """
+    try:
+        base_address = int(data[12:17])
+    except ValueError:
+        return None
+    directory = data[24:base_address - 1]
+    for idx in range(0, len(directory) - 11, 12):
+        if directory[idx:idx + 3] == b'001':
+            length = int(directory[idx + 3:idx + 7])
+            start = base_address + int(directory[idx + 7:idx + 12])
+            value = data[start:start + length].rstrip(FIELD_TERMINATOR)
+            return value.decode('utf-8', errors='replace')
+    return None
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import urllib
+
+# cache used by all API queries, caching is off if not set
+cache = None
+
+class CachedResponse:
+
+    def __init__(self, status_code, content, encoding):
+        """
+        Response read from cache with the same attributes as used from requests.Response
+        :param status_code: HTTP status code
+        :param content: bytes of response body
+        :param encoding: encoding of response body
+        """
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+class ResponseCache:
+
+    def __init__(self, directory, max_size=None, offline=False):
+        """
+        On-disk cache of API responses keyed by hash of normalized URL without credentials
+        Least recently used responses are removed, when total size of cached responses exceeds maximum size.
+        :param directory: directory of cached responses
+        :param max_size: maximum total size of cached responses in bytes, not limited if not given
+        :param offline: serve only cached responses regardless of their age
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # sizes and access times of cached files
+        self.files = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.cache'):
+                stat = os.stat(os.path.join(directory, file_name))
+                self.files[file_name] = (stat.st_size, stat.st_mtime)
+        self.size = sum(size for size, accessed in self.files.values())
+
+    def get(self, url, ttl=None):
+        """
+        Get cached response of URL or None, if response is not cached or it is older than ttl
+        :param url: URL of request
+        :param ttl: maximum age of response in seconds, age is not limited if not given
+        """
+        file_name = get_key(url) + '.cache'
+        file_path = os.path.join(self.directory, file_name)
+        data = None
+        if file_name in self.files:
+            try:
+                with open(file_path, 'rb') as fh:
+                    data = pickle.load(fh)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                logging.error("Cached response %s is corrupted: %s"%(file_path, e))
+        if data and ttl and not self.offline and time.time() - data['time'] > ttl:
+            data = None
+        with self.lock:
+            if not data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if file_name in self.files:
+                accessed = time.time()
+                self.files[file_name] = (self.files[file_name][0], accessed)
+                try:
+                    os.utime(file_path, (accessed, accessed))
+                except OSError:
+                    pass
+        return CachedResponse(data['status_code'], data['content'], data['encoding'])
+
+    def put(self, url, response):
+        """
+        Saves response of URL into cache
+        :param url: URL of request
+        :param response: requests.Response
+        """
+        file_name = get_key(url) + '.cache'
+        file_path = os.path.join(self.directory, file_name)
+        data = {'url': normalize_url(url),
+                'time': time.time(),
+                'status_code': response.status_code,
+                'encoding': response.encoding,
+                'content': response.content}
+        temp_path = file_path + '.%s.tmp'%threading.get_ident()
+        with open(temp_path, 'wb') as fh:
+            pickle.dump(data, fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, file_path)
+        with self.lock:
+            if file_name in self.files:
+                self.size -= self.files[file_name][0]
+            size = os.path.getsize(file_path)
+            self.files[file_name] = (size, data['time'])
+            self.size += size
+            if self.max_size:
+                self.evict(file_name)
+
+    def evict(self, kept_file_name):
+        """
+        Removes least recently used responses until total size is within maximum size
+        :param kept_file_name: file name of response not removed
+        """
+        file_names = sorted(self.files, key=lambda file_name: self.files[file_name][1])
+        for file_name in file_names:
+            if self.size <= self.max_size:
+                break
+            if file_name == kept_file_name:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+            self.size -= self.files[file_name][0]
+            del(self.files[file_name])
+
+    def log_statistics(self):
+        logging.info("Response cache hits: %s, misses: %s"%(self.hits, self.misses))
+
+def normalize_url(url):
+    """
+    Normalizes URL by removing credentials and sorting query parameters
+    :param url: URL of request
+    """
+    parts = urllib.parse.urlsplit(url)
+    netloc = parts.netloc.rpartition('@')[2].lower()
+    # ISNI credentials are given in path
+    path = re.sub('(username|password)=[^/]*/', '', parts.path)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((parts.scheme.lower(), netloc, path, query, ''))
+
+def get_key(url):
+    """
+    Get cache key of URL
+    :param url: URL of request
+    """
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()